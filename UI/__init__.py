@@ -19,3 +19,8 @@ def resource_path(relative_path):
         base_path = os.path.abspath(os.path.dirname(os.path.dirname(__file__)))
     
     return os.path.join(base_path, relative_path)
+
+# The scraper modules import each other by name, so their folder has to be importable
+SCRAPER_DIR = resource_path("scraper")
+if SCRAPER_DIR not in sys.path:
+    sys.path.insert(0, SCRAPER_DIR)
@@ -1,9 +1,8 @@
-import os
-import pandas as pd
 import uuid
 from PySide6.QtWidgets import QDialog, QVBoxLayout, QLabel, QLineEdit, QDateEdit, QPushButton, QComboBox, QMessageBox
 from PySide6.QtCore import Qt
 from UI import resource_path
+from tender_store import TenderStore, MANUAL_SOURCE
 
 class AddTenderDialog(QDialog):
     def __init__(self, parent=None):
@@ -11,6 +10,9 @@ class AddTenderDialog(QDialog):
         self.setWindowTitle("Add New Tender")
         self.setFixedSize(400, 400)  # Made taller to accommodate new fields
 
+        # Reuse the main window's store connection when there is one
+        self.store = getattr(parent, "store", None) or TenderStore(resource_path("tender_data/tenders.db"))
+
         layout = QVBoxLayout()
 
         # Title Input
@@ -54,14 +56,14 @@ class AddTenderDialog(QDialog):
 
         # Submit Button
         self.submit_button = QPushButton("Add Tender")
-        self.submit_button.clicked.connect(self.add_tender_to_csv)
+        self.submit_button.clicked.connect(self.add_tender_to_store)
         layout.addWidget(self.submit_button)
 
         self.setLayout(layout)
 
-    def add_tender_to_csv(self):
+    def add_tender_to_store(self):
         """
-        Reads the input fields and appends a new row to the CSV file.
+        Reads the input fields and inserts a new tender into the tender store.
         Manually added tenders are given a unique hexadecimal ID to distinguish them
         from scraped tenders.
         """
@@ -73,25 +75,20 @@ class AddTenderDialog(QDialog):
         category = self.category_input.text()  # Get category from text input
 
         if title:
-            file_path = resource_path("tender_data/filtered_tenders.csv")
-            if not os.path.exists(file_path):
-                QMessageBox.critical(self, "Error", "Could not find tender data file. Please ensure the application is properly set up.")
-                return
-            
             try:
-                df = pd.read_csv(file_path)
                 new_id = uuid.uuid4().hex
-                new_row = pd.DataFrame([{
+                # Manually added tenders skip the relevance filter, so they are stored as relevant
+                self.store.upsert([{
                     "id": new_id,
                     "title": title,
                     "date_posted": date_posted,
                     "closing_date": closing_date,
                     "link": link,
                     "category": category,
-                    "status": status
+                    "status": status,
+                    "relevant": 1,
+                    "source": MANUAL_SOURCE
                 }])
-                df = pd.concat([df, new_row], ignore_index=True)
-                df.to_csv(file_path, index=False)
                 self.accept()  # Close dialog on success
             except Exception as e:
                 QMessageBox.critical(self, "Error", f"Failed to save tender: {str(e)}")
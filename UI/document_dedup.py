@@ -0,0 +1,147 @@
+import os
+import re
+import zlib
+
+import numpy as np
+
+# Collapse near-duplicate documents and drop repeated lines before analysis; 0 sends the text as extracted
+DEDUP_DOCUMENTS = os.getenv("DEDUP_DOCUMENTS", "1") != "0"
+# Estimated shingle overlap (Jaccard) above which a document counts as a near-duplicate of an earlier one
+DEDUP_THRESHOLD = float(os.getenv("DEDUP_THRESHOLD", "0.8"))
+# Lines at least this long are dropped when they were already sent; shorter ones (table cells,
+# list numbers, "N/A") are repeated for a reason
+DEDUP_MIN_LINE_CHARS = int(os.getenv("DEDUP_MIN_LINE_CHARS", "80"))
+# Words per shingle and hash functions per MinHash signature
+SHINGLE_WORDS = 5
+MINHASH_PERMUTATIONS = 128
+# Shingles hashed against all permutations at once, which bounds the work matrix to a few MB
+MINHASH_BLOCK = 4096
+# Characters of a document shingled at a time; n-grams across a slice boundary are skipped
+SHINGLE_SLICE_CHARS = 1 << 16
+
+# A prime above 2**32, so (a * x + b) % PRIME is a permutation of the 32-bit shingle hashes
+# and a * x + b can't overflow uint64
+PRIME = np.uint64((1 << 32) + 15)
+DOCUMENT_HEADER = re.compile(r"\n--- Document: (.+?) ---\n")
+
+def estimate_tokens(text):
+    """Rough token count; the local models average about four characters per token on English"""
+    return len(text) // 4
+
+def words(text):
+    return re.findall(r"\w+", text.lower())
+
+def shingle_hashes(text, size=SHINGLE_WORDS):
+    """Sorted unique 32-bit hashes of the word n-grams of text; text shorter than n words is one shingle"""
+    tokens = words(text)
+    if not tokens:
+        return np.zeros(0, dtype=np.uint32)
+    # Hash each distinct word once, then combine n consecutive word hashes with NumPy
+    lookup = {token: zlib.crc32(token.encode("utf-8")) for token in set(tokens)}
+    word_hashes = np.fromiter(map(lookup.__getitem__, tokens), dtype=np.uint64, count=len(tokens))
+    count = max(1, len(tokens) - size + 1)
+    hashes = np.zeros(count, dtype=np.uint64)
+    for offset in range(min(size, len(tokens))):
+        hashes = (hashes * np.uint64(1000003) + word_hashes[offset:offset + count]) & np.uint64(0xFFFFFFFF)
+    return np.unique(hashes.astype(np.uint32))
+
+class DocumentDeduplicator:
+    """
+    Removes repeated text from a document package before it is analyzed.
+
+    Every document gets a MinHash signature of its word shingles. A document whose
+    signature estimates at least DEDUP_THRESHOLD overlap with an earlier one (the PDF
+    and Word copies of a spec, an amendment that repeats the original) is collapsed to
+    the lines that don't appear word for word in that earlier document, so a line that
+    changes one date or quantity is kept whole. Long lines already sent anywhere in
+    the package (confidentiality notices, page footers, repeated clauses) are dropped.
+    Translations share no shingles and are kept.
+    """
+
+    def __init__(self, threshold=DEDUP_THRESHOLD, min_line_chars=DEDUP_MIN_LINE_CHARS,
+                 permutations=MINHASH_PERMUTATIONS, seed=1):
+        self.threshold = threshold
+        self.min_line_chars = min_line_chars
+        rng = np.random.default_rng(seed)
+        self.a = rng.integers(1, 1 << 32, size=permutations, dtype=np.uint64)
+        self.b = rng.integers(0, 1 << 32, size=permutations, dtype=np.uint64)
+        self.counts = {"documents": 0, "collapsed": 0, "lines_dropped": 0, "tokens_before": 0, "tokens_after": 0}
+        self.collapsed = []  # (document, near-duplicate of)
+
+    def signature(self, hashes, signature=None):
+        """MinHash signature of a set of shingle hashes, folded into an earlier signature if given"""
+        if signature is None:
+            signature = np.full(len(self.a), PRIME, dtype=np.uint64)
+        for start in range(0, len(hashes), MINHASH_BLOCK):
+            block = hashes[start:start + MINHASH_BLOCK].astype(np.uint64)
+            permuted = (self.a[:, None] * block[None, :] + self.b[:, None]) % PRIME
+            signature = np.minimum(signature, permuted.min(axis=1))
+        return signature
+
+    def document_signature(self, body):
+        """Signature of a document, shingled a slice at a time so its words aren't all held at once"""
+        signature = None
+        start = 0
+        while start < len(body):
+            end = body.find("\n", start + SHINGLE_SLICE_CHARS)
+            end = len(body) if end == -1 else end + 1
+            hashes = shingle_hashes(body[start:end])
+            if len(hashes):
+                signature = self.signature(hashes, signature)
+            start = end
+        return signature
+
+    def dedup(self, text):
+        """Return the package text with repeated passages removed; headers mark collapsed documents"""
+        parts = DOCUMENT_HEADER.split(text)
+        # parts is [text before the first header, name, body, name, body, ...]
+        output = [parts[0]]
+        kept = []  # (name, signature, normalized lines) of documents sent in full
+        seen_lines = set()
+        for name, body in zip(parts[1::2], parts[2::2]):
+            self.counts["documents"] += 1
+            signature = self.document_signature(body)
+            original = None
+            if signature is not None and kept:
+                signatures = np.stack([entry[1] for entry in kept])
+                similarity = (signatures == signature).mean(axis=1)
+                best = int(similarity.argmax())
+                if similarity[best] >= self.threshold:
+                    original = kept[best]
+
+            lines, normalized_lines = [], set()
+            for line in body.split("\n"):
+                normalized = " ".join(line.lower().split())
+                normalized_lines.add(normalized)
+                if len(normalized) >= self.min_line_chars:
+                    if normalized in seen_lines:
+                        self.counts["lines_dropped"] += 1
+                        continue
+                    seen_lines.add(normalized)
+                # Only exact repeats go; a line with any change may be the point of an amendment
+                if original is not None and normalized and normalized in original[2]:
+                    continue
+                lines.append(line)
+
+            if original is not None:
+                self.counts["collapsed"] += 1
+                self.collapsed.append((name, original[0]))
+                output.append(f"\n--- Document: {name} (near-duplicate of {original[0]}; "
+                              f"lines identical to it are left out) ---\n")
+            else:
+                output.append(f"\n--- Document: {name} ---\n")
+                if signature is not None:
+                    kept.append((name, signature, normalized_lines))
+            output.append("\n".join(lines))
+
+        result = "".join(output)
+        self.counts["tokens_before"] += estimate_tokens(text)
+        self.counts["tokens_after"] += estimate_tokens(result)
+        return result
+
+    def report(self):
+        saved = self.counts["tokens_before"] - self.counts["tokens_after"]
+        share = saved / self.counts["tokens_before"] if self.counts["tokens_before"] else 0.0
+        return (f"Deduplication: {self.counts['collapsed']} of {self.counts['documents']} documents collapsed as "
+                f"near-duplicates, {self.counts['lines_dropped']} repeated lines dropped, "
+                f"~{saved:,} tokens saved ({share:.0%})")
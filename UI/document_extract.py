@@ -0,0 +1,333 @@
+import os
+import itertools
+import multiprocessing
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+# File types the AI Analysis page accepts
+SUPPORTED_EXTENSIONS = ('.pdf', '.docx', '.doc', '.txt', '.rtf')
+# Worker processes for text extraction; PDF parsing is CPU-bound and holds the GIL,
+# so threads wouldn't run it in parallel
+EXTRACT_WORKERS = int(os.getenv("EXTRACT_WORKERS", str(max(1, min(4, os.cpu_count() or 1)))))
+# PDFs longer than this are split into page ranges extracted by different workers
+PDF_PAGES_PER_TASK = int(os.getenv("PDF_PAGES_PER_TASK", "20"))
+# Extracted text held in memory for one analysis; larger packages are summarized as they
+# are extracted instead of being collected into one string. Deduplication and passage
+# retrieval need the whole package, so streamed packages skip them and are summarized in full.
+EXTRACT_MEMORY_MB = float(os.getenv("EXTRACT_MEMORY_MB", "64"))
+# Text read from a plain text file at a time
+TXT_BLOCK_CHARS = 1 << 16
+
+# Text used in place of a document whose extraction library isn't installed
+MISSING_LIBRARY = {
+    '.pdf': "PyPDF2 library is not installed. Unable to extract text from PDF.",
+    '.docx': "python-docx library is not installed. Unable to extract text from Word document.",
+    '.doc': "python-docx library is not installed. Unable to extract text from Word document.",
+    '.rtf': "striprtf library is not installed. Unable to extract text from RTF.",
+}
+
+def iter_pdf_pages(file_path, start=0, end=None):
+    """Yield the text of each page in [start, end) of a PDF file (all pages by default)"""
+    from PyPDF2 import PdfReader
+    reader = PdfReader(file_path)
+    for page in reader.pages[start:end]:
+        yield (page.extract_text() or "") + "\n"
+
+def iter_word_paragraphs(file_path):
+    import docx
+    doc = docx.Document(file_path)
+    for para in doc.paragraphs:
+        yield para.text + "\n"
+
+def iter_txt_blocks(file_path, block_chars=TXT_BLOCK_CHARS):
+    with open(file_path, 'r', encoding='utf-8', errors='replace') as file:
+        for block in iter(lambda: file.read(block_chars), ""):
+            yield block
+
+def read_pdf_pages(file_path, start=0, end=None):
+    return list(iter_pdf_pages(file_path, start, end))
+
+def read_word(file_path):
+    return "".join(iter_word_paragraphs(file_path))
+
+def read_txt(file_path):
+    return "".join(iter_txt_blocks(file_path))
+
+def read_rtf(file_path):
+    from striprtf.striprtf import rtf_to_text
+    with open(file_path, 'r', encoding='utf-8', errors='replace') as file:
+        return rtf_to_text(file.read())
+
+def extract_text_from_pdf(file_path, start=0, end=None):
+    """Extract text from the pages [start, end) of a PDF file (all pages by default)"""
+    try:
+        return "".join(read_pdf_pages(file_path, start, end))
+    except ImportError:
+        return MISSING_LIBRARY['.pdf']
+
+def extract_text_from_word(file_path):
+    """Extract text from Word document"""
+    try:
+        return read_word(file_path)
+    except ImportError:
+        return MISSING_LIBRARY['.docx']
+
+def extract_text_from_txt(file_path):
+    """Extract text from plain text file"""
+    return read_txt(file_path)
+
+def extract_text_from_rtf(file_path):
+    """Extract text from RTF file"""
+    try:
+        return read_rtf(file_path)
+    except ImportError:
+        return MISSING_LIBRARY['.rtf']
+
+def pdf_page_count(file_path):
+    try:
+        from PyPDF2 import PdfReader
+    except ImportError:
+        return None
+    return len(PdfReader(file_path).pages)
+
+def iter_unit_parts(file_path, start=0, end=None):
+    """
+    Yield (text, page offsets within the text) for one unit of work, a page or paragraph at a
+    time. Offsets are None when the text is only a placeholder message (missing library,
+    unsupported type), which mustn't be cached.
+    """
+    file_ext = os.path.splitext(file_path)[1].lower()
+    readers = {
+        '.pdf': lambda: iter_pdf_pages(file_path, start, end),
+        '.docx': lambda: iter_word_paragraphs(file_path),
+        '.doc': lambda: iter_word_paragraphs(file_path),
+        '.txt': lambda: iter_txt_blocks(file_path),
+        '.rtf': lambda: iter([read_rtf(file_path)]),
+    }
+    if file_ext not in readers:
+        yield f"Unsupported file type: {file_ext}", None
+        return
+    try:
+        parts = readers[file_ext]()
+        first = next(parts, "")
+    except ImportError:
+        yield MISSING_LIBRARY[file_ext], None
+        return
+    yield first, [0]
+    for part in parts:
+        # Every PDF part is a page; other documents are a single page
+        yield part, ([0] if file_ext == '.pdf' else [])
+
+def extract_unit(file_path, start=0, end=None):
+    """
+    Extract one unit of work: a whole file, or a page range of a PDF. Runs in a worker process.
+    Returns (text, page offsets within the text), with None offsets for placeholder text.
+    """
+    texts, offsets, position = [], [], 0
+    for text, part_offsets in iter_unit_parts(file_path, start, end):
+        if part_offsets is None:
+            return text, None
+        texts.append(text)
+        offsets.extend(position + offset for offset in part_offsets)
+        position += len(text)
+    return "".join(texts), offsets
+
+def plan_units(file_path, pages_per_task=PDF_PAGES_PER_TASK):
+    """Split a file into (start, end) page ranges; non-PDFs (and unreadable PDFs) are one unit"""
+    if os.path.splitext(file_path)[1].lower() != '.pdf' or pages_per_task <= 0:
+        return [(0, None)]
+    try:
+        page_count = pdf_page_count(file_path)
+    except Exception:
+        # Let the worker raise the real error for this file
+        return [(0, None)]
+    if not page_count or page_count <= pages_per_task:
+        return [(0, None)]
+    return [(start, min(start + pages_per_task, page_count)) for start in range(0, page_count, pages_per_task)]
+
+def _plan(files, pages_per_task, cache, workers):
+    """
+    Look files up in the cache and split the rest into units. Returns
+    (units, {file index: cached text}, {file index: error}, {file index: content hash}).
+    """
+    cached, errors, digests = {}, {}, {}
+    units = []  # (file index, start, end)
+    for i, file_path in enumerate(files):
+        if cache is not None:
+            try:
+                digests[i] = cache.digest(file_path)
+                hit = cache.get(digests[i])
+            except OSError as e:
+                errors[i] = str(e)
+                continue
+            if hit is not None:
+                cached[i] = hit[0]
+                continue
+        # Page ranges only pay off when other processes extract them
+        for start, end in plan_units(file_path, pages_per_task if workers > 1 else 0):
+            units.append((i, start, end))
+    return units, cached, errors, digests
+
+def _iter_units(files, units, workers, cancel_event=None, on_progress=None):
+    """
+    Yield (unit, (text, page offsets), error) in unit order, possibly several parts per unit.
+    In-process extraction yields page by page; workers run ahead of the consumer by at most
+    two units each. Either way the extracted text waiting in memory is bounded. Stops early
+    if cancel_event is set.
+    """
+    total = len(units)
+    if workers <= 1 or total <= 1:
+        # Not worth starting processes for
+        for done, unit in enumerate(units, start=1):
+            try:
+                for part in iter_unit_parts(files[unit[0]], unit[1], unit[2]):
+                    if cancel_event is not None and cancel_event.is_set():
+                        return
+                    yield unit, part, None
+            except Exception as e:
+                yield unit, None, str(e)
+            if on_progress:
+                on_progress(done, total)
+        return
+
+    # Forking a process that already runs threads (Qt, the analysis worker) can copy a held
+    # lock into the children, so start them fresh as Windows does
+    executor = ProcessPoolExecutor(max_workers=min(workers, total), mp_context=multiprocessing.get_context("spawn"))
+    try:
+        pending = deque()
+        next_unit = 0
+        for done in range(1, total + 1):
+            while next_unit < total and len(pending) < 2 * workers:
+                unit = units[next_unit]
+                pending.append((unit, executor.submit(extract_unit, files[unit[0]], unit[1], unit[2])))
+                next_unit += 1
+            unit, future = pending.popleft()
+            try:
+                part, error = future.result(), None
+            except Exception as e:
+                part, error = None, str(e)
+            if cancel_event is not None and cancel_event.is_set():
+                return
+            if on_progress:
+                on_progress(done, total)
+            yield unit, part, error
+    finally:
+        executor.shutdown(wait=False, cancel_futures=True)
+
+def iter_documents(files, errors=None, on_progress=None, cancel_event=None, workers=EXTRACT_WORKERS,
+                   pages_per_task=PDF_PAGES_PER_TASK, cache=None):
+    """
+    Yield the text of a document package piece by piece (a header per document, then page
+    ranges), in file order, without collecting it. Failed files are skipped and described in
+    the errors list; a file that fails partway keeps the text already yielded. Documents are
+    added to the cache when they are no larger than the cache allows.
+    """
+    errors = errors if errors is not None else []
+    units, cached, failed, digests = _plan(files, pages_per_task, cache, workers)
+    unit_iter = _iter_units(files, units, workers, cancel_event, on_progress)
+    if not units and on_progress:
+        on_progress(1, 1)
+    limit = cache.max_bytes if cache is not None else 0
+    pending_unit = next(unit_iter, None)
+
+    for i, file_path in enumerate(files):
+        if cancel_event is not None and cancel_event.is_set():
+            return
+        file_name = os.path.basename(file_path)
+        if i in failed:
+            errors.append(f"Error extracting text from {file_name}: {failed[i]}")
+            continue
+        if i in cached:
+            yield f"\n--- Document: {file_name} ---\n"
+            yield cached[i]
+            yield "\n\n"
+            continue
+
+        # Parts are kept for the cache until the document outgrows it
+        parts, offsets, size, started, error = [], [], 0, False, None
+        while pending_unit is not None and pending_unit[0][0] == i:
+            unit, part, unit_error = pending_unit
+            pending_unit = next(unit_iter, None)
+            if error is not None:
+                continue
+            if unit_error is not None:
+                error = unit_error
+                continue
+            text, unit_offsets = part
+            if not started:
+                started = True
+                yield f"\n--- Document: {file_name} ---\n"
+            yield text
+            if parts is not None and unit_offsets is not None and size + len(text) <= limit:
+                offsets.extend(size + offset for offset in unit_offsets)
+                parts.append(text)
+                size += len(text)
+            else:
+                parts = None
+        if error is not None:
+            note = f" (stopped partway; earlier pages were included)" if started else ""
+            errors.append(f"Error extracting text from {file_name}: {error}{note}")
+        elif started and cache is not None and parts is not None:
+            cache.put(digests[i], "".join(parts), offsets)
+        if started:
+            yield "\n\n"
+
+def collect_package(pieces, limit_mb=EXTRACT_MEMORY_MB):
+    """
+    The text of a package as one string when it fits in limit_mb, or else an iterator over all
+    of its pieces: those read so far, then the rest as they are extracted
+    """
+    pieces = iter(pieces)
+    buffered, size = [], 0
+    for piece in pieces:
+        buffered.append(piece)
+        size += len(piece)
+        if size > limit_mb * 1024 * 1024:
+            return itertools.chain(buffered, pieces)
+    return "".join(buffered)
+
+def extract_documents(files, on_progress=None, cancel_event=None, workers=EXTRACT_WORKERS,
+                      pages_per_task=PDF_PAGES_PER_TASK, cache=None):
+    """
+    Extract the text of several files in a process pool, splitting long PDFs into page ranges.
+
+    Returns [(file_path, text, error)] in the order of files, where error is None on success
+    and the exception message otherwise; one failed file doesn't stop the others. Returns
+    None if cancel_event is set. on_progress(done, total) is called as units complete.
+    With an ExtractionCache, files whose contents were extracted before aren't opened.
+    """
+    units, cached, errors, digests = _plan(files, pages_per_task, cache, workers)
+    parts = {}
+    for unit, part, error in _iter_units(files, units, workers, cancel_event, on_progress):
+        if error is not None:
+            errors.setdefault(unit[0], error)
+        else:
+            parts.setdefault(unit[0], []).append(part)
+    if cancel_event is not None and cancel_event.is_set():
+        return None
+    if not units and on_progress:
+        on_progress(1, 1)
+
+    # Stitch the parts back together in order, shifting their page offsets
+    results = []
+    for i, file_path in enumerate(files):
+        if i in errors:
+            results.append((file_path, None, errors[i]))
+            continue
+        if i in cached:
+            results.append((file_path, cached[i], None))
+            continue
+        texts, offsets, cacheable = [], [], True
+        position = 0
+        for text, part_offsets in parts.get(i, []):
+            texts.append(text)
+            if part_offsets is None:
+                cacheable = False
+            else:
+                offsets.extend(position + offset for offset in part_offsets)
+            position += len(text)
+        text = "".join(texts)
+        if cache is not None and cacheable:
+            cache.put(digests[i], text, offsets)
+        results.append((file_path, text, None))
+    return results
@@ -0,0 +1,130 @@
+import os
+
+import numpy as np
+
+from UI.document_summary import SECTIONS, iter_chunks
+from UI.document_dedup import DOCUMENT_HEADER, estimate_tokens
+from lexical_filter import BM25, tokenize
+
+# Send only the passages most relevant to each analysis section once a package is larger than
+# the token budget; 0 summarizes the whole package
+ANALYSIS_RETRIEVAL = os.getenv("ANALYSIS_RETRIEVAL", "1") != "0"
+# Estimated tokens of document text analyzed per package, which bounds the analysis time
+RETRIEVAL_TOKEN_BUDGET = int(os.getenv("RETRIEVAL_TOKEN_BUDGET", "12000"))
+# Characters per passage that is scored and selected
+RETRIEVAL_CHUNK_CHARS = int(os.getenv("RETRIEVAL_CHUNK_CHARS", "2000"))
+
+# Terms a passage relevant to each section tends to use
+SECTION_QUERIES = {
+    "overview": "project scope overview description objective background statement work purpose requirement summary",
+    "requirements": "specification requirement material dimension tolerance standard drawing finish quantity steel "
+                    "stainless aluminum weld fabricate fabrication sheet metal gauge thickness machining bend cut",
+    "dates": "closing date deadline submission due time schedule delivery completion period award question enquiry",
+    "client": "department organization agency contracting authority contact officer buyer address telephone email",
+    "evaluation": "evaluation criteria point score rated mandatory weight basis selection method compliance lowest",
+    "budget": "budget price pricing cost estimated value payment funding dollar amount total basis fixed",
+    "special": "special security clearance insurance bonding warranty certification site visit inspection condition",
+}
+
+class ChunkRetriever:
+    """
+    Picks the passages of a large package worth analyzing.
+
+    The package is cut into passages per document and indexed with BM25. Each
+    analysis section takes its best-scoring passage in turn until the token budget
+    is spent, so cover pages, forms and legal boilerplate lose out to the scope,
+    specifications, dates and evaluation criteria. The selection is sent in
+    document order under its document headers, with gaps marked.
+    """
+
+    def __init__(self, budget_tokens=RETRIEVAL_TOKEN_BUDGET, chunk_chars=RETRIEVAL_CHUNK_CHARS):
+        self.budget_tokens = budget_tokens
+        self.chunk_chars = chunk_chars
+        self.counts = {"chunks": 0, "selected": 0, "tokens_before": 0, "tokens_after": 0}
+
+    def needs_selection(self, text):
+        return estimate_tokens(text) > self.budget_tokens
+
+    def passages(self, text):
+        """[(document header, passage)] in document order"""
+        parts = DOCUMENT_HEADER.split(text)
+        # parts is [text before the first header, name, body, name, body, ...]
+        documents = [("", parts[0])] + [(f"\n--- Document: {name} ---\n", body)
+                                        for name, body in zip(parts[1::2], parts[2::2])]
+        return [(header, chunk) for header, body in documents for chunk in iter_chunks([body], self.chunk_chars)]
+
+    def rank(self, passages):
+        """Passage indices for each section, best first; passages without any query term are left out"""
+        queries = {key: tokenize(SECTION_QUERIES[key]) for key, _ in SECTIONS}
+        vocabulary = {token for tokens in queries.values() for token in tokens}
+        # Only query terms are kept per passage (with its length), not every token of the package
+        documents, lengths = [], []
+        for _, chunk in passages:
+            tokens = tokenize(chunk)
+            documents.append([token for token in tokens if token in vocabulary])
+            lengths.append(len(tokens))
+        index = BM25(documents, vocabulary=vocabulary, lengths=lengths)
+        rankings = []
+        for key, _ in SECTIONS:
+            scores = index.scores(queries[key])
+            order = np.argsort(-scores, kind="stable")
+            rankings.append([int(i) for i in order if scores[i] > 0])
+        return rankings
+
+    def select(self, text):
+        """The text of the passages chosen for the budget, under their document headers"""
+        passages = self.passages(text)
+        rankings = self.rank(passages) if passages else []
+        chosen, used = set(), 0
+        positions = [0] * len(rankings)
+        # Sections take turns so each gets its best passages before any gets its tenth
+        progress = True
+        while progress:
+            progress = False
+            for section, ranking in enumerate(rankings):
+                while positions[section] < len(ranking):
+                    i = ranking[positions[section]]
+                    positions[section] += 1
+                    cost = estimate_tokens(passages[i][1])
+                    if i in chosen or used + cost > self.budget_tokens:
+                        continue
+                    chosen.add(i)
+                    used += cost
+                    progress = True
+                    break
+        if not chosen:
+            # Nothing matched the queries (another language, scanned forms): keep the opening passages
+            for i, (_, chunk) in enumerate(passages):
+                if used + estimate_tokens(chunk) > self.budget_tokens:
+                    break
+                chosen.add(i)
+                used += estimate_tokens(chunk)
+
+        output, previous_header, previous = [], None, -1
+        for i in sorted(chosen):
+            header, chunk = passages[i]
+            if header != previous_header:
+                output.append(header)
+                previous_header = header
+            elif i != previous + 1:
+                output.append("[...]\n\n")
+            output.append(chunk + "\n\n")
+            previous = i
+
+        result = "".join(output)
+        self.counts["chunks"] += len(passages)
+        self.counts["selected"] += len(chosen)
+        self.counts["tokens_before"] += estimate_tokens(text)
+        self.counts["tokens_after"] += estimate_tokens(result)
+        return result
+
+    def coverage_note(self):
+        """One line for the analysis result saying how much of the package was read"""
+        share = self.counts["tokens_after"] / self.counts["tokens_before"] if self.counts["tokens_before"] else 1.0
+        return (f"The package was too large to analyze in full: {self.counts['selected']:,} of "
+                f"{self.counts['chunks']:,} passages (about {share:.0%} of its text), those most relevant to "
+                f"each section, were analyzed. Set ANALYSIS_RETRIEVAL=0 to analyze everything.")
+
+    def report(self):
+        return (f"Retrieval: {self.counts['selected']} of {self.counts['chunks']} passages selected, "
+                f"~{self.counts['tokens_after']:,} of ~{self.counts['tokens_before']:,} tokens analyzed")
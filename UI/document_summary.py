@@ -0,0 +1,284 @@
+import os
+import re
+import json
+import time
+import sqlite3
+import hashlib
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+from UI import resource_path
+from llm_client import LLMError
+
+ANALYSIS_MODEL = "qwen2.5-7b-instruct-1m"
+# Characters per map chunk; documents at or under this size are analyzed in a single pass
+SUMMARY_CHUNK_CHARS = int(os.getenv("SUMMARY_CHUNK_CHARS", "5000"))
+# Chunk summaries requested from LM Studio at the same time
+SUMMARY_MAP_CONCURRENCY = int(os.getenv("SUMMARY_MAP_CONCURRENCY", "4"))
+# Merged notes above this size are summarized again before the reduce pass
+SUMMARY_REDUCE_CHARS = int(os.getenv("SUMMARY_REDUCE_CHARS", "12000"))
+# Seconds to wait for one chunk summary
+SUMMARY_TIMEOUT = 300
+
+# Sections of the final analysis; each chunk summary fills the same keys
+SECTIONS = [
+    ("overview", "Project overview and scope"),
+    ("requirements", "Key requirements and specifications"),
+    ("dates", "Submission deadlines and important dates"),
+    ("client", "Client/organization information"),
+    ("evaluation", "Evaluation criteria"),
+    ("budget", "Budget information"),
+    ("special", "Unique or special requirements"),
+]
+
+MAP_PROMPT = """You extract facts from one part of a tender document package. Read the excerpt and respond only with a JSON object with these keys, each a list of short factual bullet strings (use an empty list when the excerpt has nothing for a key):
+{keys}
+Copy dates, quantities, standards and amounts exactly. Do not invent information.""".format(
+    keys="\n".join(f'- "{key}": {title}' for key, title in SECTIONS))
+
+REDUCE_PROMPT = """Please analyze the following tender document(s). They were too large to send at once, so these are notes extracted from the package, grouped by topic:
+
+{notes}"""
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS chunk_summaries (
+    key TEXT PRIMARY KEY,
+    summary TEXT NOT NULL,
+    created_at REAL NOT NULL
+);
+"""
+
+def iter_chunks(pieces, size=SUMMARY_CHUNK_CHARS):
+    """
+    Chunk a stream of text pieces into chunks of at most size characters, breaking at paragraph
+    or line ends where possible. Only about one chunk of text is buffered at a time.
+    """
+    buffer = ""
+    for piece in pieces:
+        buffer += piece
+        start = 0
+        # A cut is only final once text beyond the window has arrived
+        while len(buffer) - start > size:
+            end = start + size
+            # Prefer a paragraph break, then a line break, in the second half of the window
+            for separator in ("\n\n", "\n"):
+                cut = buffer.rfind(separator, start + size // 2, end)
+                if cut != -1:
+                    end = cut + len(separator)
+                    break
+            chunk = buffer[start:end].strip()
+            if chunk:
+                yield chunk
+            start = end
+        buffer = buffer[start:]
+    chunk = buffer.strip()
+    if chunk:
+        yield chunk
+
+def split_into_chunks(text, size=SUMMARY_CHUNK_CHARS):
+    """Split text into chunks of at most size characters, breaking at paragraph or line ends where possible"""
+    return list(iter_chunks([text], size))
+
+def parse_partial_summary(content):
+    """Turn a map reply into {section key: [bullets]}; unparseable replies are kept as overview notes"""
+    content = re.sub(r'<think>.*?</think>', '', content, flags=re.DOTALL)
+    start, end = content.find('{'), content.rfind('}')
+    data = None
+    if start != -1 and end > start:
+        try:
+            data = json.loads(content[start:end + 1])
+        except ValueError:
+            data = None
+    if not isinstance(data, dict):
+        return {"overview": [content.strip()]} if content.strip() else {}
+
+    summary = {}
+    for key, _ in SECTIONS:
+        items = data.get(key) or []
+        if isinstance(items, str):
+            items = [items]
+        items = [str(item).strip() for item in items if str(item).strip()]
+        if items:
+            summary[key] = items
+    return summary
+
+def merge_summaries(summaries):
+    """Combine partial summaries section by section, dropping bullets repeated across chunks"""
+    merged = {key: [] for key, _ in SECTIONS}
+    seen = set()
+    for summary in summaries:
+        for key, _ in SECTIONS:
+            for item in summary.get(key, []):
+                normalized = " ".join(item.lower().split())
+                if normalized not in seen:
+                    seen.add(normalized)
+                    merged[key].append(item)
+    return merged
+
+def format_notes(merged):
+    parts = []
+    for key, title in SECTIONS:
+        if merged.get(key):
+            parts.append(title + ":\n" + "\n".join(f"- {item}" for item in merged[key]))
+    return "\n\n".join(parts)
+
+class ChunkSummaryCache:
+    """
+    Chunk summaries on disk keyed by a hash of the chunk text, the map prompt and the
+    model, so re-analyzing a package (or one that shares documents with an earlier
+    one) only sends the chunks that haven't been seen before.
+    """
+
+    def __init__(self, path=None):
+        self.path = path or resource_path("tender_data/chunk_summary_cache.db")
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.path, timeout=30, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript(SCHEMA)
+        self.counts = {"hits": 0, "misses": 0}
+
+    @staticmethod
+    def key(chunk, model=ANALYSIS_MODEL):
+        digest = hashlib.sha256()
+        for part in (MAP_PROMPT, model, chunk):
+            digest.update(part.encode("utf-8"))
+            digest.update(b"\0")
+        return digest.hexdigest()
+
+    def get(self, key):
+        with self._lock:
+            row = self._conn.execute("SELECT summary FROM chunk_summaries WHERE key = ?", (key,)).fetchone()
+            self.counts["hits" if row is not None else "misses"] += 1
+        return json.loads(row[0]) if row is not None else None
+
+    def put(self, key, summary):
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO chunk_summaries (key, summary, created_at) VALUES (?, ?, ?)",
+                (key, json.dumps(summary), time.time()),
+            )
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+class MapReduceSummarizer:
+    """
+    Summarizes documents too large for one prompt.
+
+    The text is split into chunks that are summarized concurrently (map) into
+    structured notes with the same sections as the final analysis. The notes are
+    merged and deduplicated in Python, and if they are still too long they go
+    through another map round. The caller then runs the reduce pass on the notes, so
+    every chunk is read by the model once and the work grows linearly with the size
+    of the package.
+    """
+
+    def __init__(self, client, cache=None, concurrency=SUMMARY_MAP_CONCURRENCY, chunk_chars=SUMMARY_CHUNK_CHARS):
+        self.client = client
+        self.cache = cache or ChunkSummaryCache()
+        self.concurrency = max(1, concurrency)
+        self.chunk_chars = chunk_chars
+
+    def needs_map_reduce(self, text):
+        return len(text) > self.chunk_chars
+
+    def reduce_prompt(self, text, cancel_event=None, on_progress=None, errors=None):
+        """
+        Map the text into merged notes and return the user message for the reduce pass,
+        or None if cancelled. text may also be an iterable of pieces (a document package
+        still being extracted), which is chunked and summarized as it arrives.
+        on_progress(done, total) is called as chunks finish; total is None while the
+        number of chunks isn't known yet. Parts that couldn't be summarized are left out
+        and described in the errors list.
+        """
+        source_length = [0]
+
+        def counted(pieces):
+            for piece in pieces:
+                source_length[0] += len(piece)
+                yield piece
+
+        pieces = [text] if isinstance(text, str) else text
+        chunks = iter_chunks(counted(pieces), self.chunk_chars)
+        summaries = self.map_chunks(chunks, cancel_event, on_progress, errors)
+        if summaries is None:
+            return None
+        previous_length, chunk_count = source_length[0], len(summaries)
+        notes = format_notes(merge_summaries(summaries))
+        # Each further round shrinks the notes; stop once they fit or stop shrinking
+        while len(notes) > SUMMARY_REDUCE_CHARS and chunk_count > 1 and len(notes) < previous_length:
+            chunks = split_into_chunks(notes, self.chunk_chars)
+            summaries = self.map_chunks(chunks, cancel_event, on_progress, errors)
+            if summaries is None:
+                return None
+            previous_length, chunk_count = len(notes), len(chunks)
+            notes = format_notes(merge_summaries(summaries))
+        return REDUCE_PROMPT.format(notes=notes)
+
+    def map_chunks(self, chunks, cancel_event=None, on_progress=None, errors=None):
+        """
+        Summarize chunks concurrently and return the summaries in order, or None if cancelled.
+        chunks may be a generator; only a couple of chunks per worker are read ahead of the
+        summaries, so the text of a large package is never held all at once. A chunk that
+        times out or is refused gets an empty summary and is described in the errors list;
+        if every chunk fails, the last error is raised.
+        """
+        total = len(chunks) if hasattr(chunks, "__len__") else None
+        summaries = []
+        failures = []
+        pending = deque()
+
+        def collect():
+            future = pending.popleft()
+            try:
+                summaries.append(future.result())
+            except (TimeoutError, LLMError) as e:
+                failures.append(e)
+                summaries.append({})
+                if errors is not None:
+                    errors.append(f"Document part {len(summaries)} could not be summarized: {str(e)}")
+            if on_progress:
+                on_progress(len(summaries), total)
+
+        with ThreadPoolExecutor(max_workers=self.concurrency) as executor:
+            for chunk in chunks:
+                if cancel_event is not None and cancel_event.is_set():
+                    break
+                pending.append(executor.submit(self.summarize_chunk, chunk))
+                while len(pending) >= 2 * self.concurrency:
+                    collect()
+            while pending:
+                collect()
+        print(f"Chunk summaries: {self.cache.counts['hits']} cached, {self.cache.counts['misses']} generated"
+              + (f", {len(failures)} failed" if failures else ""))
+        if cancel_event is not None and cancel_event.is_set():
+            return None
+        if failures and len(failures) == len(summaries):
+            raise failures[-1]
+        return summaries
+
+    def summarize_chunk(self, chunk):
+        key = ChunkSummaryCache.key(chunk)
+        summary = self.cache.get(key)
+        if summary is not None:
+            return summary
+
+        payload = {
+            "model": ANALYSIS_MODEL,
+            "messages": [
+                {"role": "system", "content": MAP_PROMPT},
+                {"role": "user", "content": chunk},
+            ],
+            "temperature": 0.1,
+            "max_tokens": 1024,
+            "stream": False
+        }
+        result = self.client.chat(payload, timeout=SUMMARY_TIMEOUT)
+        if result is None:
+            raise TimeoutError(f"LM Studio did not summarize a document part within {SUMMARY_TIMEOUT} seconds")
+        summary = parse_partial_summary(result["choices"][0]["message"]["content"])
+        self.cache.put(key, summary)
+        return summary
@@ -0,0 +1,113 @@
+import os
+import json
+import time
+import sqlite3
+import hashlib
+import threading
+
+from UI import resource_path
+
+# Bump when extraction changes so cached text from the old extractors is ignored
+EXTRACTOR_VERSION = "1"
+# Total size of cached text before the least recently used documents are evicted
+EXTRACTION_CACHE_MB = float(os.getenv("EXTRACTION_CACHE_MB", "200"))
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS files (
+    path TEXT PRIMARY KEY,
+    size INTEGER NOT NULL,
+    mtime REAL NOT NULL,
+    digest TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS extracts (
+    digest TEXT PRIMARY KEY,
+    text TEXT NOT NULL,
+    page_offsets TEXT NOT NULL,
+    bytes INTEGER NOT NULL,
+    last_used REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_extracts_last_used ON extracts (last_used);
+"""
+
+def file_digest(file_path):
+    """sha256 of the file contents (with the extractor version and file type), read in blocks"""
+    digest = hashlib.sha256()
+    digest.update(f"{EXTRACTOR_VERSION}\0{os.path.splitext(file_path)[1].lower()}\0".encode("utf-8"))
+    with open(file_path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+class ExtractionCache:
+    """
+    Extracted document text on disk, keyed by a hash of the file contents.
+
+    A path whose size and mtime haven't changed reuses its recorded hash, so a
+    cache hit doesn't read the file at all; otherwise the file is hashed, which
+    also finds copies of a document under another name. Entries hold the text and
+    the character offset of each page. Once the stored text passes the size cap,
+    the least recently used documents are evicted.
+    """
+
+    def __init__(self, path=None, max_mb=EXTRACTION_CACHE_MB):
+        self.path = path or resource_path("tender_data/extraction_cache.db")
+        self.max_bytes = int(max_mb * 1024 * 1024)
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.path, timeout=30, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript(SCHEMA)
+        self.counts = {"hits": 0, "misses": 0, "evicted": 0}
+
+    def digest(self, file_path):
+        """Content hash of a file, reusing the recorded one while its size and mtime are unchanged"""
+        file_path = os.path.abspath(file_path)
+        stat = os.stat(file_path)
+        with self._lock:
+            row = self._conn.execute("SELECT size, mtime, digest FROM files WHERE path = ?", (file_path,)).fetchone()
+        if row is not None and row[0] == stat.st_size and row[1] == stat.st_mtime:
+            return row[2]
+        digest = file_digest(file_path)
+        with self._lock, self._conn:
+            self._conn.execute("INSERT OR REPLACE INTO files (path, size, mtime, digest) VALUES (?, ?, ?, ?)",
+                               (file_path, stat.st_size, stat.st_mtime, digest))
+        return digest
+
+    def get(self, digest):
+        """(text, page offsets) for a content hash, or None"""
+        with self._lock, self._conn:
+            row = self._conn.execute("SELECT text, page_offsets FROM extracts WHERE digest = ?", (digest,)).fetchone()
+            self.counts["hits" if row is not None else "misses"] += 1
+            if row is not None:
+                self._conn.execute("UPDATE extracts SET last_used = ? WHERE digest = ?", (time.time(), digest))
+        return (row[0], json.loads(row[1])) if row is not None else None
+
+    def put(self, digest, text, page_offsets):
+        size = len(text.encode("utf-8"))
+        if size > self.max_bytes:
+            return
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO extracts (digest, text, page_offsets, bytes, last_used) VALUES (?, ?, ?, ?, ?)",
+                (digest, text, json.dumps(page_offsets), size, time.time()),
+            )
+            self._evict()
+
+    def _evict(self):
+        total = self._conn.execute("SELECT COALESCE(SUM(bytes), 0) FROM extracts").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        for digest, size in self._conn.execute("SELECT digest, bytes FROM extracts ORDER BY last_used").fetchall():
+            if total <= self.max_bytes:
+                break
+            self._conn.execute("DELETE FROM extracts WHERE digest = ?", (digest,))
+            total -= size
+            self.counts["evicted"] += 1
+
+    def report(self):
+        return (f"Extraction cache: {self.counts['hits']} documents reused, {self.counts['misses']} extracted, "
+                f"{self.counts['evicted']} evicted")
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
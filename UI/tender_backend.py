@@ -1,38 +1,132 @@
 import sys
 import os
 import pandas as pd
-import subprocess
 import threading
-import requests
 import json
+import time
 from PySide6.QtWidgets import (QApplication, QMainWindow, QTableView, QDialog, 
                               QFileDialog, QMessageBox, QProgressDialog, QListWidgetItem,
                               QVBoxLayout, QLabel, QAbstractItemView)
 from PySide6.QtCore import Qt, QTimer, QMimeData, QUrl, Signal, QObject
-from PySide6.QtGui import QStandardItemModel, QStandardItem, QDragEnterEvent, QDropEvent
+from PySide6.QtGui import QStandardItemModel, QStandardItem, QDragEnterEvent, QDropEvent, QTextCursor
 from UI.tender_ui import Ui_MainWindow 
 from UI.add_tender_dialog import AddTenderDialog
+from UI.document_summary import MapReduceSummarizer, ANALYSIS_MODEL
+from UI.document_extract import SUPPORTED_EXTENSIONS, EXTRACT_MEMORY_MB, collect_package, iter_documents
+from UI.extraction_cache import ExtractionCache
+from UI.document_dedup import DEDUP_DOCUMENTS, DocumentDeduplicator
+from UI.document_retrieval import ANALYSIS_RETRIEVAL, ChunkRetriever
 from UI import resource_path
+from tender_store import TenderStore
+from llm_client import LLMError, get_llm_client
 from reportlab.lib.pagesizes import letter
 from reportlab.pdfgen import canvas
 
-# Supported file extensions and their handling methods
-SUPPORTED_EXTENSIONS = {
-    '.pdf': 'extract_text_from_pdf',
-    '.docx': 'extract_text_from_docx',
-    '.doc': 'extract_text_from_doc',
-    '.txt': 'extract_text_from_txt',
-    '.rtf': 'extract_text_from_rtf'
-}
+# Minimum time between streamed updates of the analysis text, so the UI isn't redrawn per token
+STREAM_UPDATE_INTERVAL = 0.15
+# Seconds to wait for each chunk of a streamed analysis (or the whole reply when not streaming)
+LM_STUDIO_READ_TIMEOUT = 300
 
 # Worker class to handle signals between threads
 class WorkerSignals(QObject):
     update_progress = Signal(int)
     update_text = Signal(str)
+    append_text = Signal(str)
     clear_text = Signal()
     finished = Signal()
     error = Signal(str)
 
+class ResponseCleaner:
+    """
+    Line-by-line filter for AI response artifacts (thinking blocks, JSON fragments, API
+    metadata). State carries over between lines, so a streamed response can be cleaned
+    one line at a time as it arrives.
+    """
+
+    def __init__(self):
+        # Flag to track if we're inside an unclosed <think> tag
+        self.in_think_tag = False
+        # Flag to track if we're inside a thinking/internal monologue block
+        self.in_thinking_block = False
+        # Flag to track if we're inside a JSON/code block
+        self.in_json_block = False
+        # Flag to track if we've started collecting real content
+        self.content_started = False
+
+    def feed(self, line):
+        """Return the line if it is real content, or None if it should be dropped"""
+        line_lower = line.lower().strip()
+        
+        # Hide reasoning while it streams; the closing line is handled like the other markers below
+        if self.in_think_tag:
+            if '</think>' not in line_lower:
+                return None
+            self.in_think_tag = False
+        elif '<think>' in line_lower and '</think>' not in line_lower:
+            self.in_think_tag = True
+            return None
+        
+        # Check for thinking/reasoning blocks starting patterns
+        if (line_lower.startswith('/') or 
+            line_lower.startswith('thinking:') or 
+            line_lower.startswith('[thinking]') or
+            '</think>' in line_lower or
+            line_lower.startswith('thinking ')):
+            self.in_thinking_block = True
+            return None
+            
+        # Check for end of thinking block
+        if self.in_thinking_block and (line_lower == '' or line_lower.startswith('#') or line_lower.startswith('---')):
+            self.in_thinking_block = False
+            return None
+            
+        # Skip lines inside thinking blocks
+        if self.in_thinking_block:
+            return None
+            
+        # Check for JSON/code block patterns
+        if (line_lower.startswith('{') and ('"' in line_lower or ':' in line_lower)) or line_lower.startswith('[{'):
+            self.in_json_block = True
+            return None
+            
+        # Check for end of JSON block
+        if self.in_json_block and (line_lower.endswith('}') or line_lower.endswith('],') or line_lower.endswith(']}')) or line_lower.endswith('}'):
+            self.in_json_block = False
+            return None
+            
+        # Skip lines inside JSON blocks
+        if self.in_json_block:
+            return None
+            
+        # Remove other markdown artifacts often used by AI models
+        if (line_lower.startswith('```') or 
+            line_lower.startswith('**note:**') or 
+            line_lower == '<answer>' or 
+            line_lower == '</answer>' or
+            '<|' in line_lower and '|>' in line_lower or
+            line_lower.startswith('usage:') or
+            line_lower.startswith('prompt_tokens:') or
+            line_lower.startswith('completion_tokens:') or
+            line_lower.startswith('total_tokens:') or
+            line_lower.startswith('response:') or
+            line_lower.startswith('stats:') or
+            line_lower.startswith('system_fingerprint:')) or line_lower.startswith('###'):
+            return None
+
+        # Skip any lines that look like JSON keys or values in API responses
+        if (': {' in line or ': [' in line or 
+            line_lower.strip() == '},' or 
+            line_lower.strip() == '],' or
+            ('"' in line and ':' in line and line.strip().endswith(','))):
+            return None
+            
+        # Lines likely to be real content
+        if len(line_lower) > 0:
+            self.content_started = True
+        
+        # Only keep non-empty lines once content has started
+        return line if self.content_started else None
+
 class TenderBackend(QMainWindow):
     def __init__(self):
         super().__init__()
@@ -43,28 +137,33 @@ class TenderBackend(QMainWindow):
         self.worker_signals = WorkerSignals()
         self.worker_signals.update_progress.connect(self.ui.ProcessProgress.setValue)
         self.worker_signals.update_text.connect(self.update_analysis_text)
+        self.worker_signals.append_text.connect(self.append_analysis_text)
         self.worker_signals.clear_text.connect(self.ui.AnalysisResults.clear)
         self.worker_signals.error.connect(self.show_error_message)
+        self.worker_signals.finished.connect(self.analysis_finished)
         
-        # LM Studio API endpoint
-        self.lm_studio_api = "http://localhost:1234/v1/chat/completions"
+        # LM Studio client shared with the scraper's relevance filter
+        self.llm = get_llm_client()
+        self.lm_studio_api = self.llm.api_url
+        # Splits document packages too large for one prompt into cached, parallel chunk summaries
+        self.summarizer = MapReduceSummarizer(self.llm)
+        # Extracted text of documents already analyzed, keyed by file contents
+        self.extraction_cache = ExtractionCache()
         
-        # CSV file path (stored in the tender_data folder)
-        self.csv_file = resource_path("tender_data/filtered_tenders.csv")
+        # Tender store shared with the scraping pipeline (stored in the tender_data folder)
+        self.store = TenderStore(resource_path("tender_data/tenders.db"))
         
         # Initialize variables for file upload and processing
         self.uploaded_files = []
+        # Set while a document analysis is running; setting the event stops the stream
+        self.analysis_cancel_event = None
         
         # Set up the FileList QListWidget to allow multiple selection and checkable items
         self.ui.FileList.setSelectionMode(QAbstractItemView.ExtendedSelection)
         
-        if not os.path.exists(self.csv_file):
-            QMessageBox.critical(self, "Error", "Could not find tender data file. Please ensure the application data files are properly set up.")
-            sys.exit(1)
-            
-        # Load CSV data into a QStandardItemModel
+        # Load tender data into a QStandardItemModel
         try:
-            self.model = self.load_csv_model()
+            self.model = self.load_tender_model()
             self.ui.TenderList.setModel(self.model)
             self.ui.TenderList.setSelectionBehavior(QTableView.SelectRows)
             self.ui.TenderList.setSelectionMode(QTableView.SingleSelection)
@@ -89,7 +188,7 @@ class TenderBackend(QMainWindow):
         # Connect AI Analysis page buttons
         self.ui.UploadFileButton.clicked.connect(self.upload_file)
         self.ui.ExportToPDFButton_2.clicked.connect(self.export_analysis_to_pdf)
-        self.ui.ProcessTenderButton.clicked.connect(self.process_selected_documents)
+        self.ui.ProcessTenderButton.clicked.connect(self.toggle_document_processing)
         
         # Setup drag and drop for the AI Analysis page
         self.setup_drag_and_drop()
@@ -106,6 +205,20 @@ class TenderBackend(QMainWindow):
         """Update the analysis text widget with the given text."""
         self.ui.AnalysisResults.setPlainText(text)
         
+    def append_analysis_text(self, text):
+        """Append streamed text to the end of the analysis widget and keep it in view."""
+        cursor = self.ui.AnalysisResults.textCursor()
+        cursor.movePosition(QTextCursor.End)
+        cursor.insertText(text)
+        self.ui.AnalysisResults.setTextCursor(cursor)
+        self.ui.AnalysisResults.ensureCursorVisible()
+        
+    def analysis_finished(self):
+        """Restore the Process button once the background analysis is done."""
+        self.analysis_cancel_event = None
+        self.ui.ProcessTenderButton.setEnabled(True)
+        self.ui.ProcessTenderButton.setText("Process")
+        
     def show_error_message(self, message):
         """Show an error message in the UI."""
         QMessageBox.critical(self, "Error", message)
@@ -190,6 +303,15 @@ class TenderBackend(QMainWindow):
         
         return selected_files
     
+    def toggle_document_processing(self):
+        """The Process button doubles as Cancel while an analysis is streaming"""
+        if self.analysis_cancel_event is not None:
+            self.analysis_cancel_event.set()
+            self.ui.ProcessTenderButton.setEnabled(False)
+            self.ui.ProcessTenderButton.setText("Cancelling...")
+        else:
+            self.process_selected_documents()
+    
     def process_selected_documents(self):
         """Process only the selected documents"""
         selected_files = self.get_selected_files()
@@ -207,72 +329,82 @@ class TenderBackend(QMainWindow):
         QApplication.processEvents()
         
         # Process documents in a background thread to avoid UI freezing
-        thread = threading.Thread(target=self.process_documents_thread, args=(selected_files,))
+        self.analysis_cancel_event = threading.Event()
+        self.ui.ProcessTenderButton.setText("Cancel")
+        thread = threading.Thread(target=self.process_documents_thread,
+                                  args=(selected_files, self.analysis_cancel_event))
         thread.daemon = True  # Make thread daemon so it exits when main thread exits
         thread.start()
 
-    def process_documents_thread(self, files_to_process):
+    def process_documents_thread(self, files_to_process, cancel_event=None):
         """Process documents in a background thread"""
         try:
-            # Analyze each document
-            total_files = len(files_to_process)
-            all_text_content = ""
-            
-            for i, file_path in enumerate(files_to_process):
-                # Extract text from document
-                file_ext = os.path.splitext(file_path)[1].lower()
-                file_name = os.path.basename(file_path)
-                
-                # Update progress
-                progress_value = int((i / total_files) * 50)  # First half of progress bar for extraction
-                self.worker_signals.update_progress.emit(progress_value)
-                
-                try:
-                    # Extract text based on file type
-                    if file_ext == '.pdf':
-                        text_content = self.extract_text_from_pdf(file_path)
-                    elif file_ext in ('.docx', '.doc'):
-                        text_content = self.extract_text_from_word(file_path)
-                    elif file_ext == '.txt':
-                        text_content = self.extract_text_from_txt(file_path)
-                    elif file_ext == '.rtf':
-                        text_content = self.extract_text_from_rtf(file_path)
-                    else:
-                        text_content = f"Unsupported file type: {file_ext}"
-                    
-                    # Add document content to combined text
-                    all_text_content += f"\n--- Document: {file_name} ---\n{text_content}\n\n"
-                    
-                except Exception as e:
-                    error_msg = f"Error extracting text from {file_name}: {str(e)}"
-                    self.worker_signals.update_text.emit(error_msg)
-                    return
+            # Extract every document in worker processes; large PDFs are split into page ranges
+            def extract_progress(done, total):
+                self.worker_signals.update_progress.emit(int(done / total * 50))  # First half of progress bar for extraction
+            errors = []
+            pieces = iter_documents(files_to_process, errors, extract_progress, cancel_event, cache=self.extraction_cache)
+            
+            # Collect the package text up to the memory ceiling; past it, the rest is summarized
+            # while it is still being extracted instead of being held in memory
+            all_text_content = collect_package(pieces)
+            streaming = not isinstance(all_text_content, str)
+            if cancel_event is not None and cancel_event.is_set():
+                self.worker_signals.update_text.emit("[Analysis cancelled]")
+                self.worker_signals.update_progress.emit(0)
+                return
+            if streaming:
+                print(f"Document package is over {EXTRACT_MEMORY_MB:g} MB of text, summarizing all of it as it is "
+                      f"extracted (no deduplication or passage retrieval)")
+            elif DEDUP_DOCUMENTS:
+                # Copies of a document and repeated boilerplate would be read by the model again
+                deduplicator = DocumentDeduplicator()
+                all_text_content = deduplicator.dedup(all_text_content)
+                print(deduplicator.report())
             
             # Update progress to 50%
             self.worker_signals.update_progress.emit(50)
             
-            if all_text_content:
+            if streaming or all_text_content.strip():
                 # Clear previous content
                 self.worker_signals.clear_text.emit()
                 
                 # Show processing message
                 self.worker_signals.update_text.emit("Sending to LM Studio for analysis...")
                 
-                # Send to LM Studio API
-                analysis_result = self.analyze_with_lm_studio(all_text_content)
+                # Stream the analysis from LM Studio; text appears as it is generated
+                started = [False]
+                def show_partial(text):
+                    if not started[0]:
+                        # Replace the waiting message with the first streamed text
+                        started[0] = True
+                        self.worker_signals.clear_text.emit()
+                    self.worker_signals.append_text.emit(text)
+                analysis_result = self.analyze_with_lm_studio(all_text_content, show_partial, cancel_event, errors)
+                print(self.extraction_cache.report())
+                for error in errors:
+                    print(error)
+                extraction_errors = "".join(f"\n{error}" for error in errors)
                 
                 # Log the result
                 print(f"Analysis result received (first 100 chars): {analysis_result[:100] if analysis_result else 'None'}")
                 
                 # Update UI with results - THIS IS THE CRITICAL PART
+                if cancel_event is not None and cancel_event.is_set():
+                    self.worker_signals.append_text.emit("\n\n[Analysis cancelled]")
+                    self.worker_signals.update_progress.emit(0)
+                    return
                 if analysis_result:
+                    # Swap the streamed text for the fully cleaned result
                     # Use the signal to update the UI from the background thread
                     self.worker_signals.clear_text.emit()  # Clear first
-                    self.worker_signals.update_text.emit(analysis_result)
+                    self.worker_signals.update_text.emit(analysis_result + (f"\n\nNot included in the analysis:{extraction_errors}"
+                                                                            if extraction_errors else ""))
                 else:
-                    self.worker_signals.update_text.emit("No analysis was returned from LM Studio.")
+                    self.worker_signals.update_text.emit("No analysis was returned from LM Studio." + extraction_errors)
             else:
-                self.worker_signals.update_text.emit("No text content could be extracted from the selected documents.")
+                self.worker_signals.update_text.emit("No text content could be extracted from the selected documents."
+                                                     + "".join(f"\n{error}" for error in errors))
             
             # Update progress to 100%
             self.worker_signals.update_progress.emit(100)
@@ -284,49 +416,17 @@ class TenderBackend(QMainWindow):
             print(f"Error in processing thread: {error_message}")
             self.worker_signals.error.emit(error_message)
             self.worker_signals.update_progress.emit(0)
+        finally:
+            self.worker_signals.finished.emit()
 
-    def extract_text_from_pdf(self, file_path):
-        """Extract text from PDF file"""
-        try:
-            from PyPDF2 import PdfReader
-            reader = PdfReader(file_path)
-            text = ""
-            for page in reader.pages:
-                text += page.extract_text() + "\n"
-            return text
-        except ImportError:
-            return "PyPDF2 library is not installed. Unable to extract text from PDF."
-    
-    def extract_text_from_word(self, file_path):
-        """Extract text from Word document"""
-        try:
-            import docx
-            doc = docx.Document(file_path)
-            text = ""
-            for para in doc.paragraphs:
-                text += para.text + "\n"
-            return text
-        except ImportError:
-            return "python-docx library is not installed. Unable to extract text from Word document."
-    
-    def extract_text_from_txt(self, file_path):
-        """Extract text from plain text file"""
-        with open(file_path, 'r', encoding='utf-8', errors='replace') as file:
-            return file.read()
-    
-    def extract_text_from_rtf(self, file_path):
-        """Extract text from RTF file"""
-        try:
-            from striprtf.striprtf import rtf_to_text
-            with open(file_path, 'r', encoding='utf-8', errors='replace') as file:
-                rtf_text = file.read()
-                text = rtf_to_text(rtf_text)
-                return text
-        except ImportError:
-            return "striprtf library is not installed. Unable to extract text from RTF."
-    
-    def analyze_with_lm_studio(self, text_content):
-        """Send document text to LM Studio API for analysis"""
+    def analyze_with_lm_studio(self, text_content, on_text=None, cancel_event=None, errors=None):
+        """
+        Send document text to LM Studio API for analysis. With on_text, the reply is streamed:
+        cleaned lines are passed to on_text at most every STREAM_UPDATE_INTERVAL seconds, and
+        setting cancel_event stops the stream (None is returned). text_content may also be an
+        iterable of text pieces, which is summarized chunk by chunk as it is produced. Parts of
+        the package left out of the analysis are described in the errors list.
+        """
         try:
             # Prepare the system prompt for document analysis
             system_prompt = """
@@ -347,41 +447,110 @@ class TenderBackend(QMainWindow):
             where appropriate.
             """
             
+            streamed = not isinstance(text_content, str)
+            if not streamed and ANALYSIS_RETRIEVAL:
+                retriever = ChunkRetriever()
+                if retriever.needs_selection(text_content):
+                    # Past the token budget only the passages most relevant to each section are
+                    # analyzed, so the time taken doesn't grow with the package
+                    text_content = retriever.select(text_content)
+                    print(retriever.report())
+                    if errors is not None:
+                        errors.append(retriever.coverage_note())
+            user_content = None if streamed else f"Please analyze the following tender document(s): {text_content}"
+            if streamed or self.summarizer.needs_map_reduce(text_content):
+                # Too large for one prompt: summarize the chunks in parallel, then analyze the merged notes
+                def map_progress(done, total):
+                    if total:
+                        self.worker_signals.update_progress.emit(50 + int(40 * done / total))
+                    if on_text is not None:
+                        # A package summarized while it is extracted has no known total yet
+                        of_total = f" of {total}" if total else ""
+                        self.worker_signals.update_text.emit(f"Summarizing document part {done}{of_total}...")
+                user_content = self.summarizer.reduce_prompt(text_content, cancel_event, map_progress, errors)
+                if user_content is None:
+                    return None
+            
             # Prepare the API request payload using the qwen2.5-7b-instruct-1m model
             payload = {
-                "model": "qwen2.5-7b-instruct-1m",
+                "model": ANALYSIS_MODEL,
                 "messages": [
                     {"role": "system", "content": system_prompt},
-                    {"role": "user", "content": f"Please analyze the following tender document(s): {text_content[:5000]}"}  # Limiting to 5000 chars for first part
+                    {"role": "user", "content": user_content}
                 ],
                 "temperature": 0.3,
                 "max_tokens": -1,
-                "stream": False
+                "stream": on_text is not None
             }
             
-            # If document is very large, add additional chunks as assistant responses
-            text_chunks = [text_content[i:i+5000] for i in range(5000, len(text_content), 5000)]
-            for chunk in text_chunks:
-                payload["messages"].append({"role": "assistant", "content": "I'll continue analyzing the document."})
-                payload["messages"].append({"role": "user", "content": chunk})
-            
             # Make the API request
-            headers = {"Content-Type": "application/json"}
-            response = requests.post(self.lm_studio_api, headers=headers, data=json.dumps(payload))
-            
-            # Check if the request was successful
-            if response.status_code == 200:
-                result = response.json()
-                raw_analysis = result["choices"][0]["message"]["content"]
-                # Clean the response to remove artifacts
-                analysis = self.clean_ai_response(raw_analysis)
-                return analysis
-            else:
-                return f"Error from LM Studio API: {response.status_code} - {response.text}"
-        
+            if on_text is not None:
+                response = self.llm.stream(payload, timeout=LM_STUDIO_READ_TIMEOUT)
+                if response is None:
+                    return f"LM Studio did not respond within {LM_STUDIO_READ_TIMEOUT} seconds."
+                raw_analysis = self.read_analysis_stream(response, on_text, cancel_event)
+                if raw_analysis is None:
+                    return None
+                return self.clean_ai_response(raw_analysis)
+            
+            result = self.llm.chat(payload, timeout=LM_STUDIO_READ_TIMEOUT)
+            if result is None:
+                return f"LM Studio did not respond within {LM_STUDIO_READ_TIMEOUT} seconds."
+            raw_analysis = result["choices"][0]["message"]["content"]
+            # Clean the response to remove artifacts
+            analysis = self.clean_ai_response(raw_analysis)
+            return analysis
+        
+        except LLMError as e:
+            return str(e)
         except Exception as e:
             return f"Error connecting to LM Studio API: {str(e)}\n\nPlease ensure LM Studio is running and the API server is accessible at {self.lm_studio_api}"
     
+    def read_analysis_stream(self, response, on_text, cancel_event=None):
+        """
+        Read a server-sent-event completion stream and return the raw reply, or None if cancelled.
+        Complete lines are cleaned as they arrive and handed to on_text in throttled batches.
+        """
+        cleaner = ResponseCleaner()
+        raw_parts = []
+        line_buffer = ""
+        pending = []
+        last_flush = time.monotonic()
+        try:
+            for event in response.iter_lines(decode_unicode=True):
+                if cancel_event is not None and cancel_event.is_set():
+                    return None
+                if not event or not event.startswith("data:"):
+                    continue
+                data = event[len("data:"):].strip()
+                if data == "[DONE]":
+                    break
+                delta = json.loads(data)["choices"][0].get("delta", {}).get("content")
+                if not delta:
+                    continue
+                raw_parts.append(delta)
+                
+                # Only whole lines can be cleaned; keep the unfinished one for the next delta
+                line_buffer += delta
+                *lines, line_buffer = line_buffer.split("\n")
+                for line in lines:
+                    kept = cleaner.feed(line)
+                    if kept is not None:
+                        pending.append(kept + "\n")
+                if pending and time.monotonic() - last_flush >= STREAM_UPDATE_INTERVAL:
+                    on_text("".join(pending))
+                    pending = []
+                    last_flush = time.monotonic()
+        finally:
+            response.close()
+        
+        kept = cleaner.feed(line_buffer)
+        if kept is not None:
+            pending.append(kept)
+        if pending:
+            on_text("".join(pending))
+        return "".join(raw_parts)
+    
     def export_analysis_to_pdf(self):
         """Export the analysis results to a PDF file"""
         if not self.ui.AnalysisResults.toPlainText():
@@ -475,6 +644,14 @@ class TenderBackend(QMainWindow):
         """
         self.update_timer.stop()
         self.scraping_cancelled = True
+        if getattr(self, "pipeline", None) is not None:
+            self.pipeline.cancel()
+
+    def update_scraper_progress(self, summary):
+        """
+        Called from the pipeline threads; the progress timer picks the text up on the UI thread.
+        """
+        self.progress_text = f"Scraping pipeline running...\n{summary}"
 
     def not_implemented_yet(self):
         """
@@ -482,17 +659,18 @@ class TenderBackend(QMainWindow):
         """
         QMessageBox.information(self, "Not Implemented", "This functionality is not yet implemented.")
 
-    def load_csv_model(self):
+    def load_tender_model(self):
         """
-        Loads the CSV file into a QStandardItemModel.
+        Loads the accepted tenders from the tender store into a QStandardItemModel,
+        most relevant first.
         """
-        df = pd.read_csv(self.csv_file)
+        df = self.store.filtered_tenders(by_relevance=True)
         model = QStandardItemModel()
         headers = ['title', 'link', 'category', 'date_posted', 'closing_date', 'organization']
         model.setColumnCount(len(headers))
         model.setHorizontalHeaderLabels(headers)
         for _, row in df.iterrows():
-            items = [QStandardItem(str(row[col])) for col in headers]
+            items = [QStandardItem("" if pd.isna(row[col]) else str(row[col])) for col in headers]
             model.appendRow(items)
         self.df = df  # Store the dataframe for later use
         return model
@@ -506,24 +684,25 @@ class TenderBackend(QMainWindow):
             tender = self.df.iloc[index]
             self.ui.TenderDetails.setTitle(tender['title'])  # Set the group box title
             self.ui.TenderName.setText(tender['title'])
-            self.ui.TenderExpandedInfo.setText(tender['Full Description'])
+            description = tender['Full Description']
+            self.ui.TenderExpandedInfo.setText("" if pd.isna(description) else description)
 
-    def save_model_to_csv(self):
+    def save_model_to_store(self):
         """
-        Saves the current data from the QStandardItemModel back to the CSV file.
+        Saves the current data from the QStandardItemModel back to the tender store.
+        Model rows line up with self.df, which supplies the tender IDs.
         """
         rows = self.model.rowCount()
         cols = self.model.columnCount()
         headers = [self.model.headerData(col, Qt.Horizontal) for col in range(cols)]
         data = []
         for row in range(rows):
-            row_data = []
+            row_data = {"id": self.df.iloc[row]['id']}
             for col in range(cols):
                 item = self.model.item(row, col)
-                row_data.append(item.text() if item is not None else "")
+                row_data[headers[col]] = item.text() if item is not None else ""
             data.append(row_data)
-        df = pd.DataFrame(data, columns=headers)
-        df.to_csv(self.csv_file, index=False)
+        self.store.upsert(data)
 
     def export_to_pdf(self):
         options = QFileDialog.Options()
@@ -592,46 +771,50 @@ class TenderBackend(QMainWindow):
         dialog = AddTenderDialog(self)
         if dialog.exec() == QDialog.Accepted:
             # After adding a tender, reload the model.
-            self.model = self.load_csv_model()
+            self.model = self.load_tender_model()
             self.ui.TenderList.setModel(self.model)
 
     def scrape_tenders(self):
         """
-        Calls the scraper script to scrape tenders and update the CSV file in a background thread.
-        Shows a progress dialog while scraping is in progress.
+        Runs the scraping pipeline in a background thread to search, describe and filter
+        tenders into the tender store. Shows a progress dialog while scraping is in progress.
         """
         # Get absolute paths to eliminate path resolution issues
         base_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
         
-        # Directly use absolute paths for ChromeDriver and scraper scripts
+        # Directly use absolute paths for ChromeDriver
         chrome_driver_path = os.path.join(base_dir, "chromedriver-win64", "chromedriver.exe")
         if not os.path.exists(chrome_driver_path):
             chrome_driver_path = resource_path("chromedriver-win64/chromedriver.exe")
         
         os.environ["CHROMEDRIVER_PATH"] = chrome_driver_path
         
-        # Use direct paths for the scripts since resource_path might be failing
-        direct_paths = {
-            'scraper.py': os.path.join(base_dir, "scraper", "scraper.py"),
-            'scraper_links.py': os.path.join(base_dir, "scraper", "scraper_links.py"),
-            'deepseek_filter.py': os.path.join(base_dir, "scraper", "deepseek_filter.py")
-        }
-        
-        # Check if all scripts exist
-        missing_scripts = []
-        for name, path in direct_paths.items():
-            if not os.path.exists(path):
-                missing_scripts.append(f"{name} ({path})")
-        
-        if missing_scripts:
-            error_msg = f"The following scraper scripts were not found:\n{', '.join(missing_scripts)}"
-            QMessageBox.critical(self, "Error", error_msg)
-            return
+        # Use direct paths for data files rather than resource_path
+        tender_data_path = os.path.join(base_dir, "tender_data")
+        last_id_path = os.path.join(base_dir, "last_id.txt")  # Only read once to seed the seen-tender index
+        seen_index_path = os.path.join(tender_data_path, "seen_tenders.json")
+        keywords_path = os.path.join(tender_data_path, "Tender_Keywords.csv")
         
-        # Debug message
-        print("Found all scraper scripts:")
-        for name, path in direct_paths.items():
-            print(f"- {name}: {path}")
+        # Print debug info
+        print(f"Running scraping pipeline with paths:")
+        print(f"TENDER_DATA_PATH: {tender_data_path}")
+        print(f"SEEN_INDEX_PATH: {seen_index_path}")
+        print(f"KEYWORDS_PATH: {keywords_path}")
+        
+        # Built here rather than in the worker so a Cancel click always reaches it
+        try:
+            from pipeline import TenderPipeline
+            from seen_index import SeenIndex
+            import scraper as search
+            
+            keywords = search.load_keywords(keywords_path)
+            self.pipeline = TenderPipeline(keywords, index=SeenIndex(seen_index_path, last_id_path=last_id_path),
+                                           store=self.store, on_progress=self.update_scraper_progress,
+                                           data_dir=tender_data_path)
+        except Exception as e:
+            QMessageBox.critical(self, "Error", f"Could not start the scraper:\n{str(e)}")
+            return
+        self.scraping_cancelled = False
         
         # Create a progress dialog with cancel button
         progress = QProgressDialog("Initializing scraper...", "Cancel", 0, 100, self)
@@ -642,7 +825,7 @@ class TenderBackend(QMainWindow):
         progress.show()
         
         # Start a timer to update the progress dialog
-        self.progress_text = "Initializing..."
+        self.progress_text = "Searching tenders..."
         self.timeout_counter = 0
         self.update_timer = QTimer(self)
         self.update_timer.timeout.connect(lambda: self.update_progress_dialog(progress))
@@ -651,69 +834,18 @@ class TenderBackend(QMainWindow):
         progress.canceled.connect(self.cancel_scraping)
         
         # Start the scraping process in a background thread
-        thread = threading.Thread(target=self.run_scraper, args=(direct_paths, progress))
+        thread = threading.Thread(target=self.run_scraper, args=(self.pipeline, progress))
         thread.start()
 
-    def run_scraper(self, scripts_to_use, progress_dialog):
-        import subprocess, sys, os
+    def run_scraper(self, pipeline, progress_dialog):
+        """
+        Runs search, detail scraping and filtering as one in-process pipeline so tenders
+        are classified while the search is still running.
+        """
+        success = True
+        error_messages = []
         try:
-            # Set up environment variables for resource paths with absolute paths
-            env = os.environ.copy()
-            base_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
-            
-            # Use direct paths for data files rather than resource_path
-            tender_data_path = os.path.join(base_dir, "tender_data")
-            last_id_path = os.path.join(base_dir, "last_id.txt")
-            keywords_path = os.path.join(base_dir, "tender_data", "Tender_Keywords.csv")
-            
-            env["TENDER_DATA_PATH"] = tender_data_path
-            env["LAST_ID_PATH"] = last_id_path
-            env["KEYWORDS_PATH"] = keywords_path
-            env["NO_UI"] = "1"  # Prevent UI initialization in subprocess
-            
-            # Print debug info
-            print(f"Running scrapers with paths:")
-            print(f"TENDER_DATA_PATH: {tender_data_path}")
-            print(f"LAST_ID_PATH: {last_id_path}")
-            print(f"KEYWORDS_PATH: {keywords_path}")
-            
-            # Use Python executable from current virtual environment
-            python_exe = sys.executable
-            print(f"Using Python: {python_exe}")
-            
-            # Run scripts in sequence
-            script_sequence = ['scraper.py', 'scraper_links.py', 'deepseek_filter.py']
-            success = True
-            error_messages = []
-            
-            for script_name in script_sequence:
-                script_path = scripts_to_use[script_name]
-                self.progress_text = f"Running {script_name}..."
-                print(f"Running: {python_exe} {script_path}")
-                
-                result = subprocess.run(
-                    [python_exe, script_path],
-                    stdout=subprocess.PIPE,
-                    stderr=subprocess.PIPE,
-                    text=True,
-                    env=env,
-                    creationflags=subprocess.CREATE_NO_WINDOW
-                )
-                
-                # Print outputs for debugging
-                print(f"\n--- {script_name} stdout ---")
-                print(result.stdout)
-                print(f"\n--- {script_name} stderr ---")
-                print(result.stderr)
-                
-                if result.returncode != 0:
-                    error_message = f"{script_name} failed with exit status {result.returncode}\n"
-                    error_message += f"STDERR: {result.stderr}\n"
-                    error_message += f"STDOUT: {result.stdout}"
-                    error_messages.append(error_message)
-                    success = False
-                    break
-            
+            pipeline.run()
         except Exception as e:
             import traceback
             success = False
@@ -730,6 +862,10 @@ class TenderBackend(QMainWindow):
         """
         Handle completion of the scraping process.
         """
+        self.pipeline = None
+        # Read before closing the dialog, which emits canceled too
+        cancelled = self.scraping_cancelled
+        
         # Stop the update timer
         self.update_timer.stop()
         
@@ -737,23 +873,17 @@ class TenderBackend(QMainWindow):
         progress_dialog.close()
         
         if success:
-            # Reload the model after scraping
+            # Reload the model after scraping; a cancelled run keeps what it stored before stopping
             try:
-                # Try both possible CSV files
-                base_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
-                filtered_path = os.path.join(base_dir, "tender_data", "filtered_tenders.csv")
-                regular_path = os.path.join(base_dir, "tender_data", "tender_data.csv")
-                
-                if os.path.exists(filtered_path):
-                    self.csv_file = filtered_path
-                elif os.path.exists(regular_path):
-                    self.csv_file = regular_path
-                
-                print(f"Loading tender data from: {self.csv_file}")
+                print(f"Loading tender data from: {self.store.path}")
                 
-                self.model = self.load_csv_model()
+                self.model = self.load_tender_model()
                 self.ui.TenderList.setModel(self.model)
-                QMessageBox.information(self, "Success", "Tenders have been scraped and updated successfully.")
+                if cancelled:
+                    QMessageBox.information(self, "Scraping Cancelled",
+                                            "Scraping was cancelled. Tenders processed before it stopped have been kept.")
+                else:
+                    QMessageBox.information(self, "Success", "Tenders have been scraped and updated successfully.")
             except Exception as e:
                 import traceback
                 error_detail = f"Error reloading tender data: {str(e)}\n\n{traceback.format_exc()}"
@@ -767,81 +897,8 @@ class TenderBackend(QMainWindow):
         """
         Remove common AI response artifacts like "/thinking" markers, JSON structures, etc.
         """
-        # Remove lines starting with "/" often used for AI thinking/reasoning
-        lines = text.split('\n')
-        clean_lines = []
-        
-        # Flag to track if we're inside a thinking/internal monologue block
-        in_thinking_block = False
-        # Flag to track if we're inside a JSON/code block
-        in_json_block = False
-        # Flag to track if we've started collecting real content
-        content_started = False
-        
-        for line in lines:
-            line_lower = line.lower().strip()
-            
-            # Check for thinking/reasoning blocks starting patterns
-            if (line_lower.startswith('/') or 
-                line_lower.startswith('thinking:') or 
-                line_lower.startswith('[thinking]') or
-                '</think>' in line_lower or
-                line_lower.startswith('thinking ')):
-                in_thinking_block = True
-                continue
-                
-            # Check for end of thinking block
-            if in_thinking_block and (line_lower == '' or line_lower.startswith('#') or line_lower.startswith('---')):
-                in_thinking_block = False
-                continue
-                
-            # Skip lines inside thinking blocks
-            if in_thinking_block:
-                continue
-                
-            # Check for JSON/code block patterns
-            if (line_lower.startswith('{') and ('"' in line_lower or ':' in line_lower)) or line_lower.startswith('[{'):
-                in_json_block = True
-                continue
-                
-            # Check for end of JSON block
-            if in_json_block and (line_lower.endswith('}') or line_lower.endswith('],') or line_lower.endswith(']}')) or line_lower.endswith('}'):
-                in_json_block = False
-                continue
-                
-            # Skip lines inside JSON blocks
-            if in_json_block:
-                continue
-                
-            # Remove other markdown artifacts often used by AI models
-            if (line_lower.startswith('```') or 
-                line_lower.startswith('**note:**') or 
-                line_lower == '<answer>' or 
-                line_lower == '</answer>' or
-                '<|' in line_lower and '|>' in line_lower or
-                line_lower.startswith('usage:') or
-                line_lower.startswith('prompt_tokens:') or
-                line_lower.startswith('completion_tokens:') or
-                line_lower.startswith('total_tokens:') or
-                line_lower.startswith('response:') or
-                line_lower.startswith('stats:') or
-                line_lower.startswith('system_fingerprint:')) or line_lower.startswith('###'):
-                continue
-
-            # Skip any lines that look like JSON keys or values in API responses
-            if (': {' in line or ': [' in line or 
-                line_lower.strip() == '},' or 
-                line_lower.strip() == '],' or
-                ('"' in line and ':' in line and line.strip().endswith(','))):
-                continue
-                
-            # Lines likely to be real content
-            if len(line_lower) > 0:
-                content_started = True
-            
-            # Only add non-empty lines once content has started
-            if content_started:
-                clean_lines.append(line)
+        cleaner = ResponseCleaner()
+        clean_lines = [line for line in text.split('\n') if cleaner.feed(line) is not None]
         
         # Join cleaned lines back together
         cleaned_text = '\n'.join(clean_lines)
@@ -0,0 +1,70 @@
+"""
+Time merging scraped descriptions back into the tender DataFrame.
+
+Compares the old loop of boolean-mask assignments (one full column scan per link) with
+the single map lookup in scraper_links.merge_descriptions, on synthetic tables where a
+share of the links appear more than once.
+
+    python benchmarks/bench_description_merge.py --rows 10000 100000
+"""
+import os
+import sys
+import time
+import argparse
+
+import pandas as pd
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'scraper')))
+import scraper_links
+
+def build_tenders(row_count, duplicate_share):
+    unique = max(1, int(row_count * (1 - duplicate_share)))
+    links = [f"https://canadabuys.canada.ca/en/tender-opportunities/tender-notice/ws{i % unique:06d}"
+             for i in range(row_count)]
+    df = pd.DataFrame({
+        "id": range(row_count),
+        "title": [f"Tender {i}" for i in range(row_count)],
+        "link": links,
+        "Full Description": None,
+    })
+    descriptions = {link: f"Description for {link}" for link in dict.fromkeys(links)}
+    return df, descriptions
+
+def legacy_merge(df, descriptions):
+    """The per-link loop scraper_links.main used before merge_descriptions"""
+    df = df.copy()
+    for link, description in descriptions.items():
+        df.loc[df['link'] == link, 'Full Description'] = description
+    return df
+
+def time_merge(merge, df, descriptions, repeat):
+    timings = []
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = merge(df, descriptions)
+        timings.append(time.perf_counter() - start)
+    return result, sorted(timings)[len(timings) // 2]
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, nargs="+", default=[10000, 100000], help="table sizes to test")
+    parser.add_argument("--duplicates", type=float, default=0.1, help="share of rows repeating another row's link")
+    parser.add_argument("--repeat", type=int, default=3, help="runs per method; the median time is reported")
+    parser.add_argument("--legacy-limit", type=int, default=20000,
+                        help="skip the loop above this many rows (it is quadratic, 100k rows takes ~25 minutes)")
+    args = parser.parse_args()
+
+    print(f"{'rows':>8}{'links':>8}{'loop s':>10}{'map s':>10}{'speedup':>10}")
+    for row_count in args.rows:
+        df, descriptions = build_tenders(row_count, args.duplicates)
+        merged, map_time = time_merge(scraper_links.merge_descriptions, df, descriptions, args.repeat)
+        if row_count <= args.legacy_limit:
+            expected, loop_time = time_merge(legacy_merge, df, descriptions, 1)
+            pd.testing.assert_series_equal(merged['Full Description'], expected['Full Description'], check_dtype=False)
+            print(f"{row_count:>8}{len(descriptions):>8}{loop_time:>10.3f}{map_time:>10.4f}{loop_time / map_time:>9.0f}x")
+        else:
+            print(f"{row_count:>8}{len(descriptions):>8}{'skipped':>10}{map_time:>10.4f}{'':>10}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,149 @@
+"""
+Time document extraction and chunking for the AI Analysis page, and its peak memory.
+
+Compares ways of turning a large PDF into analysis chunks:
+  legacy   the old extractor (text += per page, then all_text_content += per document,
+           then the whole string split into chunks)
+  collect  extract_documents, joined into one string and split
+  stream   iter_documents piped through iter_chunks; chunks are consumed as they are made
+  ui       what the AI Analysis page does: the package is collected up to --memory-mb
+           (EXTRACT_MEMORY_MB), deduplicated and cut down to the retrieval budget before
+           chunking; past the ceiling it is streamed like "stream"
+Each mode runs in a fresh process so its peak RSS (from getrusage, where available) isn't
+inflated by the previous one. Without --pdf a drawing/spec-style PDF is generated with
+reportlab. Worker processes started with --workers aren't included in the RSS figure.
+
+    python benchmarks/bench_document_extract.py --pages 400
+    python benchmarks/bench_document_extract.py --pages 400 --modes ui --memory-mb 1
+    python benchmarks/bench_document_extract.py --pdf "C:/tenders/package/specs.pdf" --workers 4
+"""
+import os
+import sys
+import time
+import argparse
+import tempfile
+import multiprocessing
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+MODES = ("legacy", "collect", "stream", "ui")
+
+def generate_pdf(path, pages):
+    """A spec-like PDF: numbered clauses with dimensions and standards, plus a drawing title block"""
+    from reportlab.lib.pagesizes import letter
+    from reportlab.pdfgen import canvas
+    c = canvas.Canvas(path, pagesize=letter)
+    for page in range(pages):
+        y = 750
+        c.drawString(40, y, f"SECTION {page // 10 + 1:02d} - SHEET METAL FABRICATION - PAGE {page + 1}")
+        for line in range(44):
+            y -= 16
+            c.drawString(40, y, f"{page // 10 + 1}.{line + 1} Fabricate bracket B-{page:03d}-{line:02d} from 14 ga "
+                                f"ASTM A1011 steel, tolerance +/- 0.5 mm, finish per CGSB 1-GP-12c.")
+        c.drawString(40, 30, f"DWG No. M-{page:04d}  REV C  SCALE 1:10  CHECKED  APPROVED")
+        c.showPage()
+    c.save()
+
+def peak_rss_mb():
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # kilobytes on Linux, bytes on macOS
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+def legacy_chunks(files, chunk_chars):
+    from PyPDF2 import PdfReader
+    from UI.document_summary import split_into_chunks
+    all_text_content = ""
+    for file_path in files:
+        reader = PdfReader(file_path)
+        text = ""
+        for page in reader.pages:
+            text += page.extract_text() + "\n"
+        all_text_content += f"\n--- Document: {os.path.basename(file_path)} ---\n{text}\n\n"
+    return split_into_chunks(all_text_content, chunk_chars)
+
+def ui_chunks(files, workers, chunk_chars, memory_mb):
+    """Chunks as process_documents_thread and analyze_with_lm_studio would produce them"""
+    from UI.document_extract import collect_package, iter_documents
+    from UI.document_summary import iter_chunks
+    from UI.document_dedup import DocumentDeduplicator
+    from UI.document_retrieval import ChunkRetriever
+    package = collect_package(iter_documents(files, workers=workers), memory_mb)
+    if isinstance(package, str):
+        package = DocumentDeduplicator().dedup(package)
+        retriever = ChunkRetriever()
+        if retriever.needs_selection(package):
+            package = retriever.select(package)
+        package = [package]
+    return iter_chunks(package, chunk_chars)
+
+def run_mode(mode, files, workers, chunk_chars, memory_mb, results):
+    from UI.document_extract import extract_documents, iter_documents
+    from UI.document_summary import iter_chunks, split_into_chunks
+    # Imported by every mode before the baseline, so module memory isn't counted against one of them
+    import UI.document_dedup, UI.document_retrieval  # noqa: F401
+    baseline = peak_rss_mb()
+    start = time.perf_counter()
+    if mode == "legacy":
+        chunks = legacy_chunks(files, chunk_chars)
+        count, chars = len(chunks), sum(map(len, chunks))
+    elif mode == "collect":
+        text = "".join(f"\n--- Document: {os.path.basename(path)} ---\n{text}\n\n"
+                       for path, text, error in extract_documents(files, workers=workers) if error is None)
+        chunks = split_into_chunks(text, chunk_chars)
+        count, chars = len(chunks), sum(map(len, chunks))
+    else:
+        chunks = (iter_chunks(iter_documents(files, workers=workers), chunk_chars) if mode == "stream"
+                  else ui_chunks(files, workers, chunk_chars, memory_mb))
+        count = chars = 0
+        for chunk in chunks:
+            count += 1
+            chars += len(chunk)
+    elapsed = time.perf_counter() - start
+    results.put((mode, elapsed, count, chars, baseline, peak_rss_mb()))
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--pdf", nargs="+", help="PDF files to extract (default: a generated one)")
+    parser.add_argument("--pages", type=int, default=400, help="pages in the generated PDF")
+    parser.add_argument("--workers", type=int, default=1, help="extraction processes for collect/stream")
+    parser.add_argument("--chunk-chars", type=int, default=5000, help="characters per analysis chunk")
+    parser.add_argument("--memory-mb", type=float, default=None,
+                        help="text collected before the ui mode streams (default: EXTRACT_MEMORY_MB)")
+    parser.add_argument("--modes", nargs="+", choices=MODES, default=list(MODES))
+    args = parser.parse_args()
+    if args.memory_mb is None:
+        from UI.document_extract import EXTRACT_MEMORY_MB
+        args.memory_mb = EXTRACT_MEMORY_MB
+
+    with tempfile.TemporaryDirectory() as tmp:
+        files = args.pdf
+        if not files:
+            files = [os.path.join(tmp, f"spec_{args.pages}p.pdf")]
+            print(f"Generating a {args.pages}-page PDF...")
+            generate_pdf(files[0], args.pages)
+        size_mb = sum(os.path.getsize(path) for path in files) / (1024 * 1024)
+        print(f"{len(files)} file(s), {size_mb:.1f} MB, {args.workers} worker(s), ui ceiling {args.memory_mb:g} MB")
+
+        print(f"{'mode':>8}{'seconds':>9}{'chunks':>8}{'text MB':>9}{'base MB':>9}{'peak MB':>9}{'added MB':>10}")
+        context = multiprocessing.get_context("spawn")
+        for mode in args.modes:
+            results = context.Queue()
+            process = context.Process(target=run_mode, args=(mode, files, args.workers, args.chunk_chars, args.memory_mb, results))
+            process.start()
+            mode, elapsed, count, chars, baseline, peak = results.get()
+            process.join()
+            if peak is None:
+                memory = f"{'n/a':>9}{'n/a':>9}{'n/a':>10}"
+            else:
+                memory = f"{baseline:>9.1f}{peak:>9.1f}{peak - baseline:>10.1f}"
+            print(f"{mode:>8}{elapsed:>9.2f}{count:>8}{chars / (1024 * 1024):>9.2f}{memory}")
+
+if __name__ == "__main__":
+    main()
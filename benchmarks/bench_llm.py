@@ -0,0 +1,189 @@
+"""
+Measure the relevance filter and the document analysis against a fake LM Studio server.
+
+Starts benchmarks/fake_lm_studio.py in-process, points the shared LLM client at it and
+runs deepseek_filter.classify_all over synthetic tenders for every combination of
+concurrency and batch size, optionally again with a warm verdict cache. The document
+analysis (TenderBackend.analyze_with_lm_studio, streamed as in the UI) is timed on a short
+and a long document when the UI module can be imported. Reports tenders/sec, p50/p95
+request latency and the bytes sent each way, so results are reproducible without a GPU.
+
+    python benchmarks/bench_llm.py --tenders 40 --concurrency 1 4 8 --batch-size 1 5 --cache
+"""
+import io
+import os
+import sys
+import time
+import random
+import argparse
+import tempfile
+import threading
+import contextlib
+from types import SimpleNamespace
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'scraper')))
+from fake_lm_studio import FakeModel, start_server
+
+RELEVANT = ["Supply of sheet metal enclosures for {site}", "Custom steel fabrication and welding of brackets at {site}",
+            "Machining of aluminum parts for {site} maintenance"]
+IRRELEVANT = ["Janitorial services for {site}", "Translation of documents for {site}",
+              "Software licence renewal for {site}", "Catering for a conference at {site}"]
+SITES = ["CFB Halifax", "Dartmouth depot", "Shearwater", "Sydney harbour", "Greenwood"]
+
+CAPABILITIES = """Sheet metal cutting, bending and forming up to 1/4 inch
+MIG and TIG welding of steel, stainless and aluminum
+CNC machining and custom fabrication of brackets, enclosures and frames"""
+
+def build_descriptions(count, seed):
+    rng = random.Random(seed)
+    descriptions = []
+    for i in range(count):
+        template = rng.choice(RELEVANT if rng.random() < 0.3 else IRRELEVANT)
+        description = template.format(site=rng.choice(SITES)) + f". Reference {i:05d}."
+        descriptions.append(description + " Delivery, packaging and invoicing as per the attached terms." * 4)
+    return descriptions
+
+def percentile(values, share):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * share))] if values else 0.0
+
+def fresh_client(client):
+    """Reset the client's metrics and circuit breaker between scenarios"""
+    from llm_client import LLMMetrics, CircuitBreaker
+    client.metrics = LLMMetrics()
+    client.breaker = CircuitBreaker()
+    return client
+
+def run_filter(model, client, descriptions, concurrency, batch_size, cache, verbose):
+    import deepseek_filter
+    fresh_client(client)
+    model.reset_stats()
+    output = sys.stdout if verbose else io.StringIO()
+    start = time.perf_counter()
+    with contextlib.redirect_stdout(output):
+        answers, connection_failed = deepseek_filter.classify_all(descriptions, CAPABILITIES, concurrency,
+                                                                  cache=cache, batch_size=batch_size, client=client)
+    elapsed = time.perf_counter() - start
+    answered = sum(answer in ("yes", "no") for answer in answers)
+    return {
+        "answered": answered, "failed": connection_failed, "elapsed": elapsed,
+        "rate": answered / elapsed if elapsed > 0 else 0.0,
+        "p50": percentile(client.metrics.latencies, 0.5), "p95": percentile(client.metrics.latencies, 0.95),
+        "requests": model.stats["requests"], "errors": model.stats["errors"],
+        "bytes_in": model.stats["bytes_in"], "bytes_out": model.stats["bytes_out"],
+    }
+
+def load_analysis_harness(client, cache_path):
+    """
+    An object with TenderBackend's analysis methods and the attributes they use, without
+    building the Qt window. Returns None when the UI module can't be imported here.
+    """
+    try:
+        from UI.tender_backend import TenderBackend
+        from UI.document_summary import MapReduceSummarizer, ChunkSummaryCache
+    except ImportError as e:
+        print(f"Skipping the document analysis benchmark: {e}")
+        return None
+
+    class AnalysisHarness:
+        analyze_with_lm_studio = TenderBackend.analyze_with_lm_studio
+        read_analysis_stream = TenderBackend.read_analysis_stream
+        clean_ai_response = TenderBackend.clean_ai_response
+
+    emitter = SimpleNamespace(emit=lambda *args: None)
+    harness = AnalysisHarness()
+    harness.llm = client
+    harness.lm_studio_api = harness.llm.api_url
+    harness.summarizer = MapReduceSummarizer(harness.llm, ChunkSummaryCache(cache_path))
+    harness.worker_signals = SimpleNamespace(update_progress=emitter, update_text=emitter, append_text=emitter)
+    return harness
+
+def run_analysis(model, harness, text, verbose):
+    fresh_client(harness.llm)
+    model.reset_stats()
+    first_text = []
+    start = time.perf_counter()
+
+    def on_text(chunk):
+        if not first_text:
+            first_text.append(time.perf_counter() - start)
+
+    output = sys.stdout if verbose else io.StringIO()
+    with contextlib.redirect_stdout(output):
+        analysis = harness.analyze_with_lm_studio(text, on_text, threading.Event())
+    elapsed = time.perf_counter() - start
+    latencies = harness.llm.metrics.latencies
+    return {
+        "ok": bool(analysis) and not analysis.startswith("Error"), "elapsed": elapsed,
+        "first_text": first_text[0] if first_text else elapsed,
+        "p50": percentile(latencies, 0.5), "p95": percentile(latencies, 0.95),
+        "requests": model.stats["requests"], "bytes_in": model.stats["bytes_in"], "bytes_out": model.stats["bytes_out"],
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--tenders", type=int, default=40, help="synthetic tenders per filter run")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 4], help="requests in flight to test")
+    parser.add_argument("--batch-size", type=int, nargs="+", default=[1, 5], help="tenders per request to test")
+    parser.add_argument("--cache", action="store_true", help="also run each scenario with a warm verdict cache")
+    parser.add_argument("--latency", type=float, default=0.2, help="fake server: seconds before the first token")
+    parser.add_argument("--tokens-per-second", type=float, default=50.0, help="fake server: generation speed")
+    parser.add_argument("--think-tokens", type=int, default=20, help="fake server: <think> block length")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="fake server: share of requests failed with 503")
+    parser.add_argument("--slots", type=int, default=4, help="fake server: requests generated at the same time")
+    parser.add_argument("--summary-tokens", type=int, default=200, help="fake server: document analysis reply length")
+    parser.add_argument("--document-chars", type=int, nargs="+", default=[3000, 40000],
+                        help="document sizes for the analysis benchmark (0 to skip it)")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--verbose", action="store_true", help="show the per-call log lines")
+    args = parser.parse_args()
+
+    model = FakeModel(args.latency, args.tokens_per_second, args.think_tokens, args.error_rate,
+                      args.summary_tokens, args.slots, args.seed)
+    server, url = start_server(model)
+    from llm_client import LLMClient
+    from verdict_cache import VerdictCache
+    client = LLMClient(api_url=url)
+    print(f"Fake LM Studio at {url}: {args.latency}s latency, {args.tokens_per_second:g} tokens/s, "
+          f"{args.think_tokens} think tokens, {args.error_rate:.0%} errors, {args.slots} slots")
+
+    descriptions = build_descriptions(args.tenders, args.seed)
+    with tempfile.TemporaryDirectory() as tmp:
+        print(f"\n{'concurrency':>11}{'batch':>6}{'cache':>6}{'answered':>9}{'tenders/s':>10}{'p50 s':>7}"
+              f"{'p95 s':>7}{'requests':>9}{'errors':>7}{'KB sent':>8}{'KB recv':>8}")
+        for concurrency in args.concurrency:
+            for batch_size in args.batch_size:
+                cache = VerdictCache(os.path.join(tmp, f"verdicts_{concurrency}_{batch_size}.db")) if args.cache else None
+                modes = ["cold", "warm"] if args.cache else ["none"]
+                for mode in modes:
+                    result = run_filter(model, client, descriptions, concurrency, batch_size, cache, args.verbose)
+                    print(f"{concurrency:>11}{batch_size:>6}{mode:>6}{result['answered']:>6}/{len(descriptions):<2}"
+                          f"{result['rate']:>10.2f}{result['p50']:>7.2f}{result['p95']:>7.2f}{result['requests']:>9}"
+                          f"{result['errors']:>7}{result['bytes_in'] / 1024:>8.1f}{result['bytes_out'] / 1024:>8.1f}"
+                          + ("  (server unreachable)" if result['failed'] else ""))
+                if cache is not None:
+                    cache.close()
+
+        sizes = [size for size in args.document_chars if size > 0]
+        harness = load_analysis_harness(client, os.path.join(tmp, "chunks.db")) if sizes else None
+        if harness is not None:
+            print(f"\n{'doc chars':>10}{'chunks':>7}{'first text s':>13}{'total s':>8}{'p50 s':>7}{'p95 s':>7}"
+                  f"{'requests':>9}{'KB sent':>8}{'KB recv':>8}")
+            paragraph = " ".join(descriptions) + "\n\n"
+            for size in sizes:
+                text = (paragraph * (size // len(paragraph) + 1))[:size]
+                # Second pass reuses the cached chunk summaries
+                for label in ("cold", "warm"):
+                    result = run_analysis(model, harness, text, args.verbose)
+                    chunks = "-" if not harness.summarizer.needs_map_reduce(text) else label
+                    print(f"{size:>10}{chunks:>7}{result['first_text']:>13.2f}{result['elapsed']:>8.2f}"
+                          f"{result['p50']:>7.2f}{result['p95']:>7.2f}{result['requests']:>9}"
+                          f"{result['bytes_in'] / 1024:>8.1f}{result['bytes_out'] / 1024:>8.1f}"
+                          + ("" if result['ok'] else "  (analysis failed)"))
+            harness.summarizer.cache.close()
+    client.close()
+    server.shutdown()
+
+if __name__ == "__main__":
+    main()
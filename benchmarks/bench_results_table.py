@@ -0,0 +1,139 @@
+"""
+Count WebDriver commands and wall time needed to read one page of search results.
+
+Serves a synthetic CanadaBuys-style results table from a local HTTP server and reads it
+with the old per-element code and with the single execute_script extraction used by
+scraper.read_results_page.
+
+    python benchmarks/bench_results_table.py --rows 50 --repeat 5
+"""
+import os
+import sys
+import time
+import argparse
+import threading
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'scraper')))
+import scraper as search
+from selenium import webdriver
+from selenium.webdriver.common.by import By
+
+def build_results_page(row_count):
+    rows = []
+    for i in range(row_count):
+        organization = "NATO - North Atlantic Treaty Organization" if i % 10 == 9 else f"Department {i % 7}"
+        rows.append(
+            "<tr>"
+            f"<td><a href='/en/tender-opportunities/tender-notice/ws{i:05d}'>Tender {i} - sheet metal fabrication</a></td>"
+            f"<td>Goods</td><td>2025/03/{i % 28 + 1:02d}</td><td>2025/04/{i % 28 + 1:02d}</td>"
+            f"<td>{organization}</td>"
+            "</tr>"
+        )
+    return (
+        "<html><body><table><thead><tr><th>Title</th><th>Category</th><th>Posted</th>"
+        "<th>Closing</th><th>Organization</th></tr></thead><tbody>"
+        + "".join(rows)
+        + "</tbody></table><ul class='pager'><li class='pager__item pager__item--next'>"
+        "<a href='/en/search?page=1' rel='next'>Next</a></li></ul></body></html>"
+    )
+
+def legacy_read_results_page(driver):
+    """The per-element extraction search_tenders used before the bulk script"""
+    table_body = driver.find_element(By.CSS_SELECTOR, "tbody")
+    rows = table_body.find_elements(By.TAG_NAME, "tr")
+    page_data = []
+    for row in rows:
+        cells = row.find_elements(By.TAG_NAME, "td")
+        title_cell = cells[0].find_element(By.TAG_NAME, "a")
+        organization = cells[4].text
+        if organization == "NATO - North Atlantic Treaty Organization":
+            continue
+        page_data.append({
+            "title": title_cell.text,
+            "link": title_cell.get_attribute("href"),
+            "category": cells[1].text,
+            "date_posted": cells[2].text,
+            "closing_date": cells[3].text,
+            "organization": organization
+        })
+    next_links = driver.find_elements(By.CSS_SELECTOR, search.NEXT_PAGE_SELECTOR)
+    next_url = next_links[0].get_attribute("href") if next_links else None
+    return page_data, next_url
+
+def start_server(html):
+    body = html.encode("utf-8")
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            self.send_response(200)
+            self.send_header("Content-Type", "text/html; charset=utf-8")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+def create_driver():
+    try:
+        return search.setup_driver()
+    except FileNotFoundError:
+        # No bundled ChromeDriver (e.g. outside Windows), let Selenium Manager find one
+        options = webdriver.ChromeOptions()
+        options.add_argument('--headless')
+        options.add_argument('--no-sandbox')
+        options.add_argument('--disable-dev-shm-usage')
+        return webdriver.Chrome(options=options)
+
+def count_commands(driver):
+    """Wrap driver.execute so every WebDriver command sent over HTTP is counted"""
+    counter = {"commands": 0}
+    original_execute = driver.execute
+
+    def counting_execute(driver_command, params=None):
+        counter["commands"] += 1
+        return original_execute(driver_command, params)
+
+    driver.execute = counting_execute
+    return counter
+
+def run(reader, driver, counter, url, repeat):
+    commands = []
+    timings = []
+    rows = 0
+    for _ in range(repeat):
+        driver.get(url)
+        counter["commands"] = 0
+        start = time.perf_counter()
+        page_data, _ = reader(driver)
+        timings.append(time.perf_counter() - start)
+        commands.append(counter["commands"])
+        rows = len(page_data)
+    return rows, min(commands), sorted(timings)[len(timings) // 2]
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=50, help="rows in the synthetic results table")
+    parser.add_argument("--repeat", type=int, default=5, help="reads per method; the median time is reported")
+    args = parser.parse_args()
+
+    server = start_server(build_results_page(args.rows))
+    url = f"http://127.0.0.1:{server.server_address[1]}/en/search"
+    driver = create_driver()
+    try:
+        counter = count_commands(driver)
+        print(f"{'method':<16}{'rows':>6}{'commands':>10}{'median ms':>12}")
+        for name, reader in (("per-element", legacy_read_results_page), ("execute_script", search.read_results_page)):
+            rows, commands, median = run(reader, driver, counter, url, args.repeat)
+            print(f"{name:<16}{rows:>6}{commands:>10}{median * 1000:>12.1f}")
+    finally:
+        driver.quit()
+        server.shutdown()
+
+if __name__ == "__main__":
+    main()
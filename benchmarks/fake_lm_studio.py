@@ -0,0 +1,224 @@
+"""
+Stand-in for LM Studio's OpenAI-compatible /v1/chat/completions and /v1/embeddings endpoints.
+
+Replies are generated at a configurable token rate after a fixed latency, optionally
+preceded by a <think> block, and can be streamed as server-sent events. A share of
+requests can be failed with 503s, and only `--slots` requests are generated at a time,
+like a server with a fixed number of parallel slots. Relevance prompts get a yes/no
+verdict (or a JSON array for batch prompts), document map prompts get JSON notes and
+anything else gets a multi-section summary. max_tokens and stop sequences are honoured
+and usage is reported. Embeddings are hashed bags of words, so texts sharing words
+come out similar.
+
+    python benchmarks/fake_lm_studio.py --port 1234 --latency 0.3 --tokens-per-second 40 --think-tokens 60
+"""
+import re
+import zlib
+import json
+import time
+import random
+import argparse
+import threading
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+# Dimensions of the fake embeddings
+EMBEDDING_DIM = 64
+
+# Words that make the fake model call a tender relevant
+RELEVANT_WORDS = ("sheet metal", "fabrication", "welding", "machining", "steel", "aluminum")
+
+def approx_tokens(text):
+    return max(1, len(text) // 4)
+
+class FakeModel:
+    """Reply generation and the simulated server settings"""
+
+    def __init__(self, latency=0.2, tokens_per_second=50.0, think_tokens=0, error_rate=0.0,
+                 summary_tokens=300, slots=4, seed=0):
+        self.latency = latency
+        self.tokens_per_second = tokens_per_second
+        self.think_tokens = think_tokens
+        self.error_rate = error_rate
+        self.summary_tokens = summary_tokens
+        self.slots = threading.Semaphore(max(1, slots))
+        self.random = random.Random(seed)
+        self.lock = threading.Lock()
+        self.stats = {"requests": 0, "errors": 0, "bytes_in": 0, "bytes_out": 0}
+
+    def reset_stats(self):
+        with self.lock:
+            self.stats = {key: 0 for key in self.stats}
+
+    def count(self, key, amount=1):
+        with self.lock:
+            self.stats[key] += amount
+
+    def should_fail(self):
+        with self.lock:
+            return self.random.random() < self.error_rate
+
+    def reply_tokens(self, messages):
+        """The full reply as a list of text pieces of roughly one token each"""
+        system = next((m["content"] for m in messages if m["role"] == "system"), "")
+        user = messages[-1]["content"]
+        pieces = []
+        if self.think_tokens:
+            pieces.append("<think>")
+            pieces += ["hmm "] * self.think_tokens
+            pieces.append("</think>\n")
+
+        if "JSON object" in system:
+            notes = {"overview": [f"Part starting '{user[:40].strip()}'"], "requirements": ["Supply as specified"],
+                     "dates": ["Closing date 2025/04/01"], "client": [], "evaluation": [], "budget": [], "special": []}
+            pieces += _split(json.dumps(notes))
+        elif "<answer>" in user or "<answer>" in system:
+            ids = re.findall(r"\[id: (\w+)\]\n(.*?)(?=\n\n\[id: |\Z)", user, flags=re.DOTALL)
+            if ids:
+                verdicts = [{"id": tender_id, "verdict": _verdict(text)} for tender_id, text in ids]
+                pieces += ["<answer>"] + _split(json.dumps(verdicts)) + ["</answer>"]
+            else:
+                pieces += ["<answer>", _verdict(user), "</answer>"]
+        else:
+            pieces += ["Project overview and scope\n"]
+            words = ["- The", " contractor", " shall", " supply", " fabricated", " parts", " per", " drawing.\n"]
+            pieces += [words[i % len(words)] for i in range(self.summary_tokens)]
+        return pieces
+
+    def generate(self, body):
+        """Yield (piece, finish_reason) pairs at the configured token rate"""
+        pieces = self.reply_tokens(body.get("messages", []))
+        max_tokens = body.get("max_tokens", -1)
+        stops = body.get("stop") or []
+        if isinstance(stops, str):
+            stops = [stops]
+        with self.slots:
+            time.sleep(self.latency)
+            text = ""
+            for i, piece in enumerate(pieces):
+                if max_tokens is not None and max_tokens >= 0 and i >= max_tokens:
+                    yield "", "length"
+                    return
+                if any((text + piece).endswith(stop) for stop in stops):
+                    # Stop sequences end generation and aren't returned
+                    yield "", "stop"
+                    return
+                text += piece
+                if self.tokens_per_second > 0:
+                    time.sleep(1 / self.tokens_per_second)
+                yield piece, None
+        yield "", "stop"
+
+def embed_text(text):
+    vector = [0.0] * EMBEDDING_DIM
+    for word in re.findall(r"[a-z]{3,}", text.lower()):
+        vector[zlib.crc32(word.encode("utf-8")) % EMBEDDING_DIM] += 1.0
+    return vector
+
+def _split(text, size=4):
+    return [text[i:i + size] for i in range(0, len(text), size)]
+
+def _verdict(text):
+    return "yes" if any(word in text.lower() for word in RELEVANT_WORDS) else "no"
+
+def make_handler(model):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def do_POST(self):
+            length = int(self.headers.get("Content-Length", 0))
+            raw = self.rfile.read(length)
+            model.count("requests")
+            model.count("bytes_in", len(raw) + len(str(self.headers)))
+            if model.should_fail():
+                model.count("errors")
+                self._send(503, b'{"error": "simulated overload"}')
+                return
+            body = json.loads(raw)
+            if self.path.rstrip("/").endswith("/embeddings"):
+                texts = body.get("input") or []
+                texts = [texts] if isinstance(texts, str) else texts
+                time.sleep(model.latency / 10)
+                data = [{"object": "embedding", "index": i, "embedding": embed_text(text)} for i, text in enumerate(texts)]
+                self._send(200, json.dumps({"object": "list", "data": data, "model": body.get("model")}).encode("utf-8"))
+                return
+            prompt_tokens = sum(approx_tokens(m.get("content", "")) for m in body.get("messages", []))
+            if body.get("stream"):
+                self._stream(body)
+            else:
+                content, finish_reason, completion_tokens = "", "stop", 0
+                for piece, finish in model.generate(body):
+                    if finish:
+                        finish_reason = finish
+                        break
+                    content += piece
+                    completion_tokens += 1
+                result = {
+                    "id": "fake", "object": "chat.completion", "model": body.get("model"),
+                    "choices": [{"index": 0, "message": {"role": "assistant", "content": content},
+                                 "finish_reason": finish_reason}],
+                    "usage": {"prompt_tokens": prompt_tokens, "completion_tokens": completion_tokens,
+                              "total_tokens": prompt_tokens + completion_tokens},
+                }
+                self._send(200, json.dumps(result).encode("utf-8"))
+
+        def _stream(self, body):
+            self.send_response(200)
+            self.send_header("Content-Type", "text/event-stream")
+            self.send_header("Connection", "close")
+            self.end_headers()
+            for piece, finish in model.generate(body):
+                chunk = {"choices": [{"index": 0, "delta": {"content": piece} if piece else {},
+                                      "finish_reason": finish}]}
+                self._write(f"data: {json.dumps(chunk)}\n\n".encode("utf-8"))
+                if finish:
+                    break
+            self._write(b"data: [DONE]\n\n")
+            self.close_connection = True
+
+        def _send(self, status, payload):
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(payload)))
+            self.end_headers()
+            self._write(payload)
+
+        def _write(self, payload):
+            model.count("bytes_out", len(payload))
+            self.wfile.write(payload)
+            self.wfile.flush()
+
+        def log_message(self, *args):
+            pass
+
+    return Handler
+
+def start_server(model, port=0):
+    """Serve the fake model on a background thread; returns the server and its endpoint URL"""
+    server = ThreadingHTTPServer(("127.0.0.1", port), make_handler(model))
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}/v1/chat/completions"
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--port", type=int, default=1234)
+    parser.add_argument("--latency", type=float, default=0.2, help="seconds before the first token")
+    parser.add_argument("--tokens-per-second", type=float, default=50.0, help="generation speed per request")
+    parser.add_argument("--think-tokens", type=int, default=0, help="length of the <think> block before each reply")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="share of requests answered with a 503")
+    parser.add_argument("--summary-tokens", type=int, default=300, help="length of document analysis replies")
+    parser.add_argument("--slots", type=int, default=4, help="requests generated at the same time")
+    args = parser.parse_args()
+
+    model = FakeModel(args.latency, args.tokens_per_second, args.think_tokens, args.error_rate,
+                      args.summary_tokens, args.slots)
+    server, url = start_server(model, args.port)
+    print(f"Fake LM Studio listening on {url} (Ctrl+C to stop)")
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        server.shutdown()
+
+if __name__ == "__main__":
+    main()
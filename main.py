@@ -1,5 +1,6 @@
 #!/usr/bin/env python
 import sys
+import multiprocessing
 from UI.tender_backend import run_ui
 
 def main():
@@ -10,4 +11,6 @@ def main():
         sys.exit(1)
 
 if __name__ == "__main__":
+    # Document extraction runs in worker processes; needed for the PyInstaller build
+    multiprocessing.freeze_support()
     main()
@@ -5,16 +5,68 @@ import sys
 import json
 import time
 import re
+import math
+import threading
 from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor
 
 # Add parent directory to path to import the resource_path function
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 from UI import resource_path
+from seen_index import SeenIndex
+from tender_store import TenderStore
+from verdict_cache import VerdictCache, verdict_key
+from lexical_filter import LexicalFilter, LEXICAL_FILTER
+from embedding_index import EmbeddingIndex, EMBEDDING_RANKING, EMBEDDING_TOP_N, EMBEDDING_MAX_DEFERRALS, top_n
+from llm_client import LLM_API_URL, LLMError, get_llm_client
 
 # API details
-DEEPSEEK_API_URL = "http://localhost:1234/v1/chat/completions"
+DEEPSEEK_API_URL = LLM_API_URL
 MODEL_NAME = "deepseek-r1-distill-qwen-7b"
 
+# Requests kept in flight against the model server; LM Studio batches concurrent requests
+FILTER_CONCURRENCY = int(os.getenv("FILTER_CONCURRENCY", "4"))
+# Per-request read timeout (seconds) and retries, overriding the LLM client defaults
+FILTER_TIMEOUT = float(os.getenv("FILTER_TIMEOUT", "60"))
+FILTER_RETRIES = int(os.getenv("FILTER_RETRIES", "2"))
+# Tenders packed into one request (1 sends each tender on its own); the capabilities text is
+# then sent once per batch instead of once per tender
+FILTER_BATCH_SIZE = int(os.getenv("FILTER_BATCH_SIZE", "1"))
+# Ignore cached verdicts and ask the model again (new verdicts are still cached)
+FILTER_FORCE = os.getenv("FILTER_FORCE", "0") == "1"
+
+# Output budget for a verdict, including the model's reasoning (-1 leaves it unbounded)
+FILTER_MAX_TOKENS = int(os.getenv("FILTER_MAX_TOKENS", "512"))
+# R1-distill models loop on repeated phrases under greedy decoding; DeepSeek recommends 0.5-0.7.
+# The verdict cache stores the first verdict, so it doesn't need repeatable sampling.
+FILTER_TEMPERATURE = float(os.getenv("FILTER_TEMPERATURE", "0.6"))
+# Generation stops as soon as the answer tag is closed
+FILTER_STOP = ["</answer>"]
+# Ask for token logprobs and score yes/no from them when the server provides them
+FILTER_LOGPROBS = os.getenv("FILTER_LOGPROBS", "1") != "0"
+# Output budget for a bare answer, and the extra budget per tender in a batch reply
+ANSWER_TOKENS = 16
+BATCH_TOKENS_PER_TENDER = 24
+
+# Sent first and identical for every tender, so the server can reuse its cached prefix
+SYSTEM_PROMPT_TEMPLATE = """You screen government tenders for a manufacturing company and decide whether each tender is relevant to the company capabilities below.
+Think briefly, then give your final answer inside <answer></answer> tags.
+
+Company Capabilities:
+{capabilities}"""
+
+PROMPT_TEMPLATE = """Tender: {description}
+
+Is this tender relevant? Answer with <answer>yes</answer> or <answer>no</answer>."""
+
+BATCH_PROMPT_TEMPLATE = """Tenders:
+{tenders}
+
+Decide for each tender if it is relevant. Give your final answer inside <answer></answer> tags as a JSON array with one object per tender, for example <answer>[{{"id": "1", "verdict": "yes"}}, {{"id": "2", "verdict": "no"}}]</answer>. The verdict must be 'yes' or 'no'."""
+
+# Sent after a reply that ran out of budget before answering
+FORCE_ANSWER_PROMPT = "Stop reasoning and give only your final answer now, inside <answer></answer> tags."
+
 def load_capabilities():
     """Load plant capabilities from a text file"""
     capabilities_path = resource_path("tender_data/mulgrave_capabilities.txt")
@@ -26,11 +78,10 @@ def load_capabilities():
     except Exception:
         return None
 
-def load_tender_data():
-    """Load the tender data from the CSV file into a pandas DataFrame"""
+def load_tender_data(store=None):
+    """Load the described tenders that are still waiting for a verdict from the tender store"""
     try:
-        tender_data_path = resource_path("tender_data/tender_data_with_descriptions.csv")
-        return pd.read_csv(tender_data_path)
+        return (store or TenderStore()).pending_verdicts()
     except Exception:
         return None
 
@@ -38,6 +89,9 @@ def extract_yes_no(content):
     """Extract just the final yes/no answer from the model's response"""
     # Remove any <think> tags and their contents
     content = re.sub(r'<think>.*?</think>', '', content, flags=re.DOTALL).strip()
+    # Prefer whatever follows the answer tag (the closing tag is eaten by the stop sequence)
+    if '<answer>' in content:
+        content = content.rsplit('<answer>', 1)[1]
     
     # Match literal "yes" or "no" (case insensitive)
     match = re.search(r'\b(yes|no)\b', content.lower())
@@ -45,83 +99,370 @@ def extract_yes_no(content):
         return match.group(0)
     return content.strip().lower()
 
-def deepseek_filter(tenders):
+def has_answer(content):
+    """Whether a reply got as far as opening its answer tag outside the reasoning block"""
+    return '<answer>' in re.sub(r'<think>.*?(</think>|$)', '', content, flags=re.DOTALL)
+
+def logprob_verdict(logprobs):
+    """
+    Score yes/no from the top logprobs of the first token after the first <answer> that follows
+    the reasoning block, the same answer extract_yes_no reads (an answer drafted while thinking
+    doesn't count). Returns ('yes' | 'no', probability of yes) or None if the server sent no
+    usable logprobs.
+    """
+    tokens = (logprobs or {}).get('content') or []
+    starts, text = [], ""
+    for token in tokens:
+        starts.append(len(text))
+        text += token.get('token', '')
+    think_end = text.find('</think>')
+    if think_end != -1:
+        search_from = think_end + len('</think>')
+    elif '<think>' in text:
+        # Still reasoning when the reply ended
+        return None
+    else:
+        search_from = 0
+    tag = text.find('<answer>', search_from)
+    if tag == -1:
+        return None
+    answer_start = tag + len('<answer>')
+    token = next((token for token, start in zip(tokens, starts) if start >= answer_start), None)
+    if token is None:
+        return None
+    yes = no = None
+    for candidate in token.get('top_logprobs') or [token]:
+        word = candidate.get('token', '').strip().lower()
+        if word == 'yes' and yes is None:
+            yes = candidate.get('logprob')
+        elif word == 'no' and no is None:
+            no = candidate.get('logprob')
+    if yes is None and no is None:
+        return None
+    p_yes = 1.0 if no is None else 0.0 if yes is None else 1 / (1 + math.exp(no - yes))
+    return ('yes' if p_yes >= 0.5 else 'no'), p_yes
+
+def build_messages(capabilities, prompt):
+    return [
+        {"role": "system", "content": SYSTEM_PROMPT_TEMPLATE.format(capabilities=capabilities)},
+        {"role": "user", "content": prompt},
+    ]
+
+def request_completion(messages, client=None, timeout=FILTER_TIMEOUT, retries=FILTER_RETRIES,
+                       max_tokens=FILTER_MAX_TOKENS):
+    """
+    Send one chat completion request through the shared LLM client and return the decoded
+    response, or None if the API returned an error. Connection errors (including an open
+    circuit breaker) are raised so callers can stop instead of failing every tender.
+    """
+    payload = {
+        "model": MODEL_NAME,
+        "messages": messages,
+        "temperature": FILTER_TEMPERATURE,
+        "max_tokens": max_tokens,
+        "stop": FILTER_STOP,
+        "stream": False
+    }
+    if FILTER_LOGPROBS:
+        payload.update({"logprobs": True, "top_logprobs": 5})
+
+    try:
+        return (client or get_llm_client()).chat(payload, timeout, retries)
+    except LLMError as e:
+        print(str(e))
+        return None
+
+def complete_with_answer(messages, client=None, timeout=FILTER_TIMEOUT, retries=FILTER_RETRIES,
+                         max_tokens=FILTER_MAX_TOKENS, answer_tokens=ANSWER_TOKENS):
+    """
+    Request a completion and return (content, logprobs). If the reply ran out of budget before
+    reaching its answer tag, the partial reply is sent back with a short follow-up asking for the
+    answer alone; the shared prefix keeps that second call cheap.
+    """
+    result = request_completion(messages, client, timeout, retries, max_tokens)
+    if result is None:
+        return None, None
+    choice = result['choices'][0]
+    content = choice['message'].get('content') or ""
+    if choice.get('finish_reason') != 'length' or has_answer(content):
+        return content, choice.get('logprobs')
+
+    follow_up = messages + [
+        {"role": "assistant", "content": content},
+        {"role": "user", "content": FORCE_ANSWER_PROMPT},
+    ]
+    result = request_completion(follow_up, client, timeout, retries, answer_tokens)
+    if result is None:
+        return None, None
+    choice = result['choices'][0]
+    return choice['message'].get('content') or "", choice.get('logprobs')
+
+def classify_description(description, capabilities, client=None, timeout=FILTER_TIMEOUT, retries=FILTER_RETRIES,
+                         cache=None, force=FILTER_FORCE):
+    """
+    Ask the model whether a tender description matches the company capabilities.
+    Returns the extracted answer ('yes', 'no' or the raw reply), or None if the API returned an error.
+    With a cache, a stored verdict for the same description, capabilities, prompt and model is
+    returned without calling the API unless force is set.
+    """
+    key = (verdict_key(description, capabilities, SYSTEM_PROMPT_TEMPLATE + PROMPT_TEMPLATE, MODEL_NAME)
+           if cache is not None else None)
+    if key is not None and not force:
+        answer = cache.get(key)
+        if answer is not None:
+            return answer
+
+    # Prepare the prompt
+    messages = build_messages(capabilities, PROMPT_TEMPLATE.format(description=description))
+    content, logprobs = complete_with_answer(messages, client, timeout, retries)
+    if content is None:
+        return None
+
+    scored = logprob_verdict(logprobs)
+    if scored is not None:
+        (client or get_llm_client()).metrics.count("logprob_scored")
+        answer = scored[0]
+    else:
+        answer = extract_yes_no(content)
+    # Replies that aren't a clear yes/no are asked again next time rather than cached
+    if key is not None and answer in ("yes", "no"):
+        cache.put(key, answer, MODEL_NAME)
+    return answer
+
+def parse_batch_verdicts(content, ids):
+    """
+    Pull {id: 'yes'|'no'} out of a batch reply. Accepts a clean JSON array, an array wrapped in
+    prose or code fences, or individual objects when the array itself is malformed; entries with
+    unknown ids or anything other than a yes/no verdict are dropped.
+    """
+    content = re.sub(r'<think>.*?</think>', '', content, flags=re.DOTALL)
+    if '<answer>' in content:
+        content = content.rsplit('<answer>', 1)[1]
+    items = None
+    start, end = content.find('['), content.rfind(']')
+    if start != -1 and end > start:
+        try:
+            items = json.loads(content[start:end + 1])
+        except ValueError:
+            items = None
+    if not isinstance(items, list):
+        items = []
+        for match in re.finditer(r'\{[^{}]*\}', content):
+            try:
+                items.append(json.loads(match.group(0)))
+            except ValueError:
+                continue
+
+    verdicts = {}
+    for item in items:
+        if not isinstance(item, dict):
+            continue
+        item_id = str(item.get("id", "")).strip()
+        verdict = item.get("verdict")
+        if isinstance(verdict, bool):
+            verdict = "yes" if verdict else "no"
+        verdict = str(verdict).strip().lower()
+        if item_id in ids and verdict in ("yes", "no"):
+            verdicts[item_id] = verdict
+    return verdicts
+
+def classify_batch(descriptions, capabilities, client=None, timeout=FILTER_TIMEOUT, retries=FILTER_RETRIES,
+                   cache=None, force=FILTER_FORCE):
+    """
+    Classify several descriptions with one request that carries the capabilities text once.
+    Returns answers aligned with descriptions; None marks tenders the reply left out or got
+    wrong, which callers re-queue through classify_description.
+    """
+    answers = [None] * len(descriptions)
+    keys = [verdict_key(description, capabilities, SYSTEM_PROMPT_TEMPLATE + BATCH_PROMPT_TEMPLATE, MODEL_NAME)
+            if cache is not None else None
+            for description in descriptions]
+    if cache is not None and not force:
+        answers = [cache.get(key) for key in keys]
+    pending = [i for i, answer in enumerate(answers) if answer is None]
+    if not pending:
+        return answers
+    if len(pending) == 1:
+        i = pending[0]
+        answers[i] = classify_description(descriptions[i], capabilities, client, timeout, retries, cache, force)
+        return answers
+
+    # Short positional ids keep the prompt small and are easy for the model to copy back
+    ids = {str(n): i for n, i in enumerate(pending, start=1)}
+    tenders = "\n\n".join(f"[id: {n}]\n{descriptions[i]}" for n, i in ids.items())
+    messages = build_messages(capabilities, BATCH_PROMPT_TEMPLATE.format(tenders=tenders))
+    max_tokens = FILTER_MAX_TOKENS + BATCH_TOKENS_PER_TENDER * len(pending) if FILTER_MAX_TOKENS > 0 else FILTER_MAX_TOKENS
+    content, _ = complete_with_answer(messages, client, timeout * len(pending), retries, max_tokens,
+                                      ANSWER_TOKENS + BATCH_TOKENS_PER_TENDER * len(pending))
+    if content is None:
+        return answers
+
+    verdicts = parse_batch_verdicts(content, ids)
+    if len(verdicts) < len(ids):
+        print(f"Batch reply covered {len(verdicts)} of {len(ids)} tenders, re-queueing the rest individually")
+    for n, verdict in verdicts.items():
+        i = ids[n]
+        answers[i] = verdict
+        if keys[i] is not None:
+            cache.put(keys[i], verdict, MODEL_NAME)
+    return answers
+
+def classify_all(descriptions, capabilities, concurrency=FILTER_CONCURRENCY, timeout=FILTER_TIMEOUT, retries=FILTER_RETRIES,
+                 cache=None, force=FILTER_FORCE, batch_size=FILTER_BATCH_SIZE, client=None):
+    """
+    Classify descriptions with at most `concurrency` requests in flight, packing up to
+    `batch_size` tenders into each request when it is above 1.
+    Returns the answers in input order (None where the API gave no usable answer) and whether
+    the server became unreachable, in which case the remaining descriptions were skipped.
+    """
+    stop_event = threading.Event()
+    client = client or get_llm_client()
+
+    def guarded(classify):
+        def run(item):
+            if stop_event.is_set():
+                return None
+            try:
+                return classify(item)
+            except requests.exceptions.ConnectionError:
+                stop_event.set()
+            except Exception as e:
+                print(f"Error processing tender: {str(e)}")
+            return None
+        return run
+
+    def classify_one(description):
+        return classify_description(description, capabilities, client, timeout, retries, cache, force)
+
+    def classify_chunk(chunk):
+        return classify_batch(chunk, capabilities, client, timeout, retries, cache, force)
+
+    with ThreadPoolExecutor(max_workers=max(1, concurrency)) as executor:
+        if batch_size > 1:
+            chunks = [descriptions[i:i + batch_size] for i in range(0, len(descriptions), batch_size)]
+            answers = []
+            for chunk, chunk_answers in zip(chunks, executor.map(guarded(classify_chunk), chunks)):
+                answers.extend(chunk_answers or [None] * len(chunk))
+            # Tenders missing from a batch reply are asked about one at a time
+            missing = [i for i, answer in enumerate(answers) if answer is None]
+            for i, answer in zip(missing, executor.map(guarded(classify_one), [descriptions[i] for i in missing])):
+                answers[i] = answer
+        else:
+            answers = list(executor.map(guarded(classify_one), descriptions))
+    return answers, stop_event.is_set()
+
+def _deferrals(tender):
+    """Runs that have deferred a tender so far; stores that predate the column have none"""
+    count = tender.get('deferrals')
+    return 0 if count is None or count != count else int(count)
+
+def deepseek_filter(tenders, index=None, store=None, concurrency=FILTER_CONCURRENCY, cache=None, force=FILTER_FORCE,
+                    lexical=None, batch_size=FILTER_BATCH_SIZE, embeddings=None, limit=EMBEDDING_TOP_N,
+                    max_deferrals=EMBEDDING_MAX_DEFERRALS):
     capabilities = load_capabilities()
     if capabilities is None or tenders is None:
         print("Error: Failed to load capabilities or tenders")
         return None
 
     filtered_tenders = []
+    evaluated_links = []
+    verdicts = []
+    to_classify = []
     for _, tender in tenders.iterrows():
-        try:
-            # Check if the required field exists
-            description = tender.get('Full Description')
-            if not description:
-                print(f"Warning: Missing description for tender {tender.get('title', 'No title')}")
-                continue
+        # Check if the required field exists
+        if not tender.get('Full Description'):
+            print(f"Warning: Missing description for tender {tender.get('title', 'No title')}")
+            evaluated_links.append(tender.get('link'))
+            verdicts.append({"id": tender['id'], "relevant": 0})
+        else:
+            to_classify.append(tender)
 
-            # Prepare the prompt
-            prompt = f"""Given the following tender description and company capabilities, determine if this tender is relevant. Only respond with 'yes' or 'no'.
+    # Rank by embedding similarity; with a limit only the best-ranked tenders are classified this run
+    scores = {}
+    if embeddings is not None and to_classify:
+        scores = embeddings.score([(tender['id'], tender['Full Description']) for tender in to_classify], capabilities)
+        embeddings.save()
+        print(embeddings.report())
+        deferrals = {str(tender['id']): _deferrals(tender) for tender in to_classify}
+        overdue = [tender_id for tender_id, count in deferrals.items() if count >= max_deferrals]
+        keep = top_n(scores, list(deferrals), limit, overdue)
+        deferred = [tender for tender in to_classify if str(tender['id']) not in keep]
+        if deferred:
+            print(f"Deferring {len(deferred)} lower-ranked tenders to a later run (top {limit} are classified"
+                  + (f", plus {len(overdue)} deferred {max_deferrals} times already)" if overdue else ")"))
+            (store or TenderStore()).upsert([{"id": tender['id'], "relevance_score": scores[str(tender['id'])],
+                                              "deferrals": deferrals[str(tender['id'])] + 1}
+                                             for tender in deferred])
+            to_classify = [tender for tender in to_classify if str(tender['id']) in keep]
 
-Tender: {description}
+    # Clear-cut tenders are decided by the lexical score; the rest (plus an audit sample) go to the model
+    decisions = [lexical.decide(tender['Full Description']) if lexical else ("uncertain", None) for tender in to_classify]
+    ask_model = [lexical is None or lexical.needs_model(decision) for decision, _ in decisions]
+    asked = [tender for tender, ask in zip(to_classify, ask_model) if ask]
 
-Company Capabilities:
-{capabilities}"""
+    print(f"Classifying {len(asked)} tenders with up to {concurrency} requests in flight...")
+    start = time.monotonic()
+    model_answers, connection_failed = classify_all([tender['Full Description'] for tender in asked],
+                                                    capabilities, concurrency, cache=cache, force=force,
+                                                    batch_size=batch_size)
+    if connection_failed:
+        # Keep the verdicts we already have; the rest stay pending for the next run
+        print(f"Connection Error: Could not connect to {DEEPSEEK_API_URL}. Is the API server running?")
+    elapsed = time.monotonic() - start
 
-            print(f"Sending request to DeepSeek API...")
-            
-            # Call the DeepSeek API
-            response = requests.post(
-                DEEPSEEK_API_URL,
-                headers={"Content-Type": "application/json"},
-                json={
-                    "model": MODEL_NAME,
-                    "messages": [{"role": "user", "content": prompt}],
-                    "temperature": 0.7,
-                    "max_tokens": -1,
-                    "stream": False
-                },
-                timeout=30  # Add timeout to avoid hanging
-            )
-            
-            print(f"API Response Status Code: {response.status_code}")
-            
-            if response.status_code == 200:
-                result = response.json()
-                print(f"API Response: {result}")
-                content = result['choices'][0]['message']['content']
-                answer = extract_yes_no(content)
-                
-                if answer == 'yes':
-                    filtered_tenders.append(tender)
-                    print(f"Tender accepted: {tender.get('title', 'No title')}")
-                else:
-                    print(f"Tender rejected: {tender.get('title', 'No title')}")
-            else:
-                print(f"Error response from API: {response.text}")
-            
-            time.sleep(1)  # Rate limiting
-            
-        except requests.exceptions.ConnectionError:
-            print(f"Connection Error: Could not connect to {DEEPSEEK_API_URL}. Is the API server running?")
-            return None
-        except Exception as e:
-            print(f"Error processing tender: {str(e)}")
+    model_answers = iter(model_answers)
+    for tender, (decision, score), ask in zip(to_classify, decisions, ask_model):
+        model_answer = next(model_answers) if ask else None
+        if lexical is not None:
+            lexical.log(tender, score, decision, model_answer)
+        answer = model_answer if ask else ("yes" if decision == "accept" else "no")
+        if answer is None:
             continue
+        evaluated_links.append(tender.get('link'))
+        verdict = {"id": tender['id'], "relevant": int(answer == 'yes')}
+        if str(tender['id']) in scores:
+            verdict["relevance_score"] = scores[str(tender['id'])]
+        verdicts.append(verdict)
+        if answer == 'yes':
+            filtered_tenders.append(tender)
+            print(f"Tender accepted: {tender.get('title', 'No title')}")
+        else:
+            print(f"Tender rejected: {tender.get('title', 'No title')}")
+
+    classified = len(evaluated_links)
+    if asked:
+        rate = classified / elapsed * 60 if elapsed > 0 else 0.0
+        print(f"Classified {classified} tenders in {elapsed:.1f}s, {len(asked)} by the model ({rate:.1f} tenders/min)")
+    print(get_llm_client().metrics.report())
+    if lexical is not None:
+        print(lexical.report())
+    if cache is not None:
+        print(cache.report())
+
+    if verdicts:
+        (store or TenderStore()).upsert(verdicts)
+        if index is not None:
+            index.mark_done(evaluated_links)
+            index.save()
 
-    if filtered_tenders:
-        df = pd.DataFrame(filtered_tenders)
-        output_path = resource_path("tender_data/filtered_tenders.csv")
-        df.to_csv(output_path, index=False)
-        return df
+    if filtered_tenders and not connection_failed:
+        return pd.DataFrame(filtered_tenders)
     return None
 
 if __name__ == "__main__":
     try:
         print("Starting DeepSeek filter process...")
-        tenders = load_tender_data()
+        force = FILTER_FORCE or "--force" in sys.argv[1:]
+        index = SeenIndex()
+        store = TenderStore()
+        tenders = load_tender_data(store)
         if tenders is not None:
-            result = deepseek_filter(tenders)
+            print(f"{len(tenders)} new or changed tenders to filter")
+            capabilities = load_capabilities()
+            lexical = LexicalFilter.from_keywords_file(capabilities) if LEXICAL_FILTER and capabilities else None
+            embeddings = EmbeddingIndex() if EMBEDDING_RANKING else None
+            result = deepseek_filter(tenders, index, store, cache=VerdictCache(), force=force, lexical=lexical,
+                                     embeddings=embeddings)
             if result is None:
                 print("Filter process failed or no tenders were accepted")
             else:
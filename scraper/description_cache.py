@@ -0,0 +1,109 @@
+import os
+import time
+import sqlite3
+import hashlib
+import threading
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# How long a cached description is trusted without asking the server again
+DESCRIPTION_CACHE_TTL_HOURS = float(os.getenv("DESCRIPTION_CACHE_TTL_HOURS", "168"))
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS descriptions (
+    url TEXT PRIMARY KEY,
+    description TEXT NOT NULL,
+    content_hash TEXT NOT NULL,
+    fetched_at REAL NOT NULL,
+    etag TEXT,
+    last_modified TEXT
+);
+"""
+
+def default_cache_path():
+    """Location of the description cache, overridable with DESCRIPTION_CACHE_PATH"""
+    if os.getenv("DESCRIPTION_CACHE_PATH"):
+        return os.getenv("DESCRIPTION_CACHE_PATH")
+    tender_data_path = os.getenv("TENDER_DATA_PATH", os.path.join(PROJECT_ROOT, "tender_data"))
+    return os.path.join(tender_data_path, "description_cache.db")
+
+def content_hash(description):
+    # Whitespace-only differences in the rendered page shouldn't count as a change
+    normalized = " ".join(description.split())
+    return hashlib.sha256(normalized.encode("utf-8")).hexdigest()
+
+class DescriptionCache:
+    """
+    On-disk cache of tender descriptions keyed by URL.
+
+    Entries younger than the TTL are served without touching the network. Older
+    entries are revalidated with the server's ETag/Last-Modified validators when
+    it sent any, and the content hash tells whether a re-fetched description
+    actually changed. Hit/miss counters are kept for the end-of-run report.
+    """
+
+    def __init__(self, path=None, ttl_hours=DESCRIPTION_CACHE_TTL_HOURS):
+        self.path = path or default_cache_path()
+        self.ttl = ttl_hours * 3600
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.path, timeout=30, check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript(SCHEMA)
+        self.counts = {"hits": 0, "misses": 0, "stale": 0, "not_modified": 0, "unchanged": 0, "changed": 0}
+
+    def get(self, url):
+        with self._lock:
+            row = self._conn.execute("SELECT * FROM descriptions WHERE url = ?", (url,)).fetchone()
+        return dict(row) if row is not None else None
+
+    def is_fresh(self, entry):
+        return entry is not None and time.time() - entry["fetched_at"] < self.ttl
+
+    def validators(self, entry):
+        """Conditional request headers for revalidating a cached page"""
+        headers = {}
+        if entry is not None:
+            if entry.get("etag"):
+                headers["If-None-Match"] = entry["etag"]
+            if entry.get("last_modified"):
+                headers["If-Modified-Since"] = entry["last_modified"]
+        return headers
+
+    def touch(self, url):
+        """Restart the TTL of an entry the server confirmed is still current"""
+        with self._lock, self._conn:
+            self._conn.execute("UPDATE descriptions SET fetched_at = ? WHERE url = ?", (time.time(), url))
+        self.count("not_modified")
+
+    def put(self, url, description, headers=None):
+        """Store a freshly fetched description; returns True if it differs from the cached one"""
+        new_hash = content_hash(description)
+        headers = headers or {}
+        with self._lock, self._conn:
+            row = self._conn.execute("SELECT content_hash FROM descriptions WHERE url = ?", (url,)).fetchone()
+            self._conn.execute(
+                "INSERT OR REPLACE INTO descriptions (url, description, content_hash, fetched_at, etag, last_modified) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (url, description, new_hash, time.time(), headers.get("ETag"), headers.get("Last-Modified")),
+            )
+        changed = row is None or row["content_hash"] != new_hash
+        self.count("changed" if changed else "unchanged")
+        return changed
+
+    def count(self, event):
+        with self._lock:
+            self.counts[event] += 1
+
+    def report(self):
+        counts = self.counts
+        lookups = counts["hits"] + counts["misses"] + counts["stale"]
+        hit_rate = (counts["hits"] + counts["not_modified"] + counts["unchanged"]) / lookups * 100 if lookups else 0.0
+        return (f"Description cache: {counts['hits']} fresh hits, {counts['misses']} misses, "
+                f"{counts['stale']} stale ({counts['not_modified']} not modified, {counts['unchanged']} unchanged after "
+                f"re-fetch), {counts['changed']} new or changed; {hit_rate:.0f}% of pages needed no further processing")
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
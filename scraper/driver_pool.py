@@ -0,0 +1,111 @@
+import time
+import threading
+
+
+class DriverPool:
+    """
+    Bounded pool of reusable Selenium drivers.
+
+    Drivers are created lazily up to `size`, handed out with `acquire()` and
+    returned with `release()`. A driver is recycled (quit and replaced) after
+    it has served `max_pages` pages or when it fails its health check.
+    """
+
+    def __init__(self, factory, size=5, max_pages=50, acquire_timeout=300):
+        self.factory = factory
+        self.size = max(1, size)
+        self.max_pages = max_pages
+        self.acquire_timeout = acquire_timeout
+        self._idle = []
+        # Signalled whenever a driver is returned or a slot frees up
+        self._lock = threading.Condition()
+        self._created = 0
+        self._page_counts = {}
+        self._closed = False
+
+    def acquire(self):
+        """Check a healthy driver out of the pool, creating one if there is room"""
+        while True:
+            driver = self._take_or_create()
+            if self._is_healthy(driver):
+                return driver
+            self._discard(driver)
+
+    def release(self, driver, broken=False):
+        """Return a driver to the pool, recycling it if it is worn out or broken"""
+        if driver is None:
+            return
+
+        with self._lock:
+            pages = self._page_counts.get(id(driver), 0) + 1
+            self._page_counts[id(driver)] = pages
+            recycle = broken or self._closed or (self.max_pages and pages >= self.max_pages)
+            if not recycle:
+                self._idle.append(driver)
+                self._lock.notify()
+
+        if recycle:
+            self._discard(driver)
+
+    def close(self):
+        """Quit every idle driver and refuse further checkouts"""
+        with self._lock:
+            self._closed = True
+            idle, self._idle = self._idle, []
+            self._lock.notify_all()
+        for driver in idle:
+            self._discard(driver)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    def _take_or_create(self):
+        """An idle driver, or a new one once there is room; waits while the pool is at capacity"""
+        deadline = time.monotonic() + self.acquire_timeout
+        with self._lock:
+            while True:
+                if self._closed:
+                    raise RuntimeError("Driver pool is closed")
+                if self._idle:
+                    return self._idle.pop()
+                if self._created < self.size:
+                    self._created += 1
+                    break
+                # Re-checked on every wake-up: a returned driver or a recycled one's free slot
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    raise TimeoutError("Timed out waiting for a free driver")
+                self._lock.wait(remaining)
+
+        try:
+            driver = self.factory()
+        except Exception:
+            with self._lock:
+                self._created -= 1
+                self._lock.notify()
+            raise
+
+        with self._lock:
+            self._page_counts[id(driver)] = 0
+        return driver
+
+    def _is_healthy(self, driver):
+        try:
+            # Cheap round trip that fails if the browser or session has died
+            driver.current_url
+            return True
+        except Exception:
+            return False
+
+    def _discard(self, driver):
+        with self._lock:
+            self._page_counts.pop(id(driver), None)
+            self._created -= 1
+            self._lock.notify()
+        try:
+            driver.quit()
+        except Exception:
+            pass
@@ -0,0 +1,208 @@
+import os
+import json
+import hashlib
+import threading
+
+import numpy as np
+import requests
+
+from llm_client import LLMError, get_llm_client
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Rank tenders by embedding similarity to the capabilities; set to 0 to skip the stage
+EMBEDDING_RANKING = os.getenv("EMBEDDING_RANKING", "1") != "0"
+# Embedding model loaded in LM Studio
+EMBEDDING_MODEL = os.getenv("EMBEDDING_MODEL", "text-embedding-nomic-embed-text-v1.5")
+# Texts sent per embeddings request
+EMBEDDING_BATCH_SIZE = int(os.getenv("EMBEDDING_BATCH_SIZE", "32"))
+# Only the N best-ranked tenders of a filter run go to the LLM (0 sends them all); the
+# rest stay pending, with the number of runs that deferred them kept in the store, and
+# compete again on the next run
+EMBEDDING_TOP_N = int(os.getenv("EMBEDDING_TOP_N", "0"))
+# Runs a tender can be deferred before it is classified regardless of its rank, so a steady
+# stream of better-ranked tenders can't keep it pending forever
+EMBEDDING_MAX_DEFERRALS = int(os.getenv("EMBEDDING_MAX_DEFERRALS", "3"))
+# Rows added to the vector file each time it fills up
+GROWTH_ROWS = 1024
+
+def default_index_path():
+    """Location of the vector file (metadata sits next to it), overridable with EMBEDDING_INDEX_PATH"""
+    if os.getenv("EMBEDDING_INDEX_PATH"):
+        return os.getenv("EMBEDDING_INDEX_PATH")
+    tender_data_path = os.getenv("TENDER_DATA_PATH", os.path.join(PROJECT_ROOT, "tender_data"))
+    return os.path.join(tender_data_path, "embeddings.f32")
+
+def capability_sections(capabilities):
+    """Paragraphs of the capabilities text, or its lines when it has no blank-line breaks"""
+    sections = [block.strip() for block in capabilities.split("\n\n") if block.strip()]
+    if len(sections) <= 1:
+        sections = [line.strip() for line in capabilities.splitlines() if line.strip()]
+    return sections
+
+def _digest(text):
+    return hashlib.sha1(text.encode("utf-8")).hexdigest()
+
+def _normalize(vectors):
+    vectors = np.asarray(vectors, dtype=np.float32)
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    return vectors / np.where(norms > 0, norms, 1)
+
+class EmbeddingIndex:
+    """
+    Description embeddings in a memory-mapped float32 matrix, one row per tender id.
+
+    A JSON file next to the matrix maps each tender id to its row and a hash of the
+    description it was computed from, so a description is embedded once and again only
+    if it changes. Rows are stored normalized, which makes cosine similarity against
+    the capability sections a single matrix product.
+    """
+
+    def __init__(self, path=None, model=EMBEDDING_MODEL, client=None, batch_size=EMBEDDING_BATCH_SIZE):
+        self.path = path or default_index_path()
+        self.meta_path = os.path.splitext(self.path)[0] + ".json"
+        self.model = model
+        self.client = client or get_llm_client()
+        self.batch_size = max(1, batch_size)
+        self._lock = threading.Lock()
+        self.rows = {}  # tender id -> [row, description hash]
+        self.dim = None
+        self.vectors = None
+        self.counts = {"embedded": 0, "reused": 0}
+        self._query = None  # (capabilities hash, section vectors)
+        self.unavailable = False
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        self._load()
+
+    def _load(self):
+        if not os.path.exists(self.meta_path) or not os.path.exists(self.path):
+            return
+        try:
+            with open(self.meta_path, "r", encoding="utf-8") as f:
+                meta = json.load(f)
+        except (OSError, ValueError):
+            return
+        # Vectors from another model aren't comparable; start over
+        if meta.get("model") != self.model or not meta.get("dim"):
+            return
+        self.dim = meta["dim"]
+        self.rows = meta.get("rows", {})
+        capacity = os.path.getsize(self.path) // (4 * self.dim)
+        if capacity < len(self.rows):
+            self.rows, self.dim = {}, None
+            return
+        self.vectors = np.memmap(self.path, dtype=np.float32, mode="r+", shape=(capacity, self.dim))
+
+    def _ensure_capacity(self, rows_needed):
+        capacity = self.vectors.shape[0] if self.vectors is not None else 0
+        if rows_needed <= capacity:
+            return
+        new_capacity = max(rows_needed, capacity + GROWTH_ROWS)
+        if self.vectors is not None:
+            self.vectors.flush()
+            self.vectors = None
+        mode = "r+b" if capacity else "wb"
+        with open(self.path, mode) as f:
+            f.truncate(new_capacity * self.dim * 4)
+        self.vectors = np.memmap(self.path, dtype=np.float32, mode="r+", shape=(new_capacity, self.dim))
+
+    def embed(self, texts):
+        """Normalized embeddings for texts, requested in batches"""
+        vectors = []
+        for i in range(0, len(texts), self.batch_size):
+            batch = self.client.embed(texts[i:i + self.batch_size], self.model)
+            if batch is None:
+                raise TimeoutError("LM Studio did not return embeddings in time")
+            vectors.extend(batch)
+        return _normalize(vectors)
+
+    def update(self, tenders):
+        """Embed the (id, description) pairs whose description isn't in the index yet"""
+        missing = []
+        with self._lock:
+            for tender_id, description in tenders:
+                entry = self.rows.get(str(tender_id))
+                if entry is not None and entry[1] == _digest(description):
+                    self.counts["reused"] += 1
+                else:
+                    missing.append((str(tender_id), description))
+        if not missing:
+            return 0
+
+        vectors = self.embed([description for _, description in missing])
+        with self._lock:
+            if self.dim is None:
+                self.dim = vectors.shape[1]
+            for (tender_id, description), vector in zip(missing, vectors):
+                entry = self.rows.get(tender_id)
+                row = entry[0] if entry is not None else len(self.rows)
+                self._ensure_capacity(row + 1)
+                self.vectors[row] = vector
+                self.rows[tender_id] = [row, _digest(description)]
+            self.counts["embedded"] += len(missing)
+        return len(missing)
+
+    def similarity(self, tender_ids, query_vectors):
+        """Best cosine similarity of each tender against any of the query vectors (NaN if not indexed)"""
+        with self._lock:
+            positions = [self.rows.get(str(tender_id), [None])[0] for tender_id in tender_ids]
+            known = [i for i, row in enumerate(positions) if row is not None]
+            scores = np.full(len(tender_ids), np.nan, dtype=np.float32)
+            if known and self.vectors is not None:
+                matrix = self.vectors[[positions[i] for i in known]]
+                scores[known] = (matrix @ query_vectors.T).max(axis=1)
+        return scores
+
+    def capability_vectors(self, capabilities):
+        """Embeddings of the capability sections, computed once per capabilities text"""
+        digest = _digest(capabilities)
+        cached = self._query
+        if cached is None or cached[0] != digest:
+            cached = (digest, self.embed(capability_sections(capabilities)))
+            self._query = cached
+        return cached[1]
+
+    def score(self, tenders, capabilities):
+        """
+        Embed any new descriptions and return {tender id: relevance score} for the
+        (id, description) pairs, or {} if the embeddings endpoint isn't available. After
+        one failure the index stops asking for the rest of the run.
+        """
+        tenders = [(str(tender_id), description) for tender_id, description in tenders if description]
+        if not tenders or self.unavailable:
+            return {}
+        try:
+            self.update(tenders)
+            query = self.capability_vectors(capabilities)
+        except (LLMError, requests.exceptions.ConnectionError, TimeoutError, KeyError, ValueError) as e:
+            print(f"Skipping embedding ranking: {str(e)}")
+            self.unavailable = True
+            return {}
+        ids = [tender_id for tender_id, _ in tenders]
+        scores = self.similarity(ids, query)
+        return {tender_id: float(score) for tender_id, score in zip(ids, scores) if not np.isnan(score)}
+
+    def save(self):
+        """Flush the vectors and write the id -> row map"""
+        with self._lock:
+            if self.vectors is None:
+                return
+            self.vectors.flush()
+            tmp_path = self.meta_path + ".tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump({"model": self.model, "dim": self.dim, "rows": self.rows}, f)
+            os.replace(tmp_path, self.meta_path)
+
+    def report(self):
+        return (f"Embedding index: {self.counts['embedded']} descriptions embedded, "
+                f"{self.counts['reused']} reused, {len(self.rows)} stored")
+
+def top_n(scores, ids, n, overdue=()):
+    """
+    The ids to keep when only the n best-scoring may pass; unscored ids and overdue ones
+    (deferred too often already) are always kept
+    """
+    if n <= 0:
+        return set(ids)
+    scored = sorted((tender_id for tender_id in ids if tender_id in scores), key=lambda tender_id: -scores[tender_id])
+    return set(scored[:n]) | {tender_id for tender_id in ids if tender_id not in scores} | (set(ids) & set(overdue))
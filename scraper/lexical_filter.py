@@ -0,0 +1,184 @@
+import os
+import re
+import csv
+import random
+import threading
+from datetime import datetime
+
+import numpy as np
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+def _threshold(name):
+    value = os.getenv(name)
+    return float(value) if value else None
+
+# Score tenders lexically before the LLM; off by default, since it costs a log write per tender
+# and only saves model calls once the thresholds below are set
+LEXICAL_FILTER = os.getenv("LEXICAL_FILTER", "0") != "0"
+# Tenders scoring below the first threshold are rejected and at or above the second accepted
+# without asking the model. Scores run from 0 to 1. Unset, a threshold never fires: every tender
+# still goes to the model and the stage only logs, which is how the values are tuned.
+LEXICAL_REJECT_BELOW = _threshold("LEXICAL_REJECT_BELOW")
+LEXICAL_ACCEPT_ABOVE = _threshold("LEXICAL_ACCEPT_ABOVE")
+# Share of auto-decided tenders still sent to the model to measure disagreement
+LEXICAL_AUDIT_RATE = float(os.getenv("LEXICAL_AUDIT_RATE", "0.05"))
+
+STOPWORDS = frozenset("""
+a about above after all also an and any are as at be been being below both but by can could
+do does each for from had has have having he her here his how i if in into is it its may more
+most must no nor not of off on once only or other our out over own per same shall she should
+so some such than that the their them then there these they this those through to too under
+until up upon very was we were what when where which while who will with within would you your
+""".split())
+
+def tokenize(text):
+    """Lowercase word tokens without stopwords, with plural endings stripped"""
+    tokens = []
+    for token in re.findall(r"[a-z0-9]+", str(text).lower()):
+        if len(token) < 2 or token in STOPWORDS:
+            continue
+        if len(token) > 4 and token.endswith("ies"):
+            token = token[:-3] + "y"
+        elif len(token) > 3 and token.endswith("s") and not token.endswith("ss"):
+            token = token[:-1]
+        tokens.append(token)
+    return tokens
+
+class BM25:
+    """
+    Okapi BM25 over a small corpus of pre-tokenized documents.
+
+    Per-document term weights are computed once into a dense NumPy matrix, so
+    scoring a query is a column gather and a row sum.
+    """
+
+    def __init__(self, documents, k1=1.5, b=0.75, vocabulary=None, lengths=None):
+        # Weights can be limited to the terms that will be queried, which keeps the matrix
+        # small for a large corpus; document lengths still count every token, so documents
+        # already cut down to the vocabulary come with their original lengths
+        self.vocabulary = {}
+        for document in ([vocabulary] if vocabulary is not None else documents):
+            for token in document:
+                self.vocabulary.setdefault(token, len(self.vocabulary))
+
+        tf = np.zeros((len(documents), len(self.vocabulary)), dtype=np.float32)
+        for i, document in enumerate(documents):
+            known = [self.vocabulary[token] for token in document if token in self.vocabulary]
+            if known:
+                ids, counts = np.unique(known, return_counts=True)
+                tf[i, ids] = counts
+        lengths = np.array(lengths if lengths is not None else [len(document) for document in documents],
+                           dtype=np.float32)
+        average_length = lengths.mean() if len(documents) and lengths.mean() > 0 else 1.0
+        document_frequency = (tf > 0).sum(axis=0)
+        self.idf = np.log(1 + (len(documents) - document_frequency + 0.5) / (document_frequency + 0.5))
+        norm = k1 * (1 - b + b * lengths / average_length)
+        self.weights = tf * (k1 + 1) / (tf + norm[:, None]) * self.idf
+
+    def scores(self, query_tokens):
+        """BM25 score of every document for the query"""
+        ids = [self.vocabulary[token] for token in set(query_tokens) if token in self.vocabulary]
+        if not ids:
+            return np.zeros(self.weights.shape[0], dtype=np.float32)
+        return self.weights[:, ids].sum(axis=1)
+
+def default_log_path():
+    """Location of the decision log, overridable with LEXICAL_FILTER_LOG"""
+    if os.getenv("LEXICAL_FILTER_LOG"):
+        return os.getenv("LEXICAL_FILTER_LOG")
+    tender_data_path = os.getenv("TENDER_DATA_PATH", os.path.join(PROJECT_ROOT, "tender_data"))
+    return os.path.join(tender_data_path, "lexical_filter_log.csv")
+
+class LexicalFilter:
+    """
+    Scores tenders against the company profile so clear-cut ones skip the LLM.
+
+    Each capabilities line and each search keyword is a document in a BM25 index.
+    A tender's score is its best match against any of them, divided by that line's
+    score against itself, so 1 means every term of the line appears in the
+    description and 0 means none does. Every decision, the model's answer where
+    there is one, and disagreements between the two are appended to a CSV log for
+    tuning the thresholds.
+    """
+
+    def __init__(self, capabilities, keywords=(), reject_below=LEXICAL_REJECT_BELOW,
+                 accept_above=LEXICAL_ACCEPT_ABOVE, audit_rate=LEXICAL_AUDIT_RATE, log_path=None):
+        lines = [line for line in capabilities.splitlines() if line.strip()]
+        documents = [tokens for tokens in map(tokenize, list(lines) + list(keywords)) if tokens]
+        self.index = BM25(documents) if documents else None
+        # Highest score each line can reach: every one of its terms matched
+        self.self_scores = (np.array([self.index.scores(document)[i] for i, document in enumerate(documents)])
+                            if documents else None)
+        self.reject_below = reject_below
+        self.accept_above = accept_above
+        self.audit_rate = audit_rate
+        self.log_path = log_path or default_log_path()
+        self.counts = {"reject": 0, "accept": 0, "uncertain": 0, "audited": 0, "disagreements": 0}
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_keywords_file(cls, capabilities, keywords_path=None, **kwargs):
+        """Build the filter from the capabilities text and the search keywords CSV, if there is one"""
+        import scraper as search
+        keywords_path = keywords_path or search.get_path("KEYWORDS_PATH", search.resource_path("tender_data/Tender_Keywords.csv"))
+        keywords = search.load_keywords(keywords_path) if os.path.exists(keywords_path) else []
+        return cls(capabilities, keywords, **kwargs)
+
+    def score(self, description):
+        if self.index is None:
+            return 0.0
+        scores = self.index.scores(tokenize(description))
+        return min(1.0, float((scores / np.where(self.self_scores > 0, self.self_scores, 1)).max()))
+
+    def decide(self, description):
+        """Returns ('reject' | 'accept' | 'uncertain', score)"""
+        score = self.score(description)
+        if self.index is None:
+            decision = "uncertain"
+        elif self.reject_below is not None and score < self.reject_below:
+            decision = "reject"
+        elif self.accept_above is not None and score >= self.accept_above:
+            decision = "accept"
+        else:
+            decision = "uncertain"
+        with self._lock:
+            self.counts[decision] += 1
+        return decision, score
+
+    def needs_model(self, decision):
+        """Uncertain tenders go to the model, as does a random sample of the auto-decided ones"""
+        if decision == "uncertain":
+            return True
+        if random.random() < self.audit_rate:
+            with self._lock:
+                self.counts["audited"] += 1
+            return True
+        return False
+
+    def log(self, tender, score, decision, answer=None):
+        """Record a decision and, if the model was asked too, whether it agreed"""
+        disagreed = (decision == "reject" and answer == "yes") or (decision == "accept" and answer == "no")
+        row = [datetime.now().isoformat(timespec="seconds"), tender.get("id"), tender.get("title"),
+               f"{score:.3f}", decision, answer or "", int(disagreed)]
+        with self._lock:
+            if disagreed:
+                self.counts["disagreements"] += 1
+                print(f"Lexical filter disagreed with the model ({decision}, score {score:.2f}, "
+                      f"model said {answer}): {tender.get('title')}")
+            is_new = not os.path.exists(self.log_path)
+            os.makedirs(os.path.dirname(os.path.abspath(self.log_path)), exist_ok=True)
+            with open(self.log_path, "a", newline="", encoding="utf-8") as f:
+                writer = csv.writer(f)
+                if is_new:
+                    writer.writerow(["timestamp", "id", "title", "score", "decision", "model_answer", "disagreed"])
+                writer.writerow(row)
+
+    def report(self):
+        counts = self.counts
+        total = counts["reject"] + counts["accept"] + counts["uncertain"]
+        reject_rate = counts["reject"] / total * 100 if total else 0.0
+        mode = "" if self.reject_below is not None or self.accept_above is not None else " (log only, no thresholds set)"
+        return (f"Lexical filter{mode}: {counts['reject']} rejected ({reject_rate:.0f}%), {counts['accept']} accepted, "
+                f"{counts['uncertain']} sent to the model; {counts['disagreements']} disagreements "
+                f"in {counts['audited']} audited")
@@ -0,0 +1,266 @@
+import os
+import re
+import time
+import random
+import threading
+
+import requests
+from requests.adapters import HTTPAdapter
+from rate_limiter import is_retryable_status, retry_after_seconds
+
+# OpenAI-compatible chat completions endpoint served by LM Studio
+LLM_API_URL = os.getenv("LLM_API_URL", "http://localhost:1234/v1/chat/completions")
+# Embeddings endpoint on the same server
+LLM_EMBEDDINGS_URL = os.getenv("LLM_EMBEDDINGS_URL", LLM_API_URL.rsplit("/chat/completions", 1)[0] + "/embeddings")
+# Seconds to establish a connection, and to wait for a reply (or each chunk of a streamed one)
+LLM_CONNECT_TIMEOUT = float(os.getenv("LLM_CONNECT_TIMEOUT", "10"))
+LLM_READ_TIMEOUT = float(os.getenv("LLM_READ_TIMEOUT", "60"))
+# Attempts after the first for timeouts, connection errors and 429/5xx responses
+LLM_RETRIES = int(os.getenv("LLM_RETRIES", "2"))
+# Base delay for the jittered exponential backoff between attempts
+LLM_BACKOFF = float(os.getenv("LLM_BACKOFF", "1.0"))
+# Keep-alive connections held open to the server
+LLM_POOL_SIZE = int(os.getenv("LLM_POOL_SIZE", "8"))
+# Consecutive calls that couldn't connect before the circuit opens, and how long it stays open
+LLM_BREAKER_THRESHOLD = int(os.getenv("LLM_BREAKER_THRESHOLD", "3"))
+LLM_BREAKER_COOLDOWN = float(os.getenv("LLM_BREAKER_COOLDOWN", "30"))
+
+class LLMError(Exception):
+    """The server answered with an error status that retrying won't fix"""
+
+class CircuitOpenError(requests.exceptions.ConnectionError):
+    """
+    Raised without contacting the server while the circuit breaker is open. It is a
+    ConnectionError so callers that stop on an unreachable server handle it the same way.
+    """
+
+class CircuitBreaker:
+    """
+    Opens after `threshold` consecutive calls that couldn't reach the server, so further
+    calls fail immediately.
+    After `cooldown` seconds one trial call is let through; success closes the circuit
+    again and failure re-opens it for another cooldown.
+    """
+
+    def __init__(self, threshold=LLM_BREAKER_THRESHOLD, cooldown=LLM_BREAKER_COOLDOWN):
+        self.threshold = threshold
+        self.cooldown = cooldown
+        self.failures = 0
+        self.opened_at = None
+        self._trial_running = False
+        self._lock = threading.Lock()
+
+    def before_call(self, url):
+        with self._lock:
+            if self.opened_at is None:
+                return
+            if time.monotonic() - self.opened_at < self.cooldown or self._trial_running:
+                raise CircuitOpenError(f"{url} failed {self.failures} times in a row; not retrying for "
+                                       f"{self.cooldown:.0f}s")
+            self._trial_running = True
+
+    def record_success(self):
+        with self._lock:
+            self.failures = 0
+            self.opened_at = None
+            self._trial_running = False
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            self._trial_running = False
+            if self.failures >= self.threshold:
+                self.opened_at = time.monotonic()
+
+class LLMMetrics:
+    """
+    Per-call latency and the token counts the server reports. Reasoning tokens come from
+    the usage details when the server reports them and are estimated from the <think>
+    share of the reply otherwise.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.latencies = []
+        self.counts = {"calls": 0, "failures": 0, "retries": 0, "prompt": 0, "cached_prompt": 0,
+                       "completion": 0, "reasoning": 0, "truncated": 0}
+        self._standard = set(self.counts)
+
+    def record(self, result, latency):
+        usage = result.get('usage') or {}
+        choice = result['choices'][0]
+        message = choice.get('message') or {}
+        content = message.get('content') or ""
+        completion = usage.get('completion_tokens') or 0
+        reasoning = (usage.get('completion_tokens_details') or {}).get('reasoning_tokens')
+        if reasoning is None:
+            thinking = message.get('reasoning_content') or "".join(re.findall(r'<think>(.*?)(?:</think>|$)', content, flags=re.DOTALL))
+            visible = len(re.sub(r'<think>.*?(</think>|$)', '', content, flags=re.DOTALL))
+            total = len(thinking) + visible
+            reasoning = round(completion * len(thinking) / total) if total else 0
+        cached = (usage.get('prompt_tokens_details') or {}).get('cached_tokens') or 0
+        with self._lock:
+            self.latencies.append(latency)
+            self.counts["calls"] += 1
+            self.counts["prompt"] += usage.get('prompt_tokens') or 0
+            self.counts["cached_prompt"] += cached
+            self.counts["completion"] += completion
+            self.counts["reasoning"] += reasoning
+            self.counts["truncated"] += choice.get('finish_reason') == 'length'
+        print(f"LLM call {latency:.1f}s: {usage.get('prompt_tokens', '?')} prompt ({cached} cached), "
+              f"{completion} completion ({reasoning} reasoning), finish: {choice.get('finish_reason')}")
+
+    def record_latency(self, latency):
+        """Latency of a call whose usage isn't known up front (streamed replies)"""
+        with self._lock:
+            self.latencies.append(latency)
+            self.counts["calls"] += 1
+
+    def count(self, event):
+        with self._lock:
+            self.counts[event] = self.counts.get(event, 0) + 1
+
+    def report(self):
+        with self._lock:
+            counts = dict(self.counts)
+            latencies = sorted(self.latencies)
+        calls = counts["calls"] or 1
+        average = sum(latencies) / len(latencies) if latencies else 0.0
+        p95 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))] if latencies else 0.0
+        return (f"LLM calls: {counts['calls']} ({counts['failures']} failed, {counts['retries']} retries), "
+                f"latency avg {average:.1f}s / p95 {p95:.1f}s; tokens {counts['prompt']} prompt "
+                f"({counts['cached_prompt']} cached), {counts['completion']} completion ({counts['reasoning']} reasoning), "
+                f"{counts['completion'] / calls:.0f} completion tokens per call, {counts['truncated']} hit the budget"
+                + "".join(f", {value} {name.replace('_', ' ')}" for name, value in counts.items() if name not in self._standard))
+
+class LLMClient:
+    """
+    Chat completions client shared by the relevance filter and the document analysis.
+
+    One keep-alive session holds the connections, so they are set up once per process.
+    Timeouts, connection errors and 429/5xx responses are retried with jittered
+    exponential backoff. A circuit breaker stops calls to a server that keeps failing,
+    so a dead server costs one round of retries rather than one per tender.
+    """
+
+    def __init__(self, api_url=LLM_API_URL, pool_size=LLM_POOL_SIZE, connect_timeout=LLM_CONNECT_TIMEOUT,
+                 read_timeout=LLM_READ_TIMEOUT, retries=LLM_RETRIES, backoff=LLM_BACKOFF, breaker=None,
+                 embeddings_url=None):
+        self.api_url = api_url
+        self.embeddings_url = embeddings_url or (LLM_EMBEDDINGS_URL if api_url == LLM_API_URL else
+                                                 api_url.rsplit("/chat/completions", 1)[0] + "/embeddings")
+        self.connect_timeout = connect_timeout
+        self.read_timeout = read_timeout
+        self.retries = retries
+        self.backoff = backoff
+        self.breaker = breaker or CircuitBreaker()
+        self.metrics = LLMMetrics()
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=max(1, pool_size))
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+    def chat(self, payload, timeout=None, retries=None):
+        """
+        Send a chat completion request and return the decoded response. Returns None if every
+        attempt timed out, raises LLMError for other error statuses and ConnectionError when the
+        server can't be reached.
+        """
+        start = time.monotonic()
+        response = self._post(payload, timeout, retries, stream=False)
+        if response is None:
+            return None
+        result = response.json()
+        self.metrics.record(result, time.monotonic() - start)
+        return result
+
+    def stream(self, payload, timeout=None, retries=None):
+        """
+        Start a streamed chat completion and return the open response for reading its
+        server-sent events (the caller closes it), or None if every attempt timed out.
+        """
+        start = time.monotonic()
+        response = self._post(dict(payload, stream=True), timeout, retries, stream=True)
+        if response is not None:
+            # Time to the first byte of the stream
+            self.metrics.record_latency(time.monotonic() - start)
+        return response
+
+    def embed(self, texts, model, timeout=None, retries=None):
+        """
+        Embed a list of texts with one request and return the vectors in input order, or None
+        if every attempt timed out. Errors are raised as for chat().
+        """
+        response = self._post({"model": model, "input": list(texts)}, timeout, retries, stream=False,
+                              url=self.embeddings_url)
+        if response is None:
+            return None
+        data = sorted(response.json()["data"], key=lambda item: item.get("index", 0))
+        self.metrics.count("embedding_requests")
+        return [item["embedding"] for item in data]
+
+    def close(self):
+        self.session.close()
+
+    def _post(self, payload, timeout, retries, stream, url=None):
+        url = url or self.api_url
+        timeout = (self.connect_timeout, timeout or self.read_timeout)
+        retries = self.retries if retries is None else retries
+        self.breaker.before_call(url)
+        try:
+            for attempt in range(retries + 1):
+                if attempt:
+                    self.metrics.count("retries")
+                try:
+                    response = self.session.post(url, json=payload, timeout=timeout, stream=stream)
+                except requests.exceptions.ConnectionError as e:
+                    # Includes connect timeouts: the server couldn't be reached
+                    error = e
+                except requests.exceptions.Timeout:
+                    print(f"LLM request timed out after {timeout[1]:.0f}s (attempt {attempt + 1} of {retries + 1})")
+                    error = None
+                else:
+                    if response.status_code == 200:
+                        self.breaker.record_success()
+                        return response
+                    if not is_retryable_status(response.status_code) or attempt == retries:
+                        self.metrics.count("failures")
+                        # A response came back, so the server itself is reachable
+                        self.breaker.record_success()
+                        raise LLMError(f"Error from LLM API: {response.status_code} - {response.text}")
+                    print(f"LLM API returned {response.status_code}, retrying")
+                    error = None
+                    retry_after = retry_after_seconds(response.headers)
+                    if retry_after:
+                        time.sleep(retry_after)
+                        continue
+                if attempt < retries:
+                    # Full jitter keeps concurrent workers from retrying in lockstep
+                    time.sleep(random.uniform(0, self.backoff * 2 ** attempt))
+        except LLMError:
+            raise
+        except BaseException:
+            # Anything else (a broken chunked reply, a bad payload) still ends the call; record it
+            # so a half-open trial can't leave the circuit refusing calls for good
+            self.metrics.count("failures")
+            self.breaker.record_failure()
+            raise
+        self.metrics.count("failures")
+        if error is not None:
+            self.breaker.record_failure()
+            raise error
+        # Read timeouts mean the server accepted the connection and is busy (a reasoning model
+        # under load); that says nothing about it being down, so it doesn't open the circuit
+        self.breaker.record_success()
+        return None
+
+_shared_client = None
+_shared_lock = threading.Lock()
+
+def get_llm_client():
+    """Process-wide client shared by the filter and the document analysis"""
+    global _shared_client
+    with _shared_lock:
+        if _shared_client is None:
+            _shared_client = LLMClient()
+        return _shared_client
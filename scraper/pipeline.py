@@ -0,0 +1,356 @@
+import os
+import sys
+import time
+import queue
+import threading
+import pandas as pd
+import requests
+from concurrent.futures import ThreadPoolExecutor
+
+import scraper as search
+import scraper_links
+import deepseek_filter
+from driver_pool import DriverPool
+from seen_index import SeenIndex
+from tender_store import TenderStore, MANUAL_SOURCE
+from description_cache import DescriptionCache
+from verdict_cache import VerdictCache
+from lexical_filter import LexicalFilter, LEXICAL_FILTER
+from embedding_index import EmbeddingIndex, EMBEDDING_RANKING
+from llm_client import get_llm_client
+
+# Bounded queues give backpressure: a fast stage blocks instead of buffering a whole run
+STAGE_QUEUE_SIZE = int(os.getenv("PIPELINE_QUEUE_SIZE", "20"))
+DETAIL_WORKERS = int(os.getenv("PIPELINE_DETAIL_WORKERS", "5"))
+# Refresh the legacy CSV files from the store at the end of every run
+EXPORT_CSV = os.getenv("TENDER_EXPORT_CSV", "1") != "0"
+
+# Marks the end of a stage's output
+_DONE = object()
+
+class TenderPipeline:
+    """
+    In-process producer/consumer pipeline: search -> detail scraping -> LLM filter.
+
+    Each stage runs on its own threads and hands tenders to the next through a
+    bounded queue, so the first tenders are described and classified while the
+    search is still paging through results. Every stage upserts its results into
+    the tender store as it goes; the legacy CSV files are exported once at the end.
+    """
+
+    def __init__(self, keywords, index=None, store=None, on_progress=None,
+                 detail_workers=DETAIL_WORKERS, queue_size=STAGE_QUEUE_SIZE, shards=None,
+                 filter_workers=deepseek_filter.FILTER_CONCURRENCY, force=deepseek_filter.FILTER_FORCE,
+                 batch_size=deepseek_filter.FILTER_BATCH_SIZE, data_dir=None):
+        self.keywords = keywords
+        # Caches, the seen index and the decision log go in data_dir when given, rather than
+        # where TENDER_DATA_PATH points
+        self.data_dir = data_dir
+        self.index = index or SeenIndex(self._data_path("seen_tenders.json"))
+        self.store = store or TenderStore(self._data_path("tenders.db"))
+        self.cache = DescriptionCache(self._data_path("description_cache.db"))
+        self.verdict_cache = VerdictCache(self._data_path("verdict_cache.db"))
+        self.force = force
+        self.lexical = None
+        # Tenders arrive one batch at a time, so the pipeline scores them for sorting but
+        # doesn't hold any back; the top-N limit applies to standalone filter runs
+        self.embeddings = EmbeddingIndex(self._data_path("embeddings.f32")) if EMBEDDING_RANKING else None
+        self.on_progress = on_progress
+        self.detail_workers = max(1, detail_workers)
+        self.filter_workers = max(1, filter_workers)
+        self.batch_size = max(1, batch_size)
+        self.shards = max(1, min(shards or search.SEARCH_SHARDS, len(keywords) or 1))
+        self.detail_queue = queue.Queue(maxsize=queue_size)
+        self.filter_queue = queue.Queue(maxsize=queue_size)
+        self.stop_event = threading.Event()
+        self.error = None
+
+        self._lock = threading.Lock()
+        self._run_tenders = {}  # link -> tender dict for tenders emitted this run
+        self._revalidate_links = set()
+        self._accepted = []
+        self._evaluated_links = []
+        self._counts = {"found": 0, "skipped": 0, "described": 0, "failed": 0, "classified": 0, "accepted": 0}
+        self._first_verdict_at = None
+
+    def _data_path(self, name):
+        return os.path.join(self.data_dir, name) if self.data_dir else None
+
+    def cancel(self):
+        """Ask every stage to stop after its current item"""
+        self.stop_event.set()
+
+    def run(self):
+        """Run all stages to completion and return the DataFrame of accepted tenders"""
+        capabilities = deepseek_filter.load_capabilities()
+        if capabilities is None:
+            raise RuntimeError("Failed to load company capabilities")
+
+        if LEXICAL_FILTER:
+            self.lexical = LexicalFilter(capabilities, self.keywords, log_path=self._data_path("lexical_filter_log.csv"))
+
+        start = time.monotonic()
+        threads = [threading.Thread(target=self._search_stage, name="pipeline-search")]
+        session = scraper_links.create_session(self.detail_workers)
+        pool = DriverPool(scraper_links.setup_driver, size=self.detail_workers,
+                          max_pages=scraper_links.DRIVER_MAX_PAGES)
+        remaining = [self.detail_workers]
+        for i in range(self.detail_workers):
+            threads.append(threading.Thread(target=self._detail_stage, args=(session, pool, remaining),
+                                            name=f"pipeline-detail-{i}"))
+        llm_client = get_llm_client()
+        for i in range(self.filter_workers):
+            threads.append(threading.Thread(target=self._filter_stage, args=(capabilities, llm_client),
+                                            name=f"pipeline-filter-{i}"))
+
+        try:
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+        finally:
+            pool.close()
+            session.close()
+            self.cache.close()
+            self.verdict_cache.close()
+            if self.embeddings is not None:
+                self.embeddings.save()
+            self._write_outputs()
+
+        elapsed = time.monotonic() - start
+        first = f", first verdict after {self._first_verdict_at - start:.1f}s" if self._first_verdict_at else ""
+        rate = self._counts["classified"] / elapsed * 60 if elapsed > 0 else 0.0
+        print(f"Pipeline finished in {elapsed:.1f}s{first}: {self._summary()} ({rate:.1f} tenders/min classified)")
+        print(self.cache.report())
+        print(self.verdict_cache.report())
+        print(get_llm_client().metrics.report())
+        if self.lexical is not None:
+            print(self.lexical.report())
+        if self.embeddings is not None:
+            print(self.embeddings.report())
+        if self.error:
+            raise self.error
+        return pd.DataFrame(self._accepted) if self._accepted else None
+
+    def _search_stage(self):
+        try:
+            with ThreadPoolExecutor(max_workers=self.shards) as executor:
+                futures = [
+                    executor.submit(search.search_shard, self.keywords[i::self.shards], self._on_search_page, self.stop_event)
+                    for i in range(self.shards)
+                ]
+                for future in futures:
+                    try:
+                        future.result()
+                    except Exception as e:
+                        print(f"Error in search shard: {str(e)}")
+        finally:
+            for _ in range(self.detail_workers):
+                self._put(self.detail_queue, _DONE, force=True)
+
+    def _on_search_page(self, keyword, rows):
+        """Called from the search shards for every results page; emits new or changed tenders"""
+        emitted = []
+        updates = []
+        stored = self.store.stored_links(row["link"] for row in rows)
+        with self._lock:
+            for row in rows:
+                tender = self._run_tenders.get(row["link"])
+                if tender is not None:
+                    # Already emitted by another keyword, just add this keyword to it
+                    if keyword not in tender["keywords"].split("; "):
+                        tender["keywords"] += f"; {keyword}"
+                        updates.append({"id": tender["id"], "keywords": tender["keywords"]})
+                    continue
+                status = self.index.status(row)
+                stored_id, source = stored.get(row["link"], (None, None))
+                # Tenders added by hand are kept as the user entered them
+                if status == "unchanged" or source == MANUAL_SOURCE:
+                    self.index.touch(row["link"])
+                    self._counts["skipped"] += 1
+                    continue
+                if status == "changed":
+                    # An amended tender may have a new description even if the cached copy is fresh
+                    self._revalidate_links.add(row["link"])
+                tender = search.tender_record({**row, "keywords": keyword}, self.index, stored_id)
+                self._run_tenders[row["link"]] = tender
+                self._counts["found"] += 1
+                emitted.append(tender)
+                updates.append(dict(tender))
+        self.store.upsert(updates)
+        self._report()
+        for tender in emitted:
+            if not self._put(self.detail_queue, tender):
+                break
+
+    def _detail_stage(self, session, pool, remaining):
+        try:
+            while True:
+                tender = self.detail_queue.get()
+                if tender is _DONE:
+                    break
+                if self.stop_event.is_set():
+                    continue
+                revalidate = tender["link"] in self._revalidate_links
+                try:
+                    description, changed = scraper_links.scrape_url(tender["link"], session, pool, self.cache, revalidate)
+                except Exception as e:
+                    description, changed = f"Error scraping details: {str(e)}", True
+                if scraper_links.is_error_description(description):
+                    # Keep the tender pending, without a description, so the next run retries the page
+                    print(f"Skipping {tender['link']}: {description}")
+                    with self._lock:
+                        self._counts["failed"] += 1
+                    self._report()
+                    continue
+                tender["Full Description"] = description
+                update = {"id": tender["id"], "Full Description": description}
+                if changed:
+                    update["relevant"] = None
+                self.store.upsert([update])
+                with self._lock:
+                    self._counts["described"] += 1
+                self._report()
+                # Unchanged descriptions still go to the filter; the verdict cache answers them
+                # unless the capabilities, prompt or model changed since they were classified
+                self._put(self.filter_queue, tender)
+        finally:
+            with self._lock:
+                remaining[0] -= 1
+                last = remaining[0] == 0
+            if last:
+                for _ in range(self.filter_workers):
+                    self._put(self.filter_queue, _DONE, force=True)
+
+    def _filter_stage(self, capabilities, client):
+        done = False
+        while not done:
+            batch, done = self._next_filter_batch()
+            if not batch or self.stop_event.is_set():
+                # Drain without classifying so the detail workers can finish
+                continue
+            try:
+                scores = (self.embeddings.score([(tender["id"], tender["Full Description"]) for tender in batch], capabilities)
+                          if self.embeddings is not None else {})
+                answers = self._classify(batch, capabilities, client)
+            except requests.exceptions.ConnectionError as e:
+                print(f"Connection Error: Could not connect to {deepseek_filter.DEEPSEEK_API_URL}. Is the API server running?")
+                self.error = e
+                self.cancel()
+                continue
+            except Exception as e:
+                print(f"Error processing tender: {str(e)}")
+                continue
+
+            for tender, answer in zip(batch, answers):
+                if answer is None:
+                    continue
+                verdict = {"id": tender["id"], "relevant": int(answer == "yes")}
+                if str(tender["id"]) in scores:
+                    verdict["relevance_score"] = scores[str(tender["id"])]
+                self.store.upsert([verdict])
+                with self._lock:
+                    self._evaluated_links.append(tender["link"])
+                    self._counts["classified"] += 1
+                    if self._first_verdict_at is None:
+                        self._first_verdict_at = time.monotonic()
+                    if answer == "yes":
+                        self._accepted.append(tender)
+                        self._counts["accepted"] += 1
+                print(f"Tender {'accepted' if answer == 'yes' else 'rejected'}: {tender['title']}")
+            self._report()
+
+    def _next_filter_batch(self):
+        """
+        Block for one tender, then take whatever else is already queued up to the batch size,
+        so batching never holds a tender back waiting for more. Returns (tenders, reached end).
+        """
+        batch = []
+        item = self.filter_queue.get()
+        while item is not _DONE:
+            batch.append(item)
+            if len(batch) >= self.batch_size:
+                return batch, False
+            try:
+                item = self.filter_queue.get_nowait()
+            except queue.Empty:
+                return batch, False
+        return batch, True
+
+    def _classify(self, batch, capabilities, client):
+        """Answers for a batch of tenders from the lexical filter or the model, in batch order"""
+        descriptions = [tender["Full Description"] for tender in batch]
+        decisions = [self.lexical.decide(description) if self.lexical else ("uncertain", None)
+                     for description in descriptions]
+        asked = [i for i, (decision, _) in enumerate(decisions)
+                 if self.lexical is None or self.lexical.needs_model(decision)]
+
+        answers = [None] * len(batch)
+        for i, (decision, _) in enumerate(decisions):
+            if i not in asked:
+                answers[i] = "yes" if decision == "accept" else "no"
+        if len(asked) > 1:
+            model_answers = deepseek_filter.classify_batch([descriptions[i] for i in asked], capabilities, client,
+                                                           cache=self.verdict_cache, force=self.force)
+        else:
+            model_answers = [None] * len(asked)
+        for i, answer in zip(asked, model_answers):
+            # Single tenders, and any the batch reply left out, are asked about on their own
+            answers[i] = answer or deepseek_filter.classify_description(descriptions[i], capabilities, client,
+                                                                        cache=self.verdict_cache, force=self.force)
+
+        if self.lexical is not None:
+            for i, (tender, (decision, score)) in enumerate(zip(batch, decisions)):
+                self.lexical.log(tender, score, decision, answers[i] if i in asked else None)
+        return answers
+
+    def _write_outputs(self):
+        """Save the seen index and refresh the legacy CSV files from the store"""
+        with self._lock:
+            evaluated_links = list(self._evaluated_links)
+        self.index.mark_done(evaluated_links)
+        # Tenders that never reached a verdict stay pending and are retried on the next run
+        self.index.save()
+        if EXPORT_CSV:
+            self.store.export_csv()
+
+    def _put(self, q, item, force=False):
+        """
+        Blocking put that gives up when the pipeline is cancelled. End markers are forced
+        through; after a cancel the consumers only drain, so the queue frees up quickly.
+        """
+        while True:
+            if self.stop_event.is_set() and not force:
+                return False
+            try:
+                q.put(item, timeout=0.5)
+                return True
+            except queue.Full:
+                continue
+
+    def _summary(self):
+        counts = self._counts
+        failed = f", {counts['failed']} failed" if counts['failed'] else ""
+        return (f"{counts['found']} new, {counts['skipped']} skipped, {counts['described']} described{failed}, "
+                f"{counts['classified']} classified, {counts['accepted']} accepted")
+
+    def _report(self):
+        if self.on_progress:
+            with self._lock:
+                summary = self._summary()
+            self.on_progress(summary)
+
+def main():
+    keywords = search.load_keywords(search.get_path("KEYWORDS_PATH", "tender_data/Tender_Keywords.csv"))
+    result = TenderPipeline(keywords).run()
+    if result is None:
+        print("No new tenders were accepted")
+    else:
+        print(f"Successfully filtered tenders. Found {len(result)} matching tenders.")
+
+if __name__ == "__main__":
+    try:
+        main()
+    except Exception as e:
+        print(f"Fatal error: {str(e)}")
+        sys.exit(1)
@@ -0,0 +1,142 @@
+import os
+import time
+import threading
+from contextlib import contextmanager
+from urllib.parse import urlsplit
+
+# Starting request rate (requests per second) for every host and endpoint bucket
+RATE_LIMIT_RPS = float(os.getenv("RATE_LIMIT_RPS", "1.0"))
+# Bounds the adaptive rate is allowed to move between
+RATE_LIMIT_MIN_RPS = float(os.getenv("RATE_LIMIT_MIN_RPS", "0.1"))
+RATE_LIMIT_MAX_RPS = float(os.getenv("RATE_LIMIT_MAX_RPS", "4.0"))
+# Rate added after each healthy response
+RATE_LIMIT_STEP = float(os.getenv("RATE_LIMIT_STEP", "0.05"))
+# Responses slower than this (seconds) count as a sign the server is struggling
+RATE_LIMIT_SLOW_SECONDS = float(os.getenv("RATE_LIMIT_SLOW_SECONDS", "8"))
+
+class TokenBucket:
+    """Thread-safe token bucket whose refill rate can be changed while in use"""
+
+    def __init__(self, rate, burst=None):
+        self.rate = rate
+        self.burst = burst if burst is not None else max(1.0, rate * 2)
+        self.tokens = self.burst
+        self.updated = time.monotonic()
+        self.blocked_until = 0.0
+        self.lock = threading.Lock()
+
+    def reserve(self):
+        """Take a token and return how long the caller has to wait before using it"""
+        with self.lock:
+            now = time.monotonic()
+            self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            self.tokens -= 1
+            # A negative balance means the token is borrowed from the future
+            wait = 0.0 if self.tokens >= 0 else -self.tokens / self.rate
+            return max(wait, self.blocked_until - now)
+
+    def set_rate(self, rate):
+        with self.lock:
+            now = time.monotonic()
+            self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            self.rate = rate
+
+    def block_for(self, seconds):
+        with self.lock:
+            self.blocked_until = max(self.blocked_until, time.monotonic() + seconds)
+
+class AdaptiveRateLimiter:
+    """
+    Rate limiter with one token bucket per host and one per endpoint.
+
+    Every request waits on both its host bucket and its endpoint bucket. Healthy
+    responses raise the rate additively; errors halve it and slow responses cut it
+    by a quarter (AIMD), so throughput settles just below what the server tolerates.
+    """
+
+    def __init__(self, rate=RATE_LIMIT_RPS, min_rate=RATE_LIMIT_MIN_RPS, max_rate=RATE_LIMIT_MAX_RPS,
+                 step=RATE_LIMIT_STEP, slow_seconds=RATE_LIMIT_SLOW_SECONDS):
+        self.rate = rate
+        self.min_rate = min_rate
+        self.max_rate = max_rate
+        self.step = step
+        self.slow_seconds = slow_seconds
+        self._buckets = {}
+        self._lock = threading.Lock()
+
+    def acquire(self, url):
+        """Block until a request to this URL is allowed"""
+        wait = max(bucket.reserve() for bucket in self._buckets_for(url))
+        if wait > 0:
+            time.sleep(wait)
+
+    def report(self, url, ok=True, elapsed=None, retry_after=None):
+        """Feed the outcome of a request back so the rate can adapt"""
+        for bucket in self._buckets_for(url):
+            if retry_after:
+                bucket.block_for(retry_after)
+            if not ok:
+                factor, increase = 0.5, 0.0
+            elif elapsed is not None and elapsed > self.slow_seconds:
+                factor, increase = 0.75, 0.0
+            else:
+                factor, increase = 1.0, self.step
+            new_rate = min(self.max_rate, max(self.min_rate, bucket.rate * factor + increase))
+            if new_rate != bucket.rate:
+                bucket.set_rate(new_rate)
+
+    @contextmanager
+    def throttle(self, url):
+        """Wait for a slot, then time the request and report it (failed if the block raises)"""
+        self.acquire(url)
+        start = time.monotonic()
+        try:
+            yield
+        except Exception:
+            self.report(url, ok=False, elapsed=time.monotonic() - start)
+            raise
+        self.report(url, ok=True, elapsed=time.monotonic() - start)
+
+    def current_rate(self, url):
+        """Effective requests per second for a URL (the slower of its two buckets)"""
+        return min(bucket.rate for bucket in self._buckets_for(url))
+
+    def _buckets_for(self, url):
+        host, endpoint = _bucket_keys(url)
+        with self._lock:
+            buckets = []
+            for key in (host, endpoint):
+                if key not in self._buckets:
+                    self._buckets[key] = TokenBucket(self.rate)
+                buckets.append(self._buckets[key])
+            return buckets
+
+def _bucket_keys(url):
+    """Host key plus an endpoint key made of the host and the first two path segments"""
+    parts = urlsplit(url)
+    host = parts.netloc.lower()
+    segments = [segment for segment in parts.path.split("/") if segment][:2]
+    return f"host:{host}", f"endpoint:{host}/{'/'.join(segments)}"
+
+def is_retryable_status(status_code):
+    return status_code == 429 or status_code >= 500
+
+def retry_after_seconds(headers):
+    """Parse a numeric Retry-After header, ignoring the rarely used HTTP-date form"""
+    try:
+        return float(headers.get("Retry-After"))
+    except (TypeError, ValueError):
+        return None
+
+_shared_limiter = None
+_shared_lock = threading.Lock()
+
+def get_rate_limiter():
+    """Process-wide limiter shared by every scraper stage"""
+    global _shared_limiter
+    with _shared_lock:
+        if _shared_limiter is None:
+            _shared_limiter = AdaptiveRateLimiter()
+        return _shared_limiter
@@ -5,14 +5,51 @@ from selenium import webdriver
 from selenium.webdriver.common.by import By
 from selenium.webdriver.support.ui import WebDriverWait
 from selenium.webdriver.support import expected_conditions as EC
+from selenium.common.exceptions import TimeoutException
+from concurrent.futures import ThreadPoolExecutor, as_completed
 import time
-import random
 from datetime import datetime
 
+SEARCH_START_URL = "https://canadabuys.canada.ca/en"
+NEXT_PAGE_SELECTOR = "li.pager__item--next a, a[rel='next']"
+# Pulls every results row plus the pager's next link out of the page in one round trip.
+# innerText matches what WebElement.text returns for the same cell.
+RESULTS_TABLE_SCRIPT = """
+const body = document.querySelector('tbody');
+const rows = [];
+if (body) {
+    for (const tr of body.querySelectorAll('tr')) {
+        const cells = tr.querySelectorAll('td');
+        // "No results" placeholder rows span the whole table
+        if (cells.length < 5) continue;
+        const link = cells[0].querySelector('a');
+        if (!link) continue;
+        rows.push({
+            title: link.innerText.trim(),
+            link: link.href,
+            category: cells[1].innerText.trim(),
+            date_posted: cells[2].innerText.trim(),
+            closing_date: cells[3].innerText.trim(),
+            organization: cells[4].innerText.trim()
+        });
+    }
+}
+const next = document.querySelector(arguments[0]);
+return {rows: rows, next: next ? next.href : null};
+"""
+# Number of browsers searching keywords at the same time
+SEARCH_SHARDS = int(os.getenv("SEARCH_SHARDS", "3"))
+# Safety cap on pager depth per keyword
+MAX_RESULT_PAGES = int(os.getenv("MAX_RESULT_PAGES", "50"))
+
 def get_path(env_var, default_path):
     """Get path from environment variable or fall back to default"""
     return os.getenv(env_var, default_path)
 
+from seen_index import SeenIndex
+from tender_store import TenderStore, MANUAL_SOURCE
+from rate_limiter import get_rate_limiter
+
 # Only import from UI if not running as subprocess
 if not os.getenv("NO_UI"):
     sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
@@ -86,91 +123,204 @@ def setup_driver():
 
 def load_keywords(csv_path):
     df = pd.read_csv(csv_path)
-    return df.iloc[:, 1].tolist()
-
-def get_last_id():
-    """Retrieve the last used tender ID from a file; if the file doesn't exist, return 0."""
-    last_id_path = get_path("LAST_ID_PATH", "last_id.txt")
-    if os.path.exists(last_id_path):
-        with open(last_id_path, "r") as f:
-            try:
-                last_id = int(f.read().strip())
-            except ValueError:
-                last_id = 0
-    else:
-        last_id = 0
-    return last_id
-
-def update_last_id(last_id):
-    """Update the file with the new last used tender ID."""
-    last_id_path = get_path("LAST_ID_PATH", "last_id.txt")
-    with open(last_id_path, "w") as f:
-        f.write(str(last_id))
+    keywords = df.iloc[:, 1].dropna().astype(str).str.strip()
+    return keywords[keywords != ""].drop_duplicates().tolist()
 
-def search_tenders(driver, keywords):
-    driver.get("https://canadabuys.canada.ca/en")
+def open_search_page(driver):
+    with get_rate_limiter().throttle(SEARCH_START_URL):
+        driver.get(SEARCH_START_URL)
     
     search_button = WebDriverWait(driver, 10).until(
         EC.element_to_be_clickable((By.LINK_TEXT, "Search tenders"))
     )
     search_button.click()
-    
-    all_data = []
-    tender_id = get_last_id()
 
-    for keyword in keywords:
-        search_box = WebDriverWait(driver, 10).until(
-            EC.presence_of_element_located((By.ID, "edit-words--7"))
-        )
-        search_box.clear()
-        search_box.send_keys(keyword)
-        
-        time.sleep(random.uniform(3, 6))
-        
-        search_button = WebDriverWait(driver, 10).until(
-            EC.element_to_be_clickable((By.CSS_SELECTOR, "button[data-twig-selector='search']"))
-        )
-        search_button.click()
-        
-        time.sleep(random.uniform(5, 10))
-        
-        table_body = WebDriverWait(driver, 10).until(
+def read_results_page(driver):
+    """
+    Read the tender rows and the next-page link from the results table currently shown.
+    The whole table comes back from a single execute_script call instead of several
+    WebDriver round trips per row.
+    """
+    try:
+        WebDriverWait(driver, 10).until(
             EC.presence_of_element_located((By.CSS_SELECTOR, "tbody"))
         )
-        rows = table_body.find_elements(By.TAG_NAME, "tr")
-        
-        for row in rows:
-            cells = row.find_elements(By.TAG_NAME, "td")
-            title_cell = cells[0].find_element(By.TAG_NAME, "a")
-            organization = cells[4].text
-            if organization == "NATO - North Atlantic Treaty Organization":
-                continue
-            tender_id += 1
-            row_data = {
-                "id": tender_id,
-                "title": title_cell.text,
-                "link": title_cell.get_attribute("href"),
-                "category": cells[1].text,
-                "date_posted": cells[2].text,
-                "closing_date": cells[3].text,
-                "organization": organization
-            }
-            all_data.append(row_data)
-        
-        break
+    except TimeoutException:
+        # No results table at all for this keyword
+        return [], None
+    page = driver.execute_script(RESULTS_TABLE_SCRIPT, NEXT_PAGE_SELECTOR) or {}
+    
+    page_data = [
+        row for row in page.get("rows", [])
+        if row["organization"] != "NATO - North Atlantic Treaty Organization"
+    ]
+    return page_data, page.get("next")
+
+def search_keyword(driver, keyword, on_page=None):
+    """
+    Run one keyword search and follow the pager through every results page.
+    If given, on_page(keyword, rows) is called as soon as each page has been read.
+    """
+    limiter = get_rate_limiter()
+    search_box = WebDriverWait(driver, 10).until(
+        EC.presence_of_element_located((By.ID, "edit-words--7"))
+    )
+    search_box.clear()
+    search_box.send_keys(keyword)
+    
+    # Rows from the previous keyword go stale once the new results have replaced them
+    previous_rows = driver.find_elements(By.CSS_SELECTOR, "tbody tr")
+    
+    search_button = WebDriverWait(driver, 10).until(
+        EC.element_to_be_clickable((By.CSS_SELECTOR, "button[data-twig-selector='search']"))
+    )
+    with limiter.throttle(driver.current_url):
+        search_button.click()
+        if previous_rows:
+            try:
+                WebDriverWait(driver, 15).until(EC.staleness_of(previous_rows[0]))
+            except TimeoutException:
+                pass
+    
+    results, url = read_results_page(driver)
+    if on_page:
+        on_page(keyword, results)
+    visited = {driver.current_url}
+    for _ in range(MAX_RESULT_PAGES - 1):
+        if not url or url in visited:
+            break
+        visited.add(url)
+        with limiter.throttle(url):
+            driver.get(url)
+        page_data, url = read_results_page(driver)
+        if on_page:
+            on_page(keyword, page_data)
+        results.extend(page_data)
+    
+    print(f"Keyword '{keyword}': {len(results)} results over {len(visited)} page(s)")
+    return results
 
-    csv_filename = os.path.join(get_path("TENDER_DATA_PATH", "tender_data"), "tender_data.csv")
-    df = pd.DataFrame(all_data)
-    df.to_csv(csv_filename, index=False)
-    update_last_id(tender_id)
+def restart_driver(driver):
+    """Quit a browser that may have died and return a fresh one on the search page, or None if that fails too"""
+    if driver is not None:
+        try:
+            driver.quit()
+        except Exception:
+            pass
+    driver = None
+    try:
+        driver = setup_driver()
+        open_search_page(driver)
+        return driver
+    except Exception as e:
+        print(f"Could not restart the browser: {str(e)}")
+        if driver is not None:
+            try:
+                driver.quit()
+            except Exception:
+                pass
+        return None
 
-def main():
+def search_shard(keywords, on_page=None, stop_event=None):
+    """Search a share of the keywords with a dedicated browser; returns (keyword, row) pairs"""
+    found = []
+    if not keywords:
+        return found
     driver = setup_driver()
     try:
-        keywords = load_keywords(get_path("KEYWORDS_PATH", "tender_data/Tender_Keywords.csv"))
-        search_tenders(driver, keywords)
+        open_search_page(driver)
+        for keyword in keywords:
+            if stop_event is not None and stop_event.is_set():
+                break
+            if driver is None:
+                # The last restart failed; try again for this keyword
+                driver = restart_driver(None)
+                if driver is None:
+                    continue
+            try:
+                rows = search_keyword(driver, keyword, on_page)
+            except Exception as e:
+                # One failed keyword shouldn't throw away the rest of the shard; the browser
+                # may be the reason, so the next keyword gets a fresh one
+                print(f"Error searching keyword '{keyword}': {str(e)}")
+                driver = restart_driver(driver)
+                continue
+            found.extend((keyword, row) for row in rows)
     finally:
-        driver.quit()
+        if driver is not None:
+            driver.quit()
+    return found
+
+def merge_results(found):
+    """Collapse tenders found by several keywords into one row that lists every matching keyword"""
+    merged = {}
+    for keyword, row in found:
+        tender = merged.get(row["link"])
+        if tender is None:
+            merged[row["link"]] = {**row, "keywords": [keyword]}
+        elif keyword not in tender["keywords"]:
+            tender["keywords"].append(keyword)
+    for tender in merged.values():
+        tender["keywords"] = "; ".join(tender["keywords"])
+    return list(merged.values())
+
+def tender_record(row, index, stored_id=None):
+    """
+    Record a search result in the seen index and build the row to upsert into the store.
+    New and changed tenders get their description cleared so the detail stage fetches it again;
+    a changed tender keeps its verdict unless its description turns out to have changed too.
+    stored_id is the ID the store already holds the link under, which the row keeps so later
+    stages update that tender.
+    """
+    status = index.status(row)
+    record = {"id": index.record(row), **row}
+    if stored_id is not None:
+        record["id"] = stored_id
+    if status in ("new", "changed"):
+        record["Full Description"] = None
+    if status == "new":
+        record["relevant"] = None
+    return record
+
+def search_tenders(keywords, index=None, shards=None, store=None):
+    """
+    Search CanadaBuys for every keyword and upsert only new or changed tenders into the store.
+    Keywords are split across several browsers running at once, and tenders already processed
+    on a previous run are skipped so later stages never see them.
+    """
+    index = index or SeenIndex()
+    store = store or TenderStore()
+    shards = max(1, min(shards or SEARCH_SHARDS, len(keywords)))
+    
+    found = []
+    with ThreadPoolExecutor(max_workers=shards) as executor:
+        futures = [executor.submit(search_shard, keywords[i::shards]) for i in range(shards)]
+        for future in as_completed(futures):
+            try:
+                found.extend(future.result())
+            except Exception as e:
+                print(f"Error in search shard: {str(e)}")
+    
+    all_data = []
+    skipped = 0
+    rows = merge_results(found)
+    stored = store.stored_links(row["link"] for row in rows)
+    for row_data in rows:
+        stored_id, source = stored.get(row_data["link"], (None, None))
+        # Tenders added by hand are kept as the user entered them
+        if index.status(row_data) == "unchanged" or source == MANUAL_SOURCE:
+            index.touch(row_data["link"])
+            skipped += 1
+            continue
+        all_data.append(tender_record(row_data, index, stored_id))
+
+    store.upsert(all_data)
+    index.save()
+    print(f"Found {len(all_data)} new or changed tenders, skipped {skipped} already processed")
+
+def main():
+    keywords = load_keywords(get_path("KEYWORDS_PATH", "tender_data/Tender_Keywords.csv"))
+    search_tenders(keywords)
 
 if __name__ == "__main__":
     main()
@@ -2,7 +2,9 @@ import os
 import sys
 import pandas as pd
 import time
-import random
+import requests
+from requests.adapters import HTTPAdapter
+from parsel import Selector
 from selenium import webdriver
 from selenium.webdriver.common.by import By
 from selenium.common.exceptions import NoSuchElementException
@@ -11,13 +13,22 @@ from concurrent.futures import ThreadPoolExecutor, as_completed
 # Add parent directory to path to import the resource_path function
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 from UI import resource_path
+from driver_pool import DriverPool
+from tender_store import TenderStore
+from description_cache import DescriptionCache
+from rate_limiter import get_rate_limiter, is_retryable_status, retry_after_seconds
 
-def extract_links_from_csv(csv_path):
-    try:
-        df = pd.read_csv(csv_path)
-        return df['link'].tolist()
-    except Exception:
-        return []
+# Number of pages a pooled browser serves before it is quit and replaced
+DRIVER_MAX_PAGES = int(os.getenv("DRIVER_MAX_PAGES", "50"))
+
+# How detail pages are fetched:
+#   "auto"     - plain HTTP first, Selenium only when the description is missing from the raw HTML
+#   "http"     - plain HTTP only
+#   "selenium" - always render the page in Chrome
+FETCH_MODE = os.getenv("SCRAPER_FETCH_MODE", "auto").lower()
+HTTP_TIMEOUT = float(os.getenv("SCRAPER_HTTP_TIMEOUT", "20"))
+USER_AGENT = 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
+DESCRIPTION_SELECTOR = "div.tender-detail-description"
 
 def setup_driver():
     # Try to detect Chrome location
@@ -61,74 +72,203 @@ def setup_driver():
     options.add_argument('--disable-extensions')
     options.add_argument('--disable-software-rasterizer')
     options.add_argument('--start-maximized')
-    options.add_argument('user-agent=Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36')
+    options.add_argument(f'user-agent={USER_AGENT}')
     
     # Create the driver with the specific chromedriver path
     from selenium.webdriver.chrome.service import Service
     service = Service(executable_path=chromedriver_path)
     return webdriver.Chrome(service=service, options=options)
 
-def scrape_tender_details(url):
-    driver = None
+def create_session(pool_size=5):
+    """Create a keep-alive HTTP session sized for the scraping thread pool"""
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    session.headers.update({
+        "User-Agent": USER_AGENT,
+        "Accept": "text/html,application/xhtml+xml",
+        "Accept-Encoding": "gzip, deflate",
+        "Accept-Language": "en-CA,en;q=0.9",
+    })
+    return session
+
+def parse_description(html):
+    """Extract the tender description text from raw page HTML, or None if the block is absent"""
+    selector = Selector(text=html)
+    description_div = selector.css(DESCRIPTION_SELECTOR)
+    if not description_div:
+        return None
+    # Keep one line per text node, like the rendered element text Selenium returns
+    lines = [line.strip() for line in description_div[0].css("::text").getall()]
+    return "\n".join(line for line in lines if line)
+
+def fetch_page_http(session, url, headers=None):
+    """Rate-limited GET of a detail page; the caller decides what to do with the status code"""
+    limiter = get_rate_limiter()
+    limiter.acquire(url)
+    start = time.monotonic()
     try:
-        driver = setup_driver()
-        driver.get(url)
+        response = session.get(url, headers=headers, timeout=HTTP_TIMEOUT)
+    except requests.RequestException:
+        limiter.report(url, ok=False, elapsed=time.monotonic() - start)
+        raise
+    limiter.report(
+        url,
+        ok=not is_retryable_status(response.status_code),
+        elapsed=time.monotonic() - start,
+        retry_after=retry_after_seconds(response.headers),
+    )
+    return response
+
+def fetch_description_http(session, url):
+    """Fetch a detail page without a browser; returns None when the description needs rendering"""
+    response = fetch_page_http(session, url)
+    response.raise_for_status()
+    return parse_description(response.text)
+
+def scrape_tender_details(url, driver):
+    try:
+        with get_rate_limiter().throttle(url):
+            driver.get(url)
         # Use a CSS selector for the unique class "tender-detail-description"
-        description_div = driver.find_element(By.CSS_SELECTOR, "div.tender-detail-description")
-        description = description_div.text
-        time.sleep(random.uniform(1, 3))  # Random delay between 1 to 3 seconds
-        return description
+        description_div = driver.find_element(By.CSS_SELECTOR, DESCRIPTION_SELECTOR)
+        return description_div.text
     except NoSuchElementException:
         return "Element not found"
+
+def scrape_with_pool(pool, url):
+    """Scrape a single URL with a driver checked out of the pool"""
+    driver = None
+    broken = False
+    try:
+        driver = pool.acquire()
+        return scrape_tender_details(url, driver)
     except Exception as e:
+        # Don't hand a browser in an unknown state to the next worker
+        broken = True
         return f"Error scraping details: {str(e)}"
     finally:
-        if driver:
-            try:
-                driver.quit()
-            except Exception:
-                pass
+        pool.release(driver, broken=broken)
+
+def is_error_description(description):
+    return description == "Element not found" or description.startswith("Error scraping details")
+
+def scrape_url(url, session, pool, cache=None, revalidate=False):
+    """
+    Scrape one detail page using the configured fetch mode and the description cache.
+    Returns (description, changed); changed is False when the cached description is still
+    current, so the tender doesn't need to go through the filter again.
+    """
+    entry = None
+    if cache is not None:
+        entry = cache.get(url)
+        if entry is not None and not revalidate and cache.is_fresh(entry):
+            cache.count("hits")
+            return entry["description"], False
+        cache.count("misses" if entry is None else "stale")
+
+    if FETCH_MODE != "selenium":
+        try:
+            # Conditional request when we hold validators: a 304 revalidates the cached copy without a body
+            headers = cache.validators(entry) if cache is not None else None
+            response = fetch_page_http(session, url, headers)
+            if response.status_code == 304 and entry is not None:
+                cache.touch(url)
+                return entry["description"], False
+            response.raise_for_status()
+            description = parse_description(response.text)
+            if description is not None:
+                return description, _cache_description(cache, url, description, response.headers)
+            if FETCH_MODE == "http":
+                return "Element not found", True
+        except requests.RequestException as e:
+            if FETCH_MODE == "http":
+                return f"Error scraping details: {str(e)}", True
+        # Description is rendered client-side or the request failed, fall back to Chrome
+    description = scrape_with_pool(pool, url)
+    if is_error_description(description):
+        return description, True
+    return description, _cache_description(cache, url, description)
+
+def _cache_description(cache, url, description, headers=None):
+    if cache is None:
+        return True
+    return cache.put(url, description, headers)
 
-def scrape_batch(links):
+def scrape_batch(links, cache=None, revalidate_links=()):
+    """
+    Scrape descriptions for the links; returns ({link: description}, set of links whose content
+    changed). Links whose page failed are left out, so they stay without a description and are
+    scraped again next time.
+    """
     descriptions = {}
+    changed_links = set()
+    revalidate_links = set(revalidate_links)
     max_workers = min(5, len(links))  # Use fewer threads to be gentler
     
-    with ThreadPoolExecutor(max_workers=max_workers) as executor:
-        future_to_url = {executor.submit(scrape_tender_details, link): link for link in links}
-        for future in as_completed(future_to_url):
-            url = future_to_url[future]
-            try:
-                description = future.result()
-                time.sleep(random.uniform(1, 3))  # Random delay between 1 to 3 seconds
-            except Exception:
-                description = "Error occurred"
-            descriptions[url] = description
+    # The pool only launches Chrome when a page actually needs the Selenium fallback
+    with create_session(max_workers) as session, \
+            DriverPool(setup_driver, size=max_workers, max_pages=DRIVER_MAX_PAGES) as pool:
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            future_to_url = {
+                executor.submit(scrape_url, link, session, pool, cache, link in revalidate_links): link
+                for link in links
+            }
+            for future in as_completed(future_to_url):
+                url = future_to_url[future]
+                try:
+                    description, changed = future.result()
+                except Exception as e:
+                    description, changed = f"Error scraping details: {str(e)}", True
+                if is_error_description(description):
+                    print(f"Skipping {url}: {description}")
+                    continue
+                descriptions[url] = description
+                if changed:
+                    changed_links.add(url)
     
-    return descriptions
+    return descriptions, changed_links
+
+def merge_descriptions(df, descriptions):
+    """
+    Fill 'Full Description' from a {link: description} dict in one vectorized lookup.
+    Every row sharing a link gets the description; rows without a scraped link keep theirs.
+    """
+    df = df.copy()
+    existing = df['Full Description'] if 'Full Description' in df else pd.Series(None, index=df.index, dtype=object)
+    df['Full Description'] = df['link'].map(descriptions).astype(object).combine_first(existing)
+    return df
 
 def main():
     try:
-        csv_path = resource_path("tender_data/tender_data.csv")
-        new_csv_path = resource_path("tender_data/tender_data_with_descriptions.csv")
-        
-        # Read existing CSV
-        df = pd.read_csv(csv_path)
+        store = TenderStore()
         
-        # Extract links from CSV
-        links = extract_links_from_csv(csv_path)
+        # Only tenders the search stage added or changed are missing a description
+        df = store.pending_descriptions()
+        links = df['link'].tolist()
         
         if not links:
-            raise ValueError("No links found in CSV file")
+            print("No new or changed tenders to describe")
+            return
+        
+        # Tenders that already have a verdict were amended; make sure their cached page is re-checked
+        revalidate_links = df.loc[df['relevant'].notna(), 'link'].tolist()
         
         # Scrape descriptions in batches
-        descriptions = scrape_batch(links)
+        cache = DescriptionCache()
+        descriptions, changed_links = scrape_batch(links, cache, revalidate_links)
+        print(cache.report())
         
         # Append the descriptions to the DataFrame
-        for link, description in descriptions.items():
-            df.loc[df['link'] == link, 'Full Description'] = description
+        df = merge_descriptions(df, descriptions)
+        
+        # Only tenders whose description changed need a new verdict
+        df['relevant'] = df['relevant'].astype(object)
+        df.loc[df['link'].isin(changed_links), 'relevant'] = None
         
-        # Save the updated CSV
-        df.to_csv(new_csv_path, index=False)
+        # Write back just the descriptions and verdict resets for the scraped rows
+        store.upsert(df[['id', 'Full Description', 'relevant']])
 
     except Exception as e:
         print(f"Error: {str(e)}")
@@ -0,0 +1,141 @@
+import os
+import json
+import hashlib
+from datetime import datetime
+
+import pandas as pd
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Search result fields that identify a revision of a tender; an amendment changes at least one of them
+FINGERPRINT_FIELDS = ("title", "category", "date_posted", "closing_date", "organization")
+
+def default_index_path():
+    """Location of the seen-tender index, overridable with SEEN_INDEX_PATH"""
+    if os.getenv("SEEN_INDEX_PATH"):
+        return os.getenv("SEEN_INDEX_PATH")
+    tender_data_path = os.getenv("TENDER_DATA_PATH", os.path.join(PROJECT_ROOT, "tender_data"))
+    return os.path.join(tender_data_path, "seen_tenders.json")
+
+def fingerprint(row):
+    """Hash the search result fields of a tender so changes can be detected between runs"""
+    values = "\x1f".join(_clean(row.get(field)) for field in FINGERPRINT_FIELDS)
+    return hashlib.sha1(values.encode("utf-8")).hexdigest()
+
+class SeenIndex:
+    """
+    Persistent record of every tender link the scraper has seen.
+
+    Each link keeps its tender ID, a fingerprint of its search result fields and
+    a pending flag. A tender stays pending from the moment the search stage emits
+    it until the filter stage has processed it, so a failed run retries it instead
+    of forgetting it. The index also hands out tender IDs, replacing last_id.txt.
+    """
+
+    def __init__(self, path=None, last_id_path=None):
+        self.path = path or default_index_path()
+        self.last_id_path = last_id_path or os.getenv("LAST_ID_PATH", os.path.join(PROJECT_ROOT, "last_id.txt"))
+        self.next_id = 1
+        self.tenders = {}
+        if os.path.exists(self.path):
+            self._load()
+        else:
+            self._bootstrap()
+
+    def status(self, row):
+        """Return 'new', 'changed', 'pending' or 'unchanged' for a search result row"""
+        entry = self.tenders.get(row["link"])
+        if entry is None:
+            return "new"
+        if entry["fingerprint"] != fingerprint(row):
+            return "changed"
+        if entry.get("pending"):
+            return "pending"
+        return "unchanged"
+
+    def touch(self, link):
+        """Note that a known tender showed up again in the search results"""
+        entry = self.tenders.get(link)
+        if entry is not None:
+            entry["last_seen"] = _now()
+
+    def record(self, row):
+        """Store the current revision of a tender as pending and return its ID"""
+        now = _now()
+        entry = self.tenders.get(row["link"])
+        if entry is None:
+            entry = {"id": self.next_id, "first_seen": now}
+            self.next_id += 1
+            self.tenders[row["link"]] = entry
+        entry["fingerprint"] = fingerprint(row)
+        entry["last_seen"] = now
+        entry["pending"] = True
+        return entry["id"]
+
+    def mark_done(self, links):
+        """Clear the pending flag once later stages have processed these links"""
+        for link in links:
+            entry = self.tenders.get(link)
+            if entry is not None:
+                entry["pending"] = False
+
+    def pending_links(self):
+        return [link for link, entry in self.tenders.items() if entry.get("pending")]
+
+    def save(self):
+        """Write the index atomically so an interrupted run can't corrupt it"""
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"next_id": self.next_id, "tenders": self.tenders}, f)
+        os.replace(tmp_path, self.path)
+
+    def _load(self):
+        with open(self.path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+        self.next_id = int(data.get("next_id", 1))
+        self.tenders = data.get("tenders", {})
+
+    def _bootstrap(self):
+        """Seed a new index from last_id.txt and the tenders already described on a previous run"""
+        if os.path.exists(self.last_id_path):
+            with open(self.last_id_path, "r") as f:
+                try:
+                    self.next_id = int(f.read().strip()) + 1
+                except ValueError:
+                    pass
+
+        described_path = os.path.join(os.path.dirname(os.path.abspath(self.path)), "tender_data_with_descriptions.csv")
+        if not os.path.exists(described_path):
+            return
+        try:
+            df = pd.read_csv(described_path)
+        except Exception:
+            return
+
+        now = _now()
+        for row in df.to_dict("records"):
+            link = row.get("link")
+            if not isinstance(link, str) or not link:
+                continue
+            try:
+                tender_id = int(row.get("id"))
+            except (TypeError, ValueError):
+                tender_id = self.next_id
+            self.next_id = max(self.next_id, tender_id + 1)
+            self.tenders[link] = {
+                "id": tender_id,
+                "fingerprint": fingerprint(row),
+                "first_seen": now,
+                "last_seen": now,
+                "pending": False,
+            }
+
+def _clean(value):
+    # Values read back from CSV come through as NaN where the scraper wrote an empty string
+    if value is None or (isinstance(value, float) and value != value):
+        return ""
+    return str(value).strip()
+
+def _now():
+    return datetime.now().isoformat(timespec="seconds")
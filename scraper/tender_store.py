@@ -0,0 +1,274 @@
+import os
+import sys
+import uuid
+import sqlite3
+import argparse
+import threading
+from datetime import datetime
+
+import pandas as pd
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# DataFrame/CSV column name -> SQLite column name
+COLUMNS = {
+    "id": "id",
+    "title": "title",
+    "link": "link",
+    "category": "category",
+    "date_posted": "date_posted",
+    "closing_date": "closing_date",
+    "organization": "organization",
+    "keywords": "keywords",
+    "Full Description": "description",
+    "relevant": "relevant",
+    "relevance_score": "relevance_score",
+    "deferrals": "deferrals",
+    "status": "status",
+    "source": "source",
+}
+SEARCH_COLUMNS = ["id", "title", "link", "category", "date_posted", "closing_date", "organization", "keywords"]
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS tenders (
+    id TEXT PRIMARY KEY,
+    title TEXT,
+    link TEXT UNIQUE,
+    category TEXT,
+    date_posted TEXT,
+    closing_date TEXT,
+    organization TEXT,
+    keywords TEXT,
+    description TEXT,
+    relevant INTEGER,
+    relevance_score REAL,
+    deferrals INTEGER,
+    status TEXT,
+    source TEXT,
+    updated_at TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_tenders_closing_date ON tenders (closing_date);
+CREATE INDEX IF NOT EXISTS idx_tenders_status ON tenders (status);
+CREATE INDEX IF NOT EXISTS idx_tenders_relevant ON tenders (relevant);
+"""
+
+# Columns added after the first release, created on stores that predate them
+MIGRATIONS = {
+    "relevance_score": "ALTER TABLE tenders ADD COLUMN relevance_score REAL",
+    "deferrals": "ALTER TABLE tenders ADD COLUMN deferrals INTEGER",
+    # Tenders added by hand have a uuid hex ID and no description until someone writes one
+    "source": "ALTER TABLE tenders ADD COLUMN source TEXT; "
+              "UPDATE tenders SET source = 'manual' WHERE length(id) = 32 AND description IS NULL",
+}
+# source of tenders added through the UI; they skip the detail scraper and the relevance filter
+MANUAL_SOURCE = "manual"
+
+def default_db_path():
+    """Location of the tender database, overridable with TENDER_DB_PATH"""
+    if os.getenv("TENDER_DB_PATH"):
+        return os.getenv("TENDER_DB_PATH")
+    tender_data_path = os.getenv("TENDER_DATA_PATH", os.path.join(PROJECT_ROOT, "tender_data"))
+    return os.path.join(tender_data_path, "tenders.db")
+
+class TenderStore:
+    """
+    Embedded SQLite store shared by every pipeline stage and the UI.
+
+    Stages upsert only the rows and columns they produce (search metadata,
+    descriptions, verdicts), so a write costs O(changed rows) and stages running
+    at the same time never overwrite each other's results. WAL mode lets the UI
+    read while a scrape is writing. link is UNIQUE, which also gives it an index,
+    so a row whose link is already stored under another id updates that tender.
+    """
+
+    def __init__(self, path=None):
+        self.path = path or default_db_path()
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        is_new = not os.path.exists(self.path)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.path, timeout=30, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(SCHEMA)
+        existing = {row[1] for row in self._conn.execute("PRAGMA table_info(tenders)")}
+        for column, statement in MIGRATIONS.items():
+            if column not in existing:
+                self._conn.executescript(statement)
+        if is_new:
+            self._import_legacy_csvs()
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+    def upsert(self, rows):
+        """
+        Insert or update tenders by id. rows is a DataFrame or a list of dicts using the CSV
+        column names; only the columns present in a row are written. A row whose link is
+        already stored under another id updates that tender instead; a tender added by hand
+        keeps the verdict, description and fields the user entered.
+        """
+        if isinstance(rows, pd.DataFrame):
+            rows = rows.to_dict("records")
+        now = datetime.now().isoformat(timespec="seconds")
+        with self._lock, self._conn:
+            for row in rows:
+                values = {COLUMNS[key]: _sql_value(value) for key, value in row.items() if key in COLUMNS}
+                if values.get("id") is None:
+                    raise ValueError(f"Tender has no id: {row.get('title')}")
+                values["id"] = str(values["id"])
+                if "link" in values and not values["link"]:
+                    values["link"] = None
+                if values.get("link") is not None:
+                    cursor = self._conn.execute("SELECT * FROM tenders WHERE link = ? AND id != ?",
+                                                (values["link"], values["id"]))
+                    existing = cursor.fetchone()
+                    if existing is not None:
+                        values = _onto_existing(values, dict(zip([column[0] for column in cursor.description], existing)))
+                values["updated_at"] = now
+                columns = list(values)
+                updates = ", ".join(f"{column} = excluded.{column}" for column in columns if column != "id")
+                self._conn.execute(
+                    f"INSERT INTO tenders ({', '.join(columns)}) VALUES ({', '.join('?' for _ in columns)}) "
+                    f"ON CONFLICT(id) DO UPDATE SET {updates}",
+                    [values[column] for column in columns],
+                )
+
+    def pending_descriptions(self):
+        """Scraped tenders that still need their detail page fetched"""
+        return self._query("SELECT * FROM tenders WHERE description IS NULL AND link IS NOT NULL "
+                           "AND source IS NOT ? ORDER BY rowid", (MANUAL_SOURCE,))
+
+    def stored_links(self, links):
+        """{link: (id, source)} for the links already in the store"""
+        links = list(links)
+        found = {}
+        with self._lock:
+            # Stay under SQLite's limit on bound parameters
+            for start in range(0, len(links), 500):
+                chunk = links[start:start + 500]
+                found.update((link, (tender_id, source)) for link, tender_id, source in self._conn.execute(
+                    f"SELECT link, id, source FROM tenders WHERE link IN ({', '.join('?' for _ in chunk)})", chunk))
+        return found
+
+    def pending_verdicts(self):
+        """Described tenders the relevance filter hasn't ruled on yet"""
+        return self._query("SELECT * FROM tenders WHERE description IS NOT NULL AND relevant IS NULL "
+                           "AND source IS NOT ? ORDER BY rowid", (MANUAL_SOURCE,))
+
+    def filtered_tenders(self, by_relevance=False):
+        """
+        Tenders accepted by the filter or added by hand, in the order they were first stored, or
+        with by_relevance from the best embedding score down (unscored tenders last)
+        """
+        order = "relevance_score IS NULL, relevance_score DESC, rowid" if by_relevance else "rowid"
+        return self._query(f"SELECT * FROM tenders WHERE relevant = 1 ORDER BY {order}")
+
+    def export_csv(self, directory=None):
+        """Write the legacy CSV files from the store so older tools keep working"""
+        directory = directory or os.path.dirname(os.path.abspath(self.path))
+        exports = {
+            "tender_data.csv": (self._query("SELECT * FROM tenders WHERE link IS NOT NULL ORDER BY rowid"), SEARCH_COLUMNS),
+            "tender_data_with_descriptions.csv": (self._query("SELECT * FROM tenders WHERE description IS NOT NULL ORDER BY rowid"), None),
+            "filtered_tenders.csv": (self.filtered_tenders(), None),
+        }
+        for file_name, (df, columns) in exports.items():
+            if columns is not None:
+                df = df[columns]
+            csv_path = os.path.join(directory, file_name)
+            tmp_path = csv_path + ".tmp"
+            df.to_csv(tmp_path, index=False)
+            os.replace(tmp_path, csv_path)
+        return [os.path.join(directory, file_name) for file_name in exports]
+
+    def _query(self, sql, params=()):
+        with self._lock:
+            df = pd.read_sql_query(sql, self._conn, params=params)
+        df = df.drop(columns=["updated_at"])
+        return df.rename(columns={column: key for key, column in COLUMNS.items()})
+
+    def _import_legacy_csvs(self):
+        """Seed a brand new store from the CSV files earlier versions handed between stages"""
+        data_dir = os.path.dirname(os.path.abspath(self.path))
+        described = _read_csv(os.path.join(data_dir, "tender_data_with_descriptions.csv"))
+        filtered = _read_csv(os.path.join(data_dir, "filtered_tenders.csv"))
+        accepted_links = set(filtered["link"].dropna()) if filtered is not None and "link" in filtered else set()
+
+        rows = []
+        seen_links = set()
+        for df, relevant in ((described, None), (filtered, 1)):
+            if df is None:
+                continue
+            for row in df.to_dict("records"):
+                link = row.get("link")
+                if isinstance(link, str) and link:
+                    if link in seen_links:
+                        continue
+                    seen_links.add(link)
+                if relevant is None:
+                    # Everything in the old descriptions file had already been through the filter
+                    row["relevant"] = 1 if link in accepted_links else 0
+                else:
+                    row["relevant"] = relevant
+                if _sql_value(row.get("id")) is None:
+                    row["id"] = uuid.uuid4().hex
+                rows.append(row)
+        if rows:
+            self.upsert(rows)
+            print(f"Imported {len(rows)} tenders from the existing CSV files into {self.path}")
+
+def _onto_existing(values, existing):
+    """Point a row at the tender that already holds its link"""
+    values = dict(values, id=existing["id"])
+    if existing["source"] == MANUAL_SOURCE:
+        # Only fill in what the user left empty
+        values = {column: value for column, value in values.items()
+                  if column == "id" or (column not in ("relevant", "description", "source")
+                                        and existing.get(column) is None)}
+    return values
+
+def _read_csv(path):
+    if not os.path.exists(path):
+        return None
+    try:
+        return pd.read_csv(path)
+    except pd.errors.EmptyDataError:
+        return None
+
+def _sql_value(value):
+    """Convert pandas/NumPy scalars to plain Python values sqlite3 can bind"""
+    if value is None:
+        return None
+    if isinstance(value, float) and value != value:
+        return None
+    if hasattr(value, "item"):
+        value = value.item()
+        if isinstance(value, float) and value != value:
+            return None
+    if isinstance(value, float) and value.is_integer():
+        # IDs read back from CSV files with missing values come through as floats
+        return int(value)
+    return value
+
+def main():
+    parser = argparse.ArgumentParser(description="Tender store maintenance")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    export_parser = subparsers.add_parser("export", help="write the legacy CSV files from the store")
+    export_parser.add_argument("--db", help="path to tenders.db (defaults to tender_data/tenders.db)")
+    export_parser.add_argument("--dir", help="output directory (defaults to the database's folder)")
+    args = parser.parse_args()
+
+    if args.command == "export":
+        store = TenderStore(args.db)
+        try:
+            for path in store.export_csv(args.dir):
+                print(f"Wrote {path}")
+        finally:
+            store.close()
+
+if __name__ == "__main__":
+    try:
+        main()
+    except Exception as e:
+        print(f"Error: {str(e)}")
+        sys.exit(1)
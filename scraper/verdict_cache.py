@@ -0,0 +1,73 @@
+import os
+import time
+import sqlite3
+import hashlib
+import threading
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS verdicts (
+    key TEXT PRIMARY KEY,
+    model TEXT NOT NULL,
+    answer TEXT NOT NULL,
+    created_at REAL NOT NULL
+);
+"""
+
+def default_cache_path():
+    """Location of the verdict cache, overridable with VERDICT_CACHE_PATH"""
+    if os.getenv("VERDICT_CACHE_PATH"):
+        return os.getenv("VERDICT_CACHE_PATH")
+    tender_data_path = os.getenv("TENDER_DATA_PATH", os.path.join(PROJECT_ROOT, "tender_data"))
+    return os.path.join(tender_data_path, "verdict_cache.db")
+
+def verdict_key(description, capabilities, prompt_template, model):
+    """Hash of everything that can change the model's answer"""
+    digest = hashlib.sha256()
+    for part in (prompt_template, model, capabilities, description):
+        digest.update(part.encode("utf-8"))
+        # Separator so ("ab", "c") and ("a", "bc") hash differently
+        digest.update(b"\0")
+    return digest.hexdigest()
+
+class VerdictCache:
+    """
+    On-disk cache of relevance verdicts.
+
+    Keys hash the description together with the capabilities text, the prompt
+    template and the model name, so editing any of them misses the cache and the
+    tender is classified again; nothing has to be invalidated by hand.
+    """
+
+    def __init__(self, path=None):
+        self.path = path or default_cache_path()
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.path, timeout=30, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript(SCHEMA)
+        self.counts = {"hits": 0, "misses": 0}
+
+    def get(self, key):
+        with self._lock:
+            row = self._conn.execute("SELECT answer FROM verdicts WHERE key = ?", (key,)).fetchone()
+            self.counts["hits" if row is not None else "misses"] += 1
+        return row[0] if row is not None else None
+
+    def put(self, key, answer, model):
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO verdicts (key, model, answer, created_at) VALUES (?, ?, ?, ?)",
+                (key, model, answer, time.time()),
+            )
+
+    def report(self):
+        lookups = self.counts["hits"] + self.counts["misses"]
+        hit_rate = self.counts["hits"] / lookups * 100 if lookups else 0.0
+        return (f"Verdict cache: {self.counts['hits']} hits, {self.counts['misses']} misses "
+                f"({hit_rate:.0f}% of tenders skipped the model)")
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
@@ -0,0 +1,40 @@
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "scraper"))
+
+from tender_store import TenderStore, MANUAL_SOURCE
+
+LINK = "https://canadabuys.canada.ca/en/tender-opportunities/tender-notice/ws0001"
+
+def test_scraped_row_updates_manual_tender_with_the_same_link(tmp_path):
+    store = TenderStore(str(tmp_path / "tenders.db"))
+    store.upsert([{"id": "0123456789abcdef0123456789abcdef", "title": "Brackets (entered by hand)", "link": LINK,
+                   "relevant": 1, "source": MANUAL_SOURCE}])
+
+    # A search finds the same link under a seen index ID, in a batch with a new tender
+    store.upsert([
+        {"id": 7, "title": "Steel brackets", "link": LINK, "organization": "PSPC",
+         "Full Description": None, "relevant": None},
+        {"id": 8, "title": "Sheet metal enclosures", "link": LINK + "2", "Full Description": None, "relevant": None},
+    ])
+
+    accepted = store.filtered_tenders()
+    assert accepted["id"].tolist() == ["0123456789abcdef0123456789abcdef"]
+    manual = accepted.iloc[0]
+    assert manual["title"] == "Brackets (entered by hand)"
+    assert manual["organization"] == "PSPC"
+    # The rest of the batch was stored, and the manual tender isn't scraped or filtered
+    assert store.pending_descriptions()["link"].tolist() == [LINK + "2"]
+    assert store.stored_links([LINK]) == {LINK: ("0123456789abcdef0123456789abcdef", MANUAL_SOURCE)}
+    store.close()
+
+def test_scraped_row_reuses_the_id_a_link_is_stored_under(tmp_path):
+    store = TenderStore(str(tmp_path / "tenders.db"))
+    store.upsert([{"id": 3, "title": "Enclosures", "link": LINK}])
+    store.upsert([{"id": 9, "title": "Enclosures (amended)", "link": LINK}])
+
+    df = store.pending_descriptions()
+    assert df["id"].tolist() == ["3"]
+    assert df["title"].tolist() == ["Enclosures (amended)"]
+    store.close()